@@ -0,0 +1,113 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Compares the common attributes template with the native serializer.
+
+    python benchmarks/common_attributes.py --events 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import setup_django
+
+setup_django('tests.settings')
+
+from EPCPyYes.core.v1_2 import template_events
+from EPCPyYes.core.v1_2.CBV.business_steps import BusinessSteps
+from EPCPyYes.core.v1_2.CBV.dispositions import Disposition
+from EPCPyYes.core.v1_2.CBV.instance_lot_master_data import \
+    InstanceLotMasterDataAttribute, LotLevelAttributeName, \
+    ItemLevelAttributeName
+from quartet_tracelink.parsing.epcpyyes import get_default_environment
+from quartet_tracelink.rendering import write_document
+from quartet_tracelink.serialization import CommonAttributesSerializer
+
+
+def create_events(count, template):
+    env = get_default_environment()
+    ilmd = [
+        InstanceLotMasterDataAttribute(
+            name=LotLevelAttributeName.itemExpirationDate.value,
+            value='2023-12-31'),
+        InstanceLotMasterDataAttribute(
+            name=ItemLevelAttributeName.lotNumber.value,
+            value='DL232'),
+    ]
+    events = []
+    for i in range(count):
+        event = template_events.ObjectEvent(
+            event_time='2020-01-01T12:00:00.000000+00:00',
+            event_timezone_offset='+00:00',
+            record_time='2020-01-01T12:00:00.000000+00:00',
+            epc_list=['urn:epc:id:sgtin:305555.0555555.%s' % i],
+            biz_step=BusinessSteps.commissioning.value,
+            disposition=Disposition.encoded.value,
+            read_point='urn:epc:id:sgln:305555.123456.12',
+            biz_location='urn:epc:id:sgln:305555.123456.0',
+            ilmd=ilmd,
+            env=env,
+            template=template
+        )
+        event.is_gtin = True
+        event.packaging_line = 'Line12'
+        event.packaging_uom = 'EA'
+        event.lot = 'DL232'
+        event.expiry = '2023-12-31'
+        event.NDC = '55555-594-15'
+        event.NDC_pattern = 'US_NDC532'
+        events.append(event)
+    return events
+
+
+def run(count, template):
+    env = get_default_environment()
+    events = create_events(count, template)
+    document = template_events.EPCISEventListDocument(
+        events,
+        None,
+        template=env.get_template(
+            'quartet_tracelink/tracelink_epcis_events_document.xml'),
+        additional_context={}
+    )
+    with open(os.devnull, 'wb') as stream:
+        start = time.perf_counter()
+        size = write_document(document, stream)
+        return time.perf_counter() - start, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=100000)
+    args = parser.parse_args()
+    template_time, template_size = run(
+        args.events, 'quartet_tracelink/common_attributes.xml')
+    native_time, native_size = run(
+        args.events, CommonAttributesSerializer().as_template())
+    print('events:   %d (%d bytes)' % (args.events, template_size))
+    print('template: %.2fs (%.0f events/sec)' % (
+        template_time, args.events / template_time))
+    print('native:   %.2fs (%.0f events/sec)' % (
+        native_time, args.events / native_time))
+    print('speedup:  %.1fx' % (template_time / native_time))
+    if template_size != native_size:
+        sys.exit('The outputs differ in size.')
+
+
+if __name__ == '__main__':
+    main()
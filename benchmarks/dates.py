@@ -0,0 +1,108 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Compares dateutil based date conversion with quartet_tracelink.dates.
+
+    python benchmarks/dates.py --events 100000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dateutil import parser
+from pytz import timezone
+
+from quartet_tracelink import dates
+
+
+class Event:
+    def __init__(self, i):
+        # a new timestamp every ten events, as in a typical batch
+        self.event_time = '2020-01-01T12:%02d:%02d.%06d+00:00' % (
+            i // 600 % 60, i // 10 % 60, i % 1000)
+        self.event_timezone_offset = '-05:00'
+        self.record_time = '2020-01-01T17:00:00.000000+00:00'
+
+
+def dateutil_format(dt_string, increment_dates=False, increment_val=0):
+    try:
+        dt_obj = parser.parse(dt_string).astimezone(timezone('UTC'))
+        if increment_dates:
+            dt_obj = dt_obj + timedelta(seconds=increment_val)
+        return dt_obj.strftime('%Y-%m-%dT%H:%M:%SZ')
+    except (ValueError, OverflowError):
+        return dt_string
+
+
+def dateutil_convert(events, increment_dates):
+    for increment_val, event in enumerate(events):
+        if event.event_time.endswith(
+                '+00:00') and event.event_timezone_offset != '+00:00':
+            event.event_time = dateutil_format(
+                re.sub(r"\+00:00$", event.event_timezone_offset,
+                       event.event_time), increment_dates, increment_val)
+        else:
+            event.event_time = dateutil_format(
+                event.event_time, increment_dates, increment_val)
+        if event.record_time:
+            event.record_time = dateutil_format(
+                event.record_time, increment_dates, increment_val)
+
+
+def fast_convert(events, increment_dates):
+    # what TracelinkOutputStep.convert_event_dates does
+    for increment_val, event in enumerate(events):
+        increment = increment_val if increment_dates else 0
+        event.event_time = dates.format_datetime(
+            dates.get_event_time(event), True, increment)
+        if event.record_time:
+            event.record_time = dates.format_datetime(
+                event.record_time, True, increment)
+
+
+def run(count, increment_dates, convert):
+    events = [Event(i) for i in range(count)]
+    start = time.perf_counter()
+    convert(events, increment_dates)
+    return time.perf_counter() - start, [
+        (event.event_time, event.record_time) for event in events]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--events', type=int, default=100000)
+    arg_parser.add_argument('--increment-dates', action='store_true')
+    args = arg_parser.parse_args()
+    dateutil_time, expected = run(args.events, args.increment_dates,
+                                  dateutil_convert)
+    fast_time, actual = run(args.events, args.increment_dates,
+                            fast_convert)
+    print('events:   %d' % args.events)
+    print('dateutil: %.2fs (%.0f events/sec)' % (
+        dateutil_time, args.events / dateutil_time))
+    print('fast:     %.2fs (%.0f events/sec)' % (
+        fast_time, args.events / fast_time))
+    print('speedup:  %.1fx' % (dateutil_time / fast_time))
+    if expected != actual:
+        sys.exit('The outputs differ.')
+
+
+if __name__ == '__main__':
+    main()
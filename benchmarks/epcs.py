@@ -0,0 +1,72 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Compares the memory used by a list of EPC URNs with an EPCList holding the
+same EPCs.
+
+    python benchmarks/epcs.py --epcs 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quartet_tracelink.epcs import EPCList
+
+PREFIX = 'urn:epc:id:sgtin:0355555.055555.'
+
+
+def measure(factory):
+    """
+    :return: The object built by the factory, the bytes it allocated and
+        the seconds taken to iterate it.
+    """
+    tracemalloc.start()
+    try:
+        ret = factory()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    start = time.perf_counter()
+    for epc in ret:
+        pass
+    return ret, size, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--epcs', type=int, default=100000)
+    args = parser.parse_args()
+    serials = {
+        'sequential': list(range(100000000, 100000000 + args.epcs)),
+        'random': random.sample(range(10 ** 9, 10 ** 10), args.epcs),
+    }
+    for name, numbers in serials.items():
+        epcs, list_size, list_seconds = measure(
+            lambda: ['%s%d' % (PREFIX, serial) for serial in numbers])
+        epc_list, size, seconds = measure(lambda: EPCList(epcs))
+        assert epc_list == epcs
+        print('%-10s list %8.1f KB, EPCList %8.1f KB (%.1fx smaller), '
+              'iteration %.3fs vs %.3fs' % (
+                  name, list_size / 1024, size / 1024, list_size / size,
+                  list_seconds, seconds))
+
+
+if __name__ == '__main__':
+    main()
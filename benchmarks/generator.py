@@ -0,0 +1,208 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Generates synthetic EPCIS documents for the benchmarks.  Each document
+commissions and packs `pallets` pallets of `cases` cases of `eaches`
+eaches and ships all of the pallets with a single shipping event.  Each
+pallet holds a single product (pallets are assigned the `gtins` products
+round robin) and cases are assigned one of `lots` lots.
+
+    python benchmarks/generator.py --pallets 10 > epcis.xml
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from EPCPyYes.core.v1_2 import template_events
+from EPCPyYes.core.v1_2.CBV.business_steps import BusinessSteps
+from EPCPyYes.core.v1_2.CBV.business_transactions import \
+    BusinessTransactionType
+from EPCPyYes.core.v1_2.CBV.dispositions import Disposition
+from EPCPyYes.core.v1_2.CBV.instance_lot_master_data import \
+    InstanceLotMasterDataAttribute, LotLevelAttributeName, \
+    ItemLevelAttributeName
+from EPCPyYes.core.v1_2.CBV.source_destination import SourceDestinationTypes
+from EPCPyYes.core.v1_2.events import Action, BusinessTransaction, Source, \
+    Destination
+
+COMPANY_PREFIX = '0355555'
+LOCATION = 'urn:epc:id:sgln:0355555.00000.0'
+READ_POINT = 'urn:epc:id:sgln:0355555.00000.1'
+PARTNER_PREFIX = '0614141'
+PARTNER_LOCATION = 'urn:epc:id:sgln:0614141.00001.0'
+EVENT_TIME = '2020-04-08T07:07:28.477000+00:00'
+TIMEZONE_OFFSET = '-05:00'
+
+
+def get_each_urn(gtin: int, serial: int):
+    return 'urn:epc:id:sgtin:%s.0%05d.%s' % (COMPANY_PREFIX, gtin + 1, serial)
+
+
+def get_case_urn(gtin: int, serial: int):
+    return 'urn:epc:id:sgtin:%s.3%05d.%s' % (COMPANY_PREFIX, gtin + 1, serial)
+
+
+def get_pallet_urn(serial: int):
+    return 'urn:epc:id:sscc:%s.1%09d' % (COMPANY_PREFIX, serial)
+
+
+def get_item_urns(gtins: int):
+    """
+    :return: An SGTIN URN for the each and case of every product.
+    """
+    return [get_urn(gtin, 1) for gtin in range(gtins)
+            for get_urn in (get_each_urn, get_case_urn)]
+
+
+def get_lot(lot: int):
+    return 'LOT%03d' % (lot + 1)
+
+
+def get_ilmd(lot: int):
+    return [
+        InstanceLotMasterDataAttribute(
+            name=ItemLevelAttributeName.lotNumber.value,
+            value=get_lot(lot)),
+        InstanceLotMasterDataAttribute(
+            name=LotLevelAttributeName.itemExpirationDate.value,
+            value='2030-12-31'),
+    ]
+
+
+def _object_event(epc_list, biz_step, disposition, action=Action.add.value,
+                  **kwargs):
+    return template_events.ObjectEvent(
+        event_time=EVENT_TIME,
+        event_timezone_offset=TIMEZONE_OFFSET,
+        record_time=EVENT_TIME,
+        action=action,
+        epc_list=epc_list,
+        biz_step=biz_step,
+        disposition=disposition,
+        read_point=READ_POINT,
+        biz_location=LOCATION,
+        **kwargs
+    )
+
+
+def _aggregation_event(parent_id, child_epcs):
+    return template_events.AggregationEvent(
+        event_time=EVENT_TIME,
+        event_timezone_offset=TIMEZONE_OFFSET,
+        record_time=EVENT_TIME,
+        action=Action.add.value,
+        parent_id=parent_id,
+        child_epcs=child_epcs,
+        biz_step=BusinessSteps.packing.value,
+        disposition=Disposition.in_progress.value,
+        read_point=READ_POINT,
+        biz_location=LOCATION
+    )
+
+
+def generate_events(pallets: int = 10, cases: int = 10, eaches: int = 10,
+                    lots: int = 2, gtins: int = 2):
+    """
+    :param pallets: The number of pallets.
+    :param cases: The number of cases per pallet.
+    :param eaches: The number of eaches per case.
+    :param lots: The number of lots.
+    :param gtins: The number of products.
+    :return: A list of EPCPyYes template events in document order.
+    """
+    commissioning = BusinessSteps.commissioning.value
+    active = Disposition.active.value
+    events = []
+    pallet_urns = []
+    case_serial = each_serial = 0
+    for pallet in range(pallets):
+        gtin = pallet % gtins
+        pallet_urn = get_pallet_urn(pallet + 1)
+        pallet_urns.append(pallet_urn)
+        events.append(_object_event([pallet_urn], commissioning, active))
+        case_urns = []
+        for case in range(cases):
+            lot = case_serial % lots
+            case_serial += 1
+            case_urn = get_case_urn(gtin, case_serial)
+            case_urns.append(case_urn)
+            each_urns = [get_each_urn(gtin, each_serial + i + 1)
+                         for i in range(eaches)]
+            each_serial += eaches
+            events.append(_object_event(each_urns, commissioning, active,
+                                        ilmd=get_ilmd(lot)))
+            events.append(_object_event([case_urn], commissioning, active,
+                                        ilmd=get_ilmd(lot)))
+            events.append(_aggregation_event(case_urn, each_urns))
+        events.append(_aggregation_event(pallet_urn, case_urns))
+    events.append(_object_event(
+        pallet_urns,
+        BusinessSteps.shipping.value,
+        Disposition.in_transit.value,
+        action=Action.observe.value,
+        business_transaction_list=[
+            BusinessTransaction(
+                'urn:epcglobal:cbv:bt:%s5555:BENCHMARK' % COMPANY_PREFIX,
+                BusinessTransactionType.Despatch_Advice.value)
+        ],
+        source_list=[
+            Source(SourceDestinationTypes.owning_party.value, LOCATION),
+            Source(SourceDestinationTypes.location.value, LOCATION),
+        ],
+        destination_list=[
+            Destination(SourceDestinationTypes.owning_party.value,
+                        PARTNER_LOCATION),
+            Destination(SourceDestinationTypes.location.value,
+                        PARTNER_LOCATION),
+        ]
+    ))
+    return events
+
+
+def generate_epcis(pallets: int = 10, cases: int = 10, eaches: int = 10,
+                   lots: int = 2, gtins: int = 2):
+    """
+    :return: A tuple of the EPCIS document and the number of events in it.
+        See `generate_events` for the parameters.
+    """
+    events = generate_events(pallets, cases, eaches, lots, gtins)
+    document = template_events.EPCISEventListDocument(
+        events, render_namespaces=True, created_date=EVENT_TIME)
+    return document.render(), len(events)
+
+
+def add_arguments(parser):
+    parser.add_argument('--pallets', type=int, default=10)
+    parser.add_argument('--cases', type=int, default=10,
+                        help='The number of cases per pallet.')
+    parser.add_argument('--eaches', type=int, default=10,
+                        help='The number of eaches per case.')
+    parser.add_argument('--lots', type=int, default=2)
+    parser.add_argument('--gtins', type=int, default=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_arguments(parser)
+    args = parser.parse_args()
+    document, count = generate_epcis(args.pallets, args.cases, args.eaches,
+                                     args.lots, args.gtins)
+    sys.stdout.write(document)
+
+
+if __name__ == '__main__':
+    main()
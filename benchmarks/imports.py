@@ -0,0 +1,79 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Measures how long it takes a new interpreter (with Django already set up)
+to import the steps package and to resolve each step class, along with the
+number of modules each import loads.
+
+    python benchmarks/imports.py --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = [
+    'quartet_tracelink.steps',
+    'quartet_tracelink.steps.OutputParsingStep',
+    'quartet_tracelink.steps.TracelinkOutputStep',
+    'quartet_tracelink.steps.TraceLinkCommonAttributesOutputStep',
+    'quartet_tracelink.steps.TradingPartnerMappingOutputStep',
+]
+CHILD = '''
+import json, sys, time
+import django
+django.setup()
+from pydoc import locate
+modules = len(sys.modules)
+start = time.perf_counter()
+locate(%r)
+print(json.dumps({'seconds': time.perf_counter() - start,
+                  'modules': len(sys.modules) - modules}))
+'''
+
+
+def measure(target: str, settings_module: str):
+    """
+    Imports the target in a new interpreter.
+    :return: A dictionary with the seconds taken and modules loaded.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHILD % target], cwd=ROOT, env=env)
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='The number of times each import is timed.')
+    parser.add_argument('--settings', default='tests.settings',
+                        help='The Django settings module.')
+    args = parser.parse_args()
+    for target in TARGETS:
+        results = [measure(target, args.settings)
+                   for i in range(args.repeat)]
+        print('%-60s %8.1f ms %5d modules' % (
+            target,
+            statistics.median(r['seconds'] for r in results) * 1000,
+            results[0]['modules']))
+
+
+if __name__ == '__main__':
+    main()
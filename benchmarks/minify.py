@@ -0,0 +1,73 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Compares the size and render time of minified output with the templates'
+own output.
+
+    python benchmarks/minify.py --events 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import setup_django
+
+setup_django('tests.settings')
+
+from EPCPyYes.core.v1_2 import template_events
+from quartet_tracelink.parsing.epcpyyes import get_default_environment
+from quartet_tracelink.rendering import write_document
+
+from benchmarks.common_attributes import create_events
+
+TEMPLATES = ['quartet_tracelink/common_attributes.xml',
+             'quartet_tracelink/disposition_assigned.xml']
+
+
+def run(events, minified):
+    env = get_default_environment()
+    document = template_events.EPCISEventListDocument(
+        events,
+        None,
+        template=env.get_template(
+            'quartet_tracelink/tracelink_epcis_events_document.xml'),
+        additional_context={}
+    )
+    with open(os.devnull, 'wb') as stream:
+        start = time.perf_counter()
+        size = write_document(document, stream, minified=minified)
+        return time.perf_counter() - start, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=200000)
+    args = parser.parse_args()
+    for template in TEMPLATES:
+        events = create_events(args.events, template)
+        plain_time, plain_size = run(events, False)
+        minified_time, minified_size = run(events, True)
+        print('%s\n  plain:    %.2fs %12d bytes\n'
+              '  minified: %.2fs %12d bytes (%.0f%% smaller, %+.0f%% time)'
+              % (template, plain_time, plain_size, minified_time,
+                 minified_size, 100 - minified_size * 100 / plain_size,
+                 minified_time * 100 / plain_time - 100))
+
+
+if __name__ == '__main__':
+    main()
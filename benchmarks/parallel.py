@@ -0,0 +1,85 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Compares rendering a document's events in a process pool with rendering
+them in a single process for an increasing number of processes.
+
+    python benchmarks/parallel.py --events 200000 --processes 2 4 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import setup_django
+
+setup_django('tests.settings')
+
+from EPCPyYes.core.v1_2 import template_events
+from quartet_tracelink import parallel
+from quartet_tracelink.parsing.epcpyyes import get_default_environment
+
+from benchmarks.common_attributes import create_events
+
+
+def create_document(events):
+    env = get_default_environment()
+    return template_events.EPCISEventListDocument(
+        events,
+        None,
+        created_date='2020-01-01T12:00:00.000000+00:00',
+        template=env.get_template(
+            'quartet_tracelink/tracelink_epcis_events_document.xml'),
+        additional_context={}
+    )
+
+
+def run(events, processes, chunk_size):
+    document = create_document(events)
+    start = time.perf_counter()
+    if processes > 1:
+        parallel.prerender_events(document, processes, chunk_size)
+    data = document.render()
+    return time.perf_counter() - start, data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--processes', type=int, nargs='+',
+                        default=sorted({2, os.cpu_count() or 1}))
+    args = parser.parse_args()
+    events = create_events(args.events,
+                           'quartet_tracelink/common_attributes.xml')
+    serial_time, expected = run(events, 1, args.chunk_size)
+    print('cpus: %s\n1 process:   %.2fs' % (os.cpu_count(), serial_time))
+    for processes in args.processes:
+        if processes < 2:
+            continue
+        # start the workers before timing
+        run(events[:args.chunk_size * processes], processes,
+            args.chunk_size)
+        seconds, data = run(events, processes, args.chunk_size)
+        print('%d processes: %.2fs (%.2fx)%s' % (
+            processes, seconds, serial_time / seconds,
+            '' if data == expected else ' OUTPUT DIFFERS'))
+    parallel.shutdown_executors()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Compares the peak RSS of the TraceLink output parser with and without the
+`Streaming Parse` mode on a document with one large commissioning event.
+Each mode parses the document in its own process and, like the rule engine
+hands it to the step, both modes are given the whole document as bytes.
+
+    python benchmarks/parse.py --epcs 1000000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import setup_django
+
+MODES = ['standard', 'streaming']
+
+
+def write_commissioning_document(path: str, epcs: int):
+    """
+    Writes an EPCIS document with a single commissioning event.
+    :param path: The file to write.
+    :param epcs: The number of EPCs in the event.
+    """
+    from EPCPyYes.core.v1_2 import template_events
+    from EPCPyYes.core.v1_2.CBV.business_steps import BusinessSteps
+    from EPCPyYes.core.v1_2.CBV.dispositions import Disposition
+    from benchmarks import generator
+    event = generator._object_event(
+        [generator.get_each_urn(0, serial) for serial in range(1, epcs + 1)],
+        BusinessSteps.commissioning.value, Disposition.active.value,
+        ilmd=generator.get_ilmd(0))
+    document = template_events.EPCISEventListDocument(
+        [event], render_namespaces=True, created_date=generator.EVENT_TIME)
+    with open(path, 'w', encoding='utf-8') as document_file:
+        document_file.write(document.render())
+
+
+def reset_peak_rss():
+    """
+    Resets the peak RSS of the process so it only covers the parse (the
+    test database migrations can use more memory than a small parse).
+    Only supported on Linux.
+    :return: True if the peak was reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def get_rss(field: str):
+    """
+    :param field: VmRSS for the current RSS or VmHWM for the peak.
+    :return: The RSS in MB from /proc/self/status.
+    """
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+
+
+def parse(mode: str, path: str):
+    """
+    Parses the document and filters its commissioning event.
+    :return: A dictionary with the number of EPCs in the filtered event,
+        the elapsed seconds, the RSS before parsing and the peak RSS while
+        parsing.
+    """
+    import io
+    from quartet_output.models import EndPoint, EPCISOutputCriteria
+    from quartet_tracelink.parsing.parser import TraceLinkEPCISParser, \
+        TraceLinkStreamingEPCISParser
+    criteria = EPCISOutputCriteria.objects.create(
+        name='Commissioning',
+        event_type='Object',
+        action='ADD',
+        biz_step='urn:epcglobal:cbv:bizstep:commissioning',
+        end_point=EndPoint.objects.create(urn='http://localhost',
+                                          name='Benchmark EndPoint')
+    )
+    with open(path, 'rb') as data_file:
+        data = data_file.read()
+    if not reset_peak_rss():
+        raise RuntimeError('Resetting the peak RSS requires Linux.')
+    start_rss = get_rss('VmRSS')
+    start = time.perf_counter()
+    if mode == 'streaming':
+        parser_type = TraceLinkStreamingEPCISParser
+    else:
+        parser_type = TraceLinkEPCISParser
+    parser = parser_type(io.BytesIO(data), criteria, skip_parsing=True)
+    parser.parse()
+    elapsed = time.perf_counter() - start
+    event, = parser.filtered_events
+    return {
+        'epcs': len(event.epc_list),
+        'seconds': round(elapsed, 3),
+        'start_rss_mb': round(start_rss, 1),
+        'peak_rss_mb': round(get_rss('VmHWM'), 1),
+    }
+
+
+def run_in_process(mode, path, queue):
+    setup_django('tests.settings')
+    from django.db import connection
+    connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                       serialize=False)
+    try:
+        queue.put(parse(mode, path))
+    except Exception as e:
+        queue.put({'error': '%s: %s' % (e.__class__.__name__, e)})
+        raise
+    finally:
+        connection.creation.destroy_test_db(connection.settings_dict['NAME'],
+                                            verbosity=0)
+
+
+def run(mode, path):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=run_in_process,
+                              args=(mode, path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--epcs', type=int, default=1000000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'commissioning.xml')
+        write_commissioning_document(path, args.epcs)
+        print('%d EPCs, %.1f MB document' % (
+            args.epcs, os.path.getsize(path) / (1024 * 1024)))
+        for mode in MODES:
+            result = run(mode, path)
+            if 'error' in result:
+                print('%-10s failed: %s' % (mode, result['error']))
+                continue
+            print('%-10s %8.3fs %8.1f MB peak RSS (%+.1f MB while '
+                  'parsing)' % (
+                      mode, result['seconds'], result['peak_rss_mb'],
+                      result['peak_rss_mb'] - result['start_rss_mb']))
+
+
+if __name__ == '__main__':
+    main()
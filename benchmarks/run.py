@@ -0,0 +1,151 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Runs the TraceLink output step benchmarks and compares the results with a
+baseline.  Each scenario runs in its own process against a new test
+database so the peak RSS and query counts belong to that scenario alone.
+
+    python benchmarks/run.py --pallets 20 --cases 10 --eaches 12
+    python benchmarks/run.py --save-baseline
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import generator
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+SCENARIO_NAMES = ['tracelink_output', 'common_attributes',
+                  'disposition_assigned', 'combined',
+                  'trading_partner_mapping']
+CONFIG_KEYS = ['pallets', 'cases', 'eaches', 'lots', 'gtins']
+
+
+def setup_django(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def run_in_process(name, settings_module, config, queue):
+    setup_django(settings_module)
+    from django.db import connection
+    connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                       serialize=False)
+    try:
+        from benchmarks.scenarios import run_scenario
+        queue.put(run_scenario(name, **config))
+    except Exception as e:
+        queue.put({'error': '%s: %s' % (e.__class__.__name__, e)})
+        raise
+    finally:
+        connection.creation.destroy_test_db(connection.settings_dict['NAME'],
+                                            verbosity=0)
+
+
+def run(name, settings_module, config):
+    """
+    Runs a scenario in a new process.
+    :return: The scenario results.
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=run_in_process,
+                              args=(name, settings_module, config, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """
+    :param results: The results keyed by scenario.
+    :param baseline: The baseline results keyed by scenario.
+    :param tolerance: The allowed drop in events/sec as a fraction.
+    :return: A list of regression messages.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if not expected or 'error' in result:
+            continue
+        ratio = result['events_per_sec'] / expected['events_per_sec']
+        print('%-24s %6.2fx events/sec, %+d queries, %+.1f MB peak RSS' % (
+            name, ratio, result['queries'] - expected['queries'],
+            result['peak_rss_mb'] - expected['peak_rss_mb']))
+        if ratio < 1 - tolerance:
+            regressions.append('%s: %.1f events/sec (baseline %.1f)' % (
+                name, result['events_per_sec'], expected['events_per_sec']))
+        if result['queries'] > expected['queries']:
+            regressions.append('%s: %s queries (baseline %s)' % (
+                name, result['queries'], expected['queries']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    generator.add_arguments(parser)
+    parser.add_argument('--scenario', action='append',
+                        choices=SCENARIO_NAMES,
+                        help='The scenario(s) to run.  Defaults to all.')
+    parser.add_argument('--settings', default='tests.settings',
+                        help='The Django settings module.')
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='The baseline JSON file.')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Write the results to the baseline file.')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='The allowed drop in events/sec before a '
+                             'scenario is reported as a regression.')
+    args = parser.parse_args()
+    config = {key: getattr(args, key) for key in CONFIG_KEYS}
+    results = {}
+    for name in args.scenario or SCENARIO_NAMES:
+        results[name] = result = run(name, args.settings, config)
+        if 'error' in result:
+            print('%-24s failed: %s' % (name, result['error']))
+        else:
+            print('%-24s %6d events %10.1f events/sec %6d queries '
+                  '%8.1f MB peak RSS' % (
+                      name, result['events'], result['events_per_sec'],
+                      result['queries'], result['peak_rss_mb']))
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump({'config': config, 'results': results}, baseline_file,
+                      indent=4, sort_keys=True)
+            baseline_file.write('\n')
+        return
+    if not os.path.exists(args.baseline):
+        return
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline['config'] != config:
+        print('The baseline was recorded with %s- not comparing.' %
+              baseline['config'])
+        return
+    regressions = compare(results, baseline['results'], args.tolerance)
+    if regressions:
+        sys.exit('Regressions:\n%s' % '\n'.join(regressions))
+
+
+if __name__ == '__main__':
+    main()
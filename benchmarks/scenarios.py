@@ -0,0 +1,223 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Benchmark scenarios- one per output step.  Each scenario configures a rule
+that parses a generated EPCIS document, adds the commissioning and
+aggregation data for the shipped pallets (where the step needs it) and
+renders the TraceLink message.  The rule is run with
+`quartet_tracelink.offline.OfflineRule` so no tasks are created.
+
+Django must be set up before this module is imported; see
+`benchmarks/run.py`.
+"""
+import resource
+import sys
+import time
+from collections import namedtuple
+
+from django.db import connection
+from gs123.check_digit import calculate_check_digit
+from quartet_capture.models import Rule, Step, StepParameter
+from quartet_masterdata.models import Company, Location, OutboundMapping, \
+    TradeItem
+from quartet_output.models import EndPoint, EPCISOutputCriteria
+from quartet_tracelink.offline import OfflineRule
+from quartet_tracelink.urns import urn_decoder
+
+from benchmarks import generator
+
+Scenario = namedtuple('Scenario', ['step_class', 'parameters',
+                                   'add_hierarchy'])
+
+SCENARIOS = {
+    'tracelink_output': Scenario(
+        'quartet_tracelink.steps.TracelinkOutputStep', {}, True),
+    'common_attributes': Scenario(
+        'quartet_tracelink.steps.TraceLinkCommonAttributesOutputStep', {
+            'Object Event Template':
+                'quartet_tracelink/common_attributes.xml',
+            'Sender GLN': '0355555000006',
+        }, True),
+    'disposition_assigned': Scenario(
+        'quartet_tracelink.steps.DispositionAssignedOutputStep', {
+            'Object Event Template':
+                'quartet_tracelink/disposition_assigned_extended.xml',
+            'Sender GLN': '0355555000006',
+        }, True),
+    'combined': Scenario(
+        'quartet_tracelink.steps.CombinedOutputStep', {
+            'Object Event Template':
+                'quartet_tracelink/combined_object_event.xml',
+            'Template Path':
+                'quartet_tracelink/tracelink_epcis_events_masterdata.xml',
+        }, True),
+    'trading_partner_mapping': Scenario(
+        'quartet_tracelink.steps.TradingPartnerMappingOutputStep', {}, False),
+}
+
+RULE_NAME = 'TraceLink Benchmark'
+CRITERIA_NAME = 'TraceLink Benchmark Shipping'
+
+
+def get_gln13(sgln: str):
+    company_prefix, location_reference = sgln.split(':')[-1].split('.')[:2]
+    return calculate_check_digit(company_prefix + location_reference)
+
+
+def create_masterdata(gtins: int):
+    """
+    Creates the companies, locations, outbound mapping and trade items the
+    output steps look up.
+    :param gtins: The number of products in the generated documents.
+    """
+    company = Company.objects.create(
+        name='Benchmark Company',
+        gs1_company_prefix=generator.COMPANY_PREFIX,
+        SGLN=generator.LOCATION,
+        GLN13=get_gln13(generator.LOCATION)
+    )
+    location = Location.objects.create(
+        name='Benchmark Location',
+        SGLN=generator.READ_POINT,
+        GLN13=get_gln13(generator.READ_POINT),
+        company=company
+    )
+    partner = Company.objects.create(
+        name='Benchmark Partner',
+        gs1_company_prefix=generator.PARTNER_PREFIX,
+        SGLN=generator.PARTNER_LOCATION,
+        GLN13=get_gln13(generator.PARTNER_LOCATION)
+    )
+    partner_location = Location.objects.create(
+        name='Benchmark Partner Location',
+        SGLN='%s1' % generator.PARTNER_LOCATION[:-1],
+        GLN13=get_gln13(generator.PARTNER_LOCATION),
+        company=partner
+    )
+    OutboundMapping.objects.create(
+        company=company,
+        from_business=company,
+        ship_from=location,
+        to_business=partner,
+        ship_to=partner_location
+    )
+    TradeItem.objects.bulk_create([
+        TradeItem(
+            GTIN14=urn_decoder.get_gtin14(urn),
+            regulated_product_name='Benchmark Product',
+            NDC='55555-%03d-01' % (number // 2),
+            NDC_pattern='5-3-2',
+            package_uom='Ea' if number % 2 == 0 else 'Cs',
+            company=company
+        ) for number, urn in enumerate(generator.get_item_urns(gtins))
+    ])
+
+
+def create_rule(scenario: Scenario):
+    """
+    Creates the benchmark rule for the scenario.
+    :return: The name of the rule.
+    """
+    EPCISOutputCriteria.objects.create(
+        name=CRITERIA_NAME,
+        event_type='Object',
+        action='OBSERVE',
+        biz_step='urn:epcglobal:cbv:bizstep:shipping',
+        end_point=EndPoint.objects.create(urn='http://localhost',
+                                          name='Benchmark EndPoint')
+    )
+    rule = Rule.objects.create(name=RULE_NAME)
+    step = Step.objects.create(
+        name='Parse', rule=rule, order=1,
+        step_class='quartet_tracelink.steps.OutputParsingStep')
+    StepParameter.objects.create(step=step, name='EPCIS Output Criteria',
+                                 value=CRITERIA_NAME)
+    order = 2
+    if scenario.add_hierarchy:
+        Step.objects.create(
+            name='Add Aggregation Data', rule=rule, order=2,
+            step_class='quartet_output.steps.UnpackHierarchyStep')
+        Step.objects.create(
+            name='Add Commissioning Data', rule=rule, order=3,
+            step_class='quartet_tracelink.steps.AddCommissioningDataStep')
+        order = 4
+    step = Step.objects.create(name='Render', rule=rule, order=order,
+                               step_class=scenario.step_class)
+    for name, value in scenario.parameters.items():
+        StepParameter.objects.create(step=step, name=name, value=value)
+    return RULE_NAME
+
+
+def get_peak_rss():
+    """
+    :return: The peak resident set size of this process in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+class QueryCounter:
+    """
+    Counts the queries executed on a connection (the query log that
+    CaptureQueriesContext relies on is capped).
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def get_size(document):
+    if isinstance(document, str):
+        return len(document.encode('utf-8'))
+    if isinstance(document, bytes):
+        return len(document)
+    return document.size
+
+
+def run_scenario(name: str, pallets: int = 10, cases: int = 10,
+                 eaches: int = 10, lots: int = 2, gtins: int = 2):
+    """
+    Runs a scenario against a freshly generated document.  The database
+    must be empty.
+    :return: A dictionary with the number of input events, events/sec,
+        elapsed seconds, number of database queries, the number of events
+        and bytes rendered and the peak RSS of the process.
+    """
+    data, event_count = generator.generate_epcis(pallets, cases, eaches,
+                                                 lots, gtins)
+    data = data.encode('utf-8')
+    create_masterdata(gtins)
+    rule = OfflineRule(
+        Rule.objects.get(name=create_rule(SCENARIOS[name])), name)
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        start = time.perf_counter()
+        rule.execute(data)
+        elapsed = time.perf_counter() - start
+    return {
+        'events': event_count,
+        'events_per_sec': round(event_count / elapsed, 1),
+        'seconds': round(elapsed, 3),
+        'queries': queries.count,
+        'rendered_events': rule.event_count,
+        'output_bytes': sum(get_size(document)
+                            for document in rule.documents),
+        'peak_rss_mb': round(get_peak_rss(), 1),
+    }
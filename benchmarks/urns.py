@@ -0,0 +1,58 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Compares gs123's URNConverter with the memoized URN decoder.
+
+    python benchmarks/urns.py --urns 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gs123.conversion import URNConverter
+from quartet_tracelink.urns import URNDecoder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--urns', type=int, default=1000000)
+    parser.add_argument('--products', type=int, default=10)
+    args = parser.parse_args()
+    epcs = [
+        'urn:epc:id:sgtin:0355555.%06d.%s' % (i % args.products, i)
+        for i in range(args.urns)
+    ]
+    start = time.perf_counter()
+    expected = [URNConverter(epc).gtin14 for epc in epcs]
+    converter_time = time.perf_counter() - start
+    decoder = URNDecoder()
+    start = time.perf_counter()
+    decoded = decoder.decode_many(epcs)
+    decoder_time = time.perf_counter() - start
+    if [urn.gtin14 for urn in decoded] != expected:
+        sys.exit('The decoded GTINs differ.')
+    print('urns:         %d (%d products)' % (args.urns, args.products))
+    print('URNConverter: %.2fs (%.0f urns/sec)' % (
+        converter_time, args.urns / converter_time))
+    print('URNDecoder:   %.2fs (%.0f urns/sec)' % (
+        decoder_time, args.urns / decoder_time))
+    print('speedup:      %.1fx' % (converter_time / decoder_time))
+
+
+if __name__ == '__main__':
+    main()
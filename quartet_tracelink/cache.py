@@ -0,0 +1,497 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Process level caches for master data that is looked up over and over
+again while rendering outbound messages.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from quartet_masterdata.models import Company, Location, OutboundMapping, \
+    TradeItem
+from quartet_tracelink.urns import urn_decoder
+
+
+class LRUCache:
+    """
+    A thread-safe, bounded, least recently used cache whose entries expire
+    after `ttl` seconds.  Hits, misses and evictions are counted so the
+    size and TTL can be tuned.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300,
+                 timer=time.monotonic):
+        """
+        :param max_size: The maximum number of entries.
+        :param ttl: The number of seconds an entry is valid for.  Zero or
+            None means entries never expire.
+        :param timer: The clock used to expire entries.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > self.timer():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = self.timer() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """
+        Removes every entry whose value matches the predicate.
+        :param predicate: A callable that accepts a cached value.
+        """
+        with self._lock:
+            for key in [key for key, (value, expires) in self._data.items()
+                        if predicate(value)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    @property
+    def stats(self):
+        """
+        :return: A dictionary with the hit, miss and eviction counts along
+            with the current and maximum size of the cache.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+                'max_size': self.max_size,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TradeItemCache:
+    """
+    Caches TradeItem records by GTIN14.  Callers always receive a copy of
+    the cached instance and are free to modify it.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300):
+        self.items = LRUCache(max_size, ttl)
+
+    def get_by_urn(self, urn: str):
+        """
+        :param urn: An SGTIN URN.
+        :return: A TradeItem instance or None if there is no trade item
+            for the URN.
+        """
+        if 'sgtin' not in urn:
+            return None
+        return self.get(urn_decoder.get_gtin14(urn))
+
+    def get(self, gtin14: str):
+        """
+        :param gtin14: The GTIN14 of the trade item.
+        :return: A TradeItem instance or None.
+        """
+        return self.get_many([gtin14]).get(gtin14)
+
+    def get_many(self, gtins):
+        """
+        Returns the trade items for the GTINs supplied- any that are not
+        cached are loaded with a single query.
+        :param gtins: An iterable of GTIN14 values.
+        :return: A dictionary of TradeItem instances keyed by GTIN14.  GTINs
+            with no trade item are not included.
+        """
+        ret = {}
+        missing = set()
+        for gtin14 in gtins:
+            trade_item = self.items.get(gtin14)
+            if trade_item is None:
+                missing.add(gtin14)
+            else:
+                ret[gtin14] = copy.copy(trade_item)
+        if missing:
+            for trade_item in TradeItem.objects.filter(GTIN14__in=missing):
+                self.items.set(trade_item.GTIN14, trade_item)
+                ret[trade_item.GTIN14] = copy.copy(trade_item)
+        return ret
+
+    def invalidate(self, trade_item: TradeItem):
+        """
+        Removes the trade item (matched by primary key or GTIN14) from the
+        cache.
+        """
+        self.items.invalidate(trade_item.GTIN14)
+        self.items.invalidate_where(lambda item: item.pk == trade_item.pk)
+
+    def clear(self):
+        self.items.clear()
+
+    @property
+    def stats(self):
+        return self.items.stats
+
+
+_NOT_FOUND = object()
+_AMBIGUOUS = object()
+
+
+class GLNResolver:
+    """
+    Resolves company SGLNs and GS1 company prefixes to GLN13 values.  The
+    first lookup loads the SGLN, company prefix and GLN13 of every Company
+    with a single query; after that lookups (including lookups for
+    companies that do not exist) are answered from memory until the maps
+    expire or a Company is saved or deleted.
+    """
+
+    def __init__(self, ttl: float = 300, timer=time.monotonic):
+        """
+        :param ttl: The number of seconds before the company data is
+            reloaded.  Zero or None means the data is only reloaded when a
+            company changes.
+        :param timer: The clock used to expire the data.
+        """
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.loads = 0
+        self._maps = None
+        self._expires = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        """
+        Loads the GLN13 of every company keyed by SGLN and company prefix.
+        """
+        generation = self._generation
+        sglns = {}
+        prefixes = {}
+        for sgln, prefix, gln13 in Company.objects.values_list(
+            'SGLN', 'gs1_company_prefix', 'GLN13'
+        ):
+            for mapping, key in ((sglns, sgln), (prefixes, prefix)):
+                if key:
+                    # ambiguous keys are left to the database
+                    mapping[key] = _AMBIGUOUS if key in mapping else gln13
+        with self._lock:
+            self.loads += 1
+            # don't keep data that was loaded while a company changed
+            if generation == self._generation:
+                self._maps = sglns, prefixes
+                self._expires = self.timer() + self.ttl if self.ttl else None
+        return sglns, prefixes
+
+    def _get_maps(self):
+        with self._lock:
+            maps = self._maps
+            expired = self._expires is not None and \
+                self._expires <= self.timer()
+            if maps is not None and not expired:
+                self.hits += 1
+                return maps
+        return self.warm_up()
+
+    def get_gln_by_sgln(self, sgln: str):
+        """
+        :param sgln: The SGLN of a Company.
+        :return: The GLN13 of the company.
+        :raises Company.DoesNotExist: If there is no company with the SGLN.
+        """
+        gln13 = self._get_maps()[0].get(sgln, _NOT_FOUND)
+        if gln13 is _AMBIGUOUS:
+            return Company.objects.get(SGLN=sgln).GLN13
+        if gln13 is _NOT_FOUND:
+            raise Company.DoesNotExist(
+                'There is no company with SGLN %s.' % sgln)
+        return gln13
+
+    def get_gln_by_company_prefix(self, company_prefix: str):
+        """
+        :param company_prefix: The GS1 company prefix of a Company.
+        :return: The GLN13 of the company.
+        :raises Company.DoesNotExist: If there is no company with the
+            prefix.
+        """
+        gln13 = self._get_maps()[1].get(company_prefix, _NOT_FOUND)
+        if gln13 is _AMBIGUOUS:
+            return Company.objects.get(
+                gs1_company_prefix=company_prefix).GLN13
+        if gln13 is _NOT_FOUND:
+            raise Company.DoesNotExist(
+                'There is no company with company prefix %s.' %
+                company_prefix)
+        return gln13
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._maps = None
+            self._expires = None
+
+    @property
+    def stats(self):
+        """
+        :return: The number of lookups answered from memory and the number
+            of times the company data was loaded.
+        """
+        return {'hits': self.hits, 'loads': self.loads}
+
+
+class FragmentCache:
+    """
+    Caches rendered template fragments that depend only on master data-
+    for example the trading partner addresses in the header of every
+    message sent to a partner.  Fragments are keyed by the template name
+    and a snapshot of the fields of the records they render (see
+    `get_record_snapshot`), so a record that changes always renders a new
+    fragment.  Fragments are also dropped whenever a Company, Location or
+    OutboundMapping is saved or deleted.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 300):
+        self.fragments = LRUCache(max_size, ttl)
+
+    @staticmethod
+    def get_key(template_name: str, records):
+        """
+        :param template_name: The name of the fragment template.
+        :param records: The record (for example an OutboundMapping) or list
+            of records the fragment renders.  None entries are allowed.
+        :return: A cache key or None if the fragment can not be cached
+            because a record has no primary key.
+        """
+        if not isinstance(records, list):
+            records = [records]
+        key = [template_name]
+        for record in records:
+            if record is None:
+                key.append(None)
+                continue
+            if getattr(record, 'pk', None) is None:
+                return None
+            snapshot = get_record_snapshot(record)
+            if snapshot is None:
+                # not master data the cache knows the fields of
+                snapshot = record.pk
+            key.append((type(record).__name__, snapshot))
+        return tuple(key)
+
+    def get(self, key):
+        return self.fragments.get(key)
+
+    def set(self, key, fragment: str):
+        self.fragments.set(key, fragment)
+
+    def clear(self):
+        self.fragments.clear()
+
+    @property
+    def stats(self):
+        return self.fragments.stats
+
+
+ADDRESS_FIELDS = ['GLN13', 'SGLN', 'name', 'address1', 'address2',
+                  'address3', 'country', 'city', 'state_province',
+                  'postal_code', 'latitude', 'longitude']
+
+CompanySnapshot = namedtuple('CompanySnapshot',
+                             ['pk'] + ADDRESS_FIELDS + ['gs1_company_prefix'])
+LocationSnapshot = namedtuple('LocationSnapshot',
+                              ['pk'] + ADDRESS_FIELDS + ['company_id'])
+MappingSnapshot = namedtuple('MappingSnapshot',
+                             ['pk', 'company', 'from_business', 'ship_from',
+                              'to_business', 'ship_to'])
+
+
+def get_snapshot(snapshot_type, record):
+    """
+    Copies the fields of a Company or Location into an immutable snapshot.
+    :param snapshot_type: CompanySnapshot or LocationSnapshot.
+    :param record: The model instance or None.
+    :return: A snapshot or None.
+    """
+    if record is None:
+        return None
+    return snapshot_type(record.pk, *(getattr(record, field)
+                                      for field in snapshot_type._fields[1:]))
+
+
+def get_mapping_snapshot(mapping):
+    """
+    Copies an OutboundMapping and its companies and locations into a
+    MappingSnapshot.
+    :param mapping: The OutboundMapping.
+    :return: A MappingSnapshot.
+    """
+    return MappingSnapshot(
+        mapping.pk,
+        get_snapshot(CompanySnapshot, mapping.company),
+        get_snapshot(CompanySnapshot, mapping.from_business),
+        get_snapshot(LocationSnapshot, mapping.ship_from),
+        get_snapshot(CompanySnapshot, mapping.to_business),
+        get_snapshot(LocationSnapshot, mapping.ship_to),
+    )
+
+
+def get_record_snapshot(record):
+    """
+    :param record: A Company, Location or OutboundMapping or a snapshot
+        of one.
+    :return: The record's snapshot or None for any other kind of record.
+    """
+    if isinstance(record, (CompanySnapshot, LocationSnapshot,
+                           MappingSnapshot)):
+        return record
+    if isinstance(record, Company):
+        return get_snapshot(CompanySnapshot, record)
+    if isinstance(record, Location):
+        return get_snapshot(LocationSnapshot, record)
+    if isinstance(record, OutboundMapping):
+        return get_mapping_snapshot(record)
+    return None
+
+
+class MappingCache:
+    """
+    Caches snapshots of OutboundMapping records by the GS1 company prefix
+    of the mapping's company.  Each mapping is loaded along with its
+    companies and locations in a single query and copied into a
+    MappingSnapshot, so templates can walk `from_business`, `ship_from`,
+    `to_business` and `ship_to` without touching the database.  The cache
+    is cleared whenever a Company, Location or OutboundMapping is saved or
+    deleted.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 300):
+        self.mappings = LRUCache(max_size, ttl)
+
+    def get_by_company_prefix(self, company_prefix: str):
+        """
+        :param company_prefix: The GS1 company prefix of the mapping's
+            company.
+        :return: A MappingSnapshot.
+        :raises OutboundMapping.DoesNotExist: If there is no mapping for
+            the company prefix.
+        """
+        snapshot = self.mappings.get(company_prefix)
+        if snapshot is None:
+            mapping = OutboundMapping.objects.select_related(
+                'company', 'from_business', 'ship_from', 'to_business',
+                'ship_to'
+            ).get(company__gs1_company_prefix=company_prefix)
+            snapshot = get_mapping_snapshot(mapping)
+            self.mappings.set(company_prefix, snapshot)
+        return snapshot
+
+    def clear(self):
+        self.mappings.clear()
+
+    @property
+    def stats(self):
+        return self.mappings.stats
+
+
+def get_trade_item_cache_settings():
+    """
+    :return: The `QUARTET_TRACELINK_TRADE_ITEM_CACHE_SIZE` and
+        `QUARTET_TRACELINK_TRADE_ITEM_CACHE_TTL` settings (1024 items and 300
+        seconds by default).
+    """
+    size = getattr(settings, 'QUARTET_TRACELINK_TRADE_ITEM_CACHE_SIZE', 1024)
+    ttl = getattr(settings, 'QUARTET_TRACELINK_TRADE_ITEM_CACHE_TTL', 300)
+    return size, ttl
+
+
+trade_item_cache = TradeItemCache(*get_trade_item_cache_settings())
+
+
+def invalidate_trade_item(sender, instance, **kwargs):
+    trade_item_cache.invalidate(instance)
+
+
+gln_resolver = GLNResolver(
+    getattr(settings, 'QUARTET_TRACELINK_GLN_CACHE_TTL', 300)
+)
+
+
+def invalidate_gln_resolver(sender, instance, **kwargs):
+    gln_resolver.clear()
+
+
+fragment_cache = FragmentCache(
+    getattr(settings, 'QUARTET_TRACELINK_FRAGMENT_CACHE_SIZE', 256),
+    getattr(settings, 'QUARTET_TRACELINK_FRAGMENT_CACHE_TTL', 300)
+)
+
+mapping_cache = MappingCache(
+    getattr(settings, 'QUARTET_TRACELINK_MAPPING_CACHE_SIZE', 256),
+    getattr(settings, 'QUARTET_TRACELINK_MAPPING_CACHE_TTL', 300)
+)
+
+
+def invalidate_mappings(sender, instance, **kwargs):
+    mapping_cache.clear()
+    fragment_cache.clear()
+
+
+post_save.connect(invalidate_trade_item, sender=TradeItem,
+                  dispatch_uid='quartet_tracelink_trade_item_save')
+post_delete.connect(invalidate_trade_item, sender=TradeItem,
+                    dispatch_uid='quartet_tracelink_trade_item_delete')
+post_save.connect(invalidate_gln_resolver, sender=Company,
+                  dispatch_uid='quartet_tracelink_company_save')
+post_delete.connect(invalidate_gln_resolver, sender=Company,
+                    dispatch_uid='quartet_tracelink_company_delete')
+for model in (Company, Location, OutboundMapping):
+    post_save.connect(
+        invalidate_mappings, sender=model,
+        dispatch_uid='quartet_tracelink_mappings_%s_save' % model.__name__)
+    post_delete.connect(
+        invalidate_mappings, sender=model,
+        dispatch_uid='quartet_tracelink_mappings_%s_delete' % model.__name__)
@@ -0,0 +1,119 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Date conversion for TraceLink, which only accepts second precision UTC
+timestamps.  The strict ISO 8601 formats that EPCPyYes and the EPCIS
+parsers produce are parsed directly; anything else falls back to
+dateutil.
+"""
+import re
+from datetime import datetime, timedelta, timezone
+
+from dateutil import parser
+
+TRACELINK_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+iso_regex = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})'
+    r'(?:\.(\d{1,6})\d*)?'
+    r'(Z|[+-]\d{2}:\d{2})?$'
+)
+
+_timezones = {'Z': timezone.utc, '+00:00': timezone.utc,
+              '-00:00': timezone.utc}
+_formatted = {}
+_MAX_FORMATTED = 4096
+
+
+def get_timezone(offset: str):
+    """
+    :param offset: A UTC offset such as `-05:00` or `Z`.
+    :return: A (cached) tzinfo for the offset.
+    """
+    tz = _timezones.get(offset)
+    if tz is None:
+        sign = -1 if offset[0] == '-' else 1
+        tz = timezone(sign * timedelta(hours=int(offset[1:3]),
+                                       minutes=int(offset[4:6])))
+        _timezones[offset] = tz
+    return tz
+
+
+def parse_datetime(value: str):
+    """
+    Parses an ISO 8601 timestamp.
+    :param value: The timestamp.
+    :return: A datetime.  It is naive if the timestamp has no offset.
+    :raises ValueError: If the value can not be parsed.
+    """
+    match = iso_regex.match(value)
+    if not match:
+        return parser.parse(value)
+    year, month, day, hour, minute, second, fraction, offset = \
+        match.groups()
+    try:
+        return datetime(
+            int(year), int(month), int(day), int(hour), int(minute),
+            int(second), int(fraction.ljust(6, '0')) if fraction else 0,
+            get_timezone(offset) if offset else None
+        )
+    except ValueError:
+        # out of range values- let dateutil decide
+        return parser.parse(value)
+
+
+def format_datetime(value: str, parse_utc: bool = True,
+                    increment_seconds: int = 0):
+    """
+    Converts a timestamp into TraceLink's format.
+    :param value: The timestamp.
+    :param parse_utc: Whether or not to convert the time to UTC.
+    :param increment_seconds: The number of seconds to add to the time.
+    :return: The formatted timestamp or the original value if it could not
+        be parsed.
+    """
+    key = (value, parse_utc)
+    if not increment_seconds:
+        formatted = _formatted.get(key)
+        if formatted is not None:
+            return formatted
+    try:
+        dt_obj = parse_datetime(value)
+        if parse_utc:
+            dt_obj = dt_obj.astimezone(timezone.utc)
+        if increment_seconds:
+            dt_obj = dt_obj + timedelta(seconds=increment_seconds)
+        formatted = dt_obj.strftime(TRACELINK_DATE_FORMAT)
+    except Exception:
+        return value
+    if not increment_seconds:
+        if len(_formatted) >= _MAX_FORMATTED:
+            _formatted.clear()
+        _formatted[key] = formatted
+    return formatted
+
+
+def get_event_time(event):
+    """
+    Event times that are marked as UTC (`+00:00`) on events with a
+    different time zone offset are treated as local to the event's offset.
+    :param event: An EPCPyYes event.
+    :return: The event time to convert.
+    """
+    event_time = event.event_time
+    offset = event.event_timezone_offset
+    if event_time.endswith('+00:00') and offset != '+00:00':
+        event_time = event_time[:-6] + offset
+    return event_time
@@ -0,0 +1,123 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Controls how much of a rendered document the output steps write to their
+task messages.
+"""
+import os
+import random
+import uuid
+
+from django.conf import settings
+
+from quartet_tracelink.rendering import DocumentReader, get_preview, \
+    COMPRESSION_EXTENSIONS
+
+
+class DocumentLogPolicy:
+    """
+    Decides how rendered documents are logged by an output step.  Task
+    messages are database rows, so at most a short preview of a document
+    is logged- never the whole thing.  Full documents can be written to a
+    directory for debugging, but only when Django's DEBUG setting is on.
+    """
+
+    def __init__(self, preview_bytes: int = 1000, sample_rate: float = 1.0,
+                 dump_directory: str = None, extension: str = 'xml',
+                 sample=random.random):
+        """
+        :param preview_bytes: The most bytes of a document to log.  Zero
+            turns previews off.
+        :param sample_rate: The fraction of executions that log a preview,
+            between 0 and 1.
+        :param dump_directory: The directory to write full documents to
+            when DEBUG is on.
+        :param extension: The file extension of the dumped documents.
+        :param sample: Returns a random number in [0, 1) when deciding
+            whether to log a preview.
+        """
+        self.preview_bytes = preview_bytes
+        self.sample_rate = sample_rate
+        self.dump_directory = dump_directory
+        self.extension = extension
+        self.sample = sample
+
+    @classmethod
+    def from_step(cls, step):
+        """
+        Creates a policy from a step's `Log Preview Bytes`,
+        `Log Sample Rate` and `Log Directory` parameters.
+        :param step: A quartet_capture step.
+        :return: A DocumentLogPolicy.
+        """
+        return cls(
+            preview_bytes=step.get_integer_parameter('Log Preview Bytes',
+                                                     1000),
+            sample_rate=float(step.get_parameter('Log Sample Rate', 1.0)),
+            dump_directory=step.get_parameter('Log Directory', None),
+            extension='json' if step.get_boolean_parameter(
+                'JSON', False) else 'xml'
+        )
+
+    def log(self, step, data, label: str = 'Rendered document'):
+        """
+        Logs a preview of the rendered document(s) and, when DEBUG is on
+        and a dump directory is configured, writes each one to a file.
+        :param step: The step to log the messages with.
+        :param data: A string, bytes, DocumentReader or a list of them.
+        :param label: Describes the document in the messages.
+        """
+        documents = data if isinstance(data, list) else [data]
+        if not documents:
+            return
+        compression = getattr(documents[0], 'compression', None)
+        if compression:
+            step.info('%s: %s %s compressed document(s), no preview.', label,
+                      len(documents), compression)
+        elif self.preview_bytes > 0 and self.sample() < self.sample_rate:
+            step.info('%s (first %s bytes of %s document(s)): %s', label,
+                      self.preview_bytes, len(documents),
+                      get_preview(documents[0], self.preview_bytes))
+        if not self.dump_directory:
+            return
+        if not settings.DEBUG:
+            step.info('Not writing the %s to %s since DEBUG is off.',
+                      label.lower(), self.dump_directory)
+            return
+        name = step.task.name if getattr(step, 'task', None) else \
+            uuid.uuid4().hex
+        for number, document in enumerate(documents, 1):
+            path = os.path.join(self.dump_directory, '%s-%s.%s%s' % (
+                name, number, self.extension, COMPRESSION_EXTENSIONS.get(
+                    compression, '')))
+            self.dump(document, path)
+            step.info('%s written to %s', label, path)
+
+    def dump(self, document, path: str):
+        """
+        Writes a full document to a file.
+        :param document: A string, bytes or DocumentReader.
+        :param path: The file to write.
+        """
+        with open(path, 'wb') as dump_file:
+            if isinstance(document, DocumentReader):
+                position = document.tell()
+                for chunk in document.chunks():
+                    dump_file.write(chunk)
+                document.seek(position)
+            elif isinstance(document, str):
+                dump_file.write(document.encode('utf-8'))
+            else:
+                dump_file.write(document)
@@ -0,0 +1,218 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+A compact list of EPC URNs for large commissioning events.
+"""
+from array import array
+from bisect import bisect_right
+from collections.abc import MutableSequence, Sequence
+
+# serials are packed as unsigned 64 bit integers
+MAX_SERIAL = 2 ** 64 - 1
+# sequential serials shorter than this are packed in an array instead of
+# being kept as a range
+MIN_RUN_LENGTH = 16
+
+
+def split_epc(epc: str):
+    """
+    Splits an EPC URN into the part shared by its siblings and the serial
+    number.
+    :param epc: The EPC URN.
+    :return: A tuple of the prefix (including the final period) and the
+        serial number.
+    """
+    prefix, period, serial = epc.rpartition('.')
+    return prefix + period, serial
+
+
+def is_numeric(serial: str):
+    """
+    :return: True if the serial number can be packed as an integer.
+    """
+    if not (serial.isascii() and serial.isdigit()):
+        return False
+    return int(serial) <= MAX_SERIAL
+
+
+class EPCList(MutableSequence):
+    """
+    A list of EPC URNs that stores the prefix shared by consecutive EPCs
+    once.  Numeric serial numbers are packed in an array of integers (or
+    kept as a range when they are sequential) and any other serial numbers
+    are kept as strings.  The URNs are built as the list is iterated, so
+    the list can be used anywhere a list of EPC strings is expected-
+    templates, the JSON encoders and the output steps.
+
+    EPCs are stored in segments of (prefix, width, serials) where width is
+    the number of digits in each numeric serial (so leading zeros are
+    preserved) or None if the serials are strings.
+    """
+    __hash__ = None
+
+    def __init__(self, epcs=()):
+        """
+        :param epcs: An iterable of EPC URNs.
+        """
+        self._segments = []
+        self._offsets = None
+        self._length = 0
+        self.extend(epcs)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for prefix, width, serials in self._segments:
+            if width is None:
+                for serial in serials:
+                    yield prefix + serial
+            else:
+                for serial in serials:
+                    yield '%s%0*d' % (prefix, width, serial)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return EPCList(self[i] for i in range(*index.indices(
+                self._length)))
+        index = self._get_index(index)
+        if self._offsets is None:
+            offsets, start = [], 0
+            for segment in self._segments:
+                offsets.append(start)
+                start += len(segment[2])
+            self._offsets = offsets
+        position = bisect_right(self._offsets, index) - 1
+        prefix, width, serials = self._segments[position]
+        serial = serials[index - self._offsets[position]]
+        if width is None:
+            return prefix + serial
+        return '%s%0*d' % (prefix, width, serial)
+
+    def __setitem__(self, index, value):
+        epcs = list(self)
+        epcs[index] = value
+        self._rebuild(epcs)
+
+    def __delitem__(self, index):
+        epcs = list(self)
+        del epcs[index]
+        self._rebuild(epcs)
+
+    def __contains__(self, epc):
+        if not isinstance(epc, str):
+            return False
+        prefix, serial = split_epc(epc)
+        numeric = is_numeric(serial)
+        for segment_prefix, width, serials in self._segments:
+            if segment_prefix != prefix:
+                continue
+            if width is None:
+                if serial in serials:
+                    return True
+            elif numeric and width == len(serial) and int(serial) in serials:
+                return True
+        return False
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            epc == other_epc for epc, other_epc in zip(self, other))
+
+    def __add__(self, other):
+        ret = self.copy()
+        ret.extend(other)
+        return ret
+
+    def __radd__(self, other):
+        ret = EPCList(other)
+        ret.extend(self)
+        return ret
+
+    def __copy__(self):
+        return self.copy()
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self))
+
+    def copy(self):
+        """
+        :return: A shallow copy of the list.
+        """
+        ret = EPCList()
+        ret._segments = [
+            (prefix, width, serials if isinstance(serials, range) else
+             serials[:])
+            for prefix, width, serials in self._segments
+        ]
+        ret._length = self._length
+        return ret
+
+    def insert(self, index, value):
+        if index >= self._length:
+            self.append(value)
+        else:
+            epcs = list(self)
+            epcs.insert(index, value)
+            self._rebuild(epcs)
+
+    def append(self, value):
+        if not isinstance(value, str):
+            raise TypeError('EPCs must be strings, not %s.' %
+                            value.__class__.__name__)
+        prefix, serial = split_epc(value)
+        width = len(serial) if is_numeric(serial) else None
+        self._length += 1
+        if self._segments:
+            last_prefix, last_width, serials = self._segments[-1]
+            if last_prefix == prefix and last_width == width:
+                if width is None:
+                    serials.append(serial)
+                    return
+                number = int(serial)
+                if isinstance(serials, array):
+                    serials.append(number)
+                    return
+                if number == serials.stop:
+                    self._segments[-1] = (prefix, width,
+                                          range(serials.start, number + 1))
+                    return
+                if len(serials) < MIN_RUN_LENGTH:
+                    serials = array('Q', serials)
+                    serials.append(number)
+                    self._segments[-1] = (prefix, width, serials)
+                    return
+        self._offsets = None
+        self._segments.append(
+            (prefix, width,
+             [serial] if width is None else range(int(serial),
+                                                  int(serial) + 1)))
+
+    def clear(self):
+        self._segments = []
+        self._offsets = None
+        self._length = 0
+
+    def _get_index(self, index):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('EPCList index out of range')
+        return index
+
+    def _rebuild(self, epcs):
+        self.clear()
+        self.extend(epcs)
@@ -0,0 +1,164 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Records how long each phase of an output step takes and how many database
+queries it runs.
+"""
+import functools
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from enum import Enum
+
+from django.db import connections
+from quartet_capture.models import TaskMessage
+
+NO_PHASE = nullcontext()
+TASK_MESSAGE_TABLE = TaskMessage._meta.db_table
+
+
+class TraceLinkContextKeys(Enum):
+    """
+    Rule context keys used by the TraceLink steps.
+
+    STEP_TIMINGS_KEY
+    ----------------
+    A dictionary of phase timings (see `PhaseTimer.as_dict`) keyed by the
+    name of the step that recorded them.
+
+    COMPRESSION_KEY
+    ---------------
+    A list with the file name, uncompressed and compressed size and
+    compression ratio of each document compressed by an output step.
+    """
+    STEP_TIMINGS_KEY = 'TRACELINK_STEP_TIMINGS'
+    COMPRESSION_KEY = 'TRACELINK_COMPRESSION'
+
+
+class PhaseTimer:
+    """
+    Accumulates the time spent and queries run in named phases.  Phases
+    may be nested- time and queries are attributed to the innermost phase
+    only, so the phases always add up to the total.  Queries against the
+    quartet_capture task message table (the step's own log messages) are
+    not counted.
+    """
+
+    def __init__(self, using: str = 'default', timer=time.perf_counter):
+        """
+        :param using: The database alias whose queries are counted.
+        :param timer: The clock used to time the phases.
+        """
+        self.using = using
+        self.timer = timer
+        self.timings = OrderedDict()
+        self.queries = OrderedDict()
+        self.recording = False
+        self._stack = []
+        self._started = None
+
+    @contextmanager
+    def record(self):
+        """
+        Counts the database queries run inside the block.
+        """
+        self.recording = True
+        try:
+            with connections[self.using].execute_wrapper(self._count_query):
+                yield self
+        finally:
+            self.recording = False
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Times the block as the named phase.
+        """
+        self._switch()
+        self._stack.append(name)
+        self.timings.setdefault(name, 0.0)
+        self.queries.setdefault(name, 0)
+        try:
+            yield
+        finally:
+            self._switch()
+            self._stack.pop()
+
+    def _switch(self):
+        # credit the elapsed time to the current phase
+        now = self.timer()
+        if self._stack:
+            self.timings[self._stack[-1]] += now - self._started
+        self._started = now
+
+    def _count_query(self, execute, sql, params, many, context):
+        # the task messages the step logs are not part of its work
+        if TASK_MESSAGE_TABLE not in sql:
+            name = self._stack[-1] if self._stack else 'other'
+            self.queries[name] = self.queries.get(name, 0) + 1
+        return execute(sql, params, many, context)
+
+    def as_dict(self):
+        """
+        :return: A dictionary with the seconds and queries of each phase
+            along with the totals.
+        """
+        phases = OrderedDict(
+            (name, {'seconds': round(self.timings.get(name, 0.0), 6),
+                    'queries': self.queries.get(name, 0)})
+            for name in list(self.timings) + [
+                name for name in self.queries if name not in self.timings]
+        )
+        return {
+            'phases': phases,
+            'seconds': round(sum(self.timings.values()), 6),
+            'queries': sum(self.queries.values()),
+        }
+
+    def summary(self):
+        """
+        :return: A single line summary of the phases.
+        """
+        timings = self.as_dict()
+        phases = ', '.join(
+            '%s %.3fs/%s queries' % (name, phase['seconds'], phase['queries'])
+            for name, phase in timings['phases'].items()
+        )
+        return '%s; total %.3fs/%s queries' % (
+            phases, timings['seconds'], timings['queries'])
+
+
+def instrumented(execute):
+    """
+    Decorates an output step's `execute` method so the phases it records
+    (see `TracelinkOutputStep.phase`) are summarized in a task message and
+    added to the rule context.  Does nothing unless the step has a timer.
+    """
+
+    @functools.wraps(execute)
+    def wrapper(self, data, rule_context):
+        timer = self.timer
+        if timer is None or timer.recording:
+            return execute(self, data, rule_context)
+        with timer.record():
+            ret = execute(self, data, rule_context)
+        self.info('Timings: %s', timer.summary())
+        name = self.db_step.name if self.db_step else self.__class__.__name__
+        rule_context.context.setdefault(
+            TraceLinkContextKeys.STEP_TIMINGS_KEY.value, {}
+        )[name] = timer.as_dict()
+        return ret
+
+    return wrapper
@@ -0,0 +1,141 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.translation import gettext as _
+
+from quartet_capture.models import Rule
+from quartet_tracelink.offline import convert_file
+
+
+def initialize_worker():
+    # each worker needs its own database connection
+    django.setup()
+    connections.close_all()
+
+
+def get_files(paths):
+    """
+    :param paths: A list of files, directories and glob patterns.
+    :return: A sorted list of the files they match.  Directories are not
+        searched recursively.
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            path = os.path.join(path, '*')
+        files.update(file for file in glob.glob(path)
+                     if os.path.isfile(file))
+    return sorted(files)
+
+
+class Command(BaseCommand):
+    help = _(
+        'Runs EPCIS files through a TraceLink output rule (by default the '
+        'rule created by setup_tracelink) and writes the TraceLink XML to '
+        'a directory.  No tasks are created, nothing is queued for '
+        'transport and the inbound events are not saved to the database '
+        '(Skip Parsing is forced on for the parsing steps).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='+',
+            help=_('EPCIS files, directories or glob patterns.')
+        )
+        parser.add_argument(
+            '--output-directory', required=True,
+            help=_('The directory to write the TraceLink XML to.')
+        )
+        parser.add_argument(
+            '--rule', default='TraceLink EPCIS Output Filter',
+            help=_('The name of the output rule to run.')
+        )
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help=_('The number of worker processes.  Use 1 to convert the '
+                   'files in this process.')
+        )
+
+    def handle(self, *args, **options):
+        rule_name = options['rule']
+        if not Rule.objects.filter(name=rule_name).exists():
+            raise CommandError(_('There is no rule named %s.') % rule_name)
+        files = get_files(options['paths'])
+        if not files:
+            raise CommandError(_('No EPCIS files were found.'))
+        output_directory = options['output_directory']
+        os.makedirs(output_directory, exist_ok=True)
+        processes = max(1, min(options['processes'] or 1, len(files)))
+        event_count = 0
+        document_count = 0
+        failures = []
+        start = time.perf_counter()
+        for path, result in self.convert(files, rule_name, output_directory,
+                                         processes):
+            if isinstance(result, Exception):
+                failures.append(path)
+                self.stderr.write('%s: %s' % (path, result))
+                continue
+            events, documents = result
+            event_count += events
+            document_count += len(documents)
+            if options['verbosity'] > 1:
+                self.stdout.write('%s: %s events, %s documents' % (
+                    path, events, len(documents)))
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        self.stdout.write(
+            _('Converted %s files (%s events) into %s documents in %.2fs: '
+              '%.1f files/sec, %.1f events/sec') % (
+                len(files) - len(failures), event_count, document_count,
+                elapsed, len(files) / elapsed, event_count / elapsed)
+        )
+        if failures:
+            raise CommandError(_('%s files could not be converted.') %
+                               len(failures))
+
+    def convert(self, files, rule_name, output_directory, processes):
+        """
+        Converts the files, in this process or with a process pool.
+        :return: A generator of (path, result) tuples where the result is
+            the return value of `convert_file` or the exception it raised.
+        """
+        if processes == 1:
+            for path in files:
+                try:
+                    yield path, convert_file(rule_name, path,
+                                             output_directory)
+                except Exception as e:
+                    yield path, e
+            return
+        connections.close_all()
+        with ProcessPoolExecutor(processes,
+                                 initializer=initialize_worker) as executor:
+            futures = {
+                executor.submit(convert_file, rule_name, path,
+                                output_directory): path
+                for path in files
+            }
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    yield futures[future], e
@@ -0,0 +1,55 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import gettext as _
+
+from quartet_tracelink.parsing.epcpyyes import environment_registry, \
+    get_bytecode_cache, DEFAULT_TEMPLATE_PACKAGES
+
+
+class Command(BaseCommand):
+    help = _(
+        'Compiles the TraceLink templates (and the EPCPyYes templates they '
+        'include) into the Jinja2 bytecode cache so new workers do not '
+        'have to compile them on first use.  Uses the '
+        'QUARTET_TRACELINK_TEMPLATE_CACHE_DIR setting unless a directory '
+        'is supplied.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory',
+            help=_('The bytecode cache directory to populate.')
+        )
+
+    def handle(self, *args, **options):
+        bytecode_cache = get_bytecode_cache(options.get('directory'))
+        if not bytecode_cache:
+            raise CommandError(
+                _('No bytecode cache directory was supplied and the '
+                  'QUARTET_TRACELINK_TEMPLATE_CACHE_DIR setting is not '
+                  'configured.')
+            )
+        env = environment_registry.create_environment(
+            DEFAULT_TEMPLATE_PACKAGES, bytecode_cache=bytecode_cache
+        )
+        compiled = 0
+        for name in env.list_templates():
+            env.get_template(name)
+            compiled += 1
+        self.stdout.write(
+            _('Compiled %s templates into %s') % (compiled,
+                                                  bytecode_cache.directory)
+        )
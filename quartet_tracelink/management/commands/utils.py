@@ -71,7 +71,7 @@ def create_output_filter_rule(rule_name='Tracelink Delayed Output Filter',
         output_step = models.Step.objects.create(
             name=_('Queue Outbound Message'),
             description=_('Creates a Task for sending any outbound data'),
-            step_class='quartet_output.steps.CreateOutputTaskStep',
+            step_class='quartet_tracelink.steps.CreateOutputTaskStep',
             order=5,
             rule=rule
         )
@@ -150,7 +150,7 @@ def create_output_filter_rule(rule_name='Tracelink Delayed Output Filter',
                 description=_('Creates a task and sends it to the delayed '
                               'transport rule or whatever transport rule is '
                               'configured via the Output Rule step parameter.'),
-                step_class='quartet_output.steps.CreateOutputTaskStep',
+                step_class='quartet_tracelink.steps.CreateOutputTaskStep',
                 order=8,
                 rule=rule
             )
@@ -313,7 +313,7 @@ def create_task_step(rule, order=5, transport_rule='Transport Rule'):
     step.rule = rule
     step.order = order
     step.name = 'Create Output Task'
-    step.step_class = 'quartet_output.steps.CreateOutputTaskStep'
+    step.step_class = 'quartet_tracelink.steps.CreateOutputTaskStep'
     step.description = 'Looks for any EPCIS data on the context and ' \
                        'then, if found, creates a new output task using ' \
                        'the configured Output Rule step parameter.'
@@ -0,0 +1,181 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Runs a configured outbound rule against EPCIS files without creating
+Task records or queueing outbound messages.  Used to re-send historical
+data and to backfill new trading partners.
+"""
+import logging
+import os
+import shutil
+import uuid
+from pydoc import locate
+
+from quartet_capture import models
+from quartet_capture.rules import Rule, TaskMessageLevel
+from quartet_output.steps import ContextKeys, CreateOutputTaskStep, \
+    OutputParsingStep
+
+logger = logging.getLogger(__name__)
+
+
+class OfflineMessagingMixin:
+    """
+    Logs task messages instead of writing them to the database.
+    """
+
+    def _create_task_message(self, *args, task=None,
+                             level=TaskMessageLevel.INFO):
+        logger.debug(*args)
+
+
+class OfflineParameterMixin:
+    """
+    Reads parameters that a step would otherwise create in the database
+    from its configured parameters only.
+    """
+
+    def get_or_create_parameter(self, name: str, default: str,
+                                description: str = 'Default value.'):
+        return self.parameters.get(name, default)
+
+
+_offline_classes = {}
+
+
+def get_offline_class(step_class):
+    """
+    :param step_class: A Step class.
+    :return: A subclass of the step class that logs its task messages and
+        does not create step parameters.
+    """
+    offline_class = _offline_classes.get(step_class)
+    if offline_class is None:
+        offline_class = type(
+            step_class.__name__,
+            (OfflineMessagingMixin, OfflineParameterMixin, step_class), {})
+        _offline_classes[step_class] = offline_class
+    return offline_class
+
+
+class OfflineRule(OfflineMessagingMixin, Rule):
+    """
+    A Rule that runs its steps against an unsaved Task.  Task messages are
+    logged instead of being written to the database, parsing steps only
+    filter the inbound events (`Skip Parsing` is forced on so nothing is
+    saved to the EPCIS tables), missing step parameters are not created
+    and any steps that would queue the outbound message for transport are
+    skipped- the rendered documents are left in the rule context.
+    """
+
+    def __init__(self, rule: models.Rule, task_name: str = None):
+        """
+        :param rule: The configured rule, typically the rule created by
+            the `setup_tracelink` command.
+        :param task_name: The name to give the (unsaved) task.
+        """
+        super().__init__(
+            rule, models.Task(rule=rule, name=task_name or uuid.uuid4().hex)
+        )
+        self.steps = {
+            order: step for order, step in self.steps.items()
+            if not isinstance(step, CreateOutputTaskStep)
+        }
+
+    def _load_step(self, db_step: models.Step):
+        step = locate(db_step.step_class) or self._step_import(
+            db_step.step_class)
+        if not step:
+            raise Rule.StepNotFound(
+                'The step %s could not be loaded.' % db_step.step_class)
+        step = get_offline_class(step)
+        step.db_step = db_step
+        params = {p.name: p.value for p in db_step.stepparameter_set.all()}
+        if issubclass(step, OutputParsingStep):
+            params['Skip Parsing'] = 'True'
+        return step(self.db_task, **params)
+
+    def _on_step_failure(self, step):
+        step.on_failure()
+
+    @property
+    def documents(self):
+        """
+        :return: A list of the rendered documents (strings or
+            DocumentReaders).
+        """
+        data = self.context.context.get(
+            ContextKeys.OUTBOUND_EPCIS_MESSAGE_KEY.value)
+        if data is None:
+            return []
+        return data if isinstance(data, list) else [data]
+
+    @property
+    def event_count(self):
+        """
+        :return: The number of events that were filtered from the input or
+            added by the rule's steps.
+        """
+        context = self.context.context
+        return sum(len(context.get(key.value) or []) for key in (
+            ContextKeys.FILTERED_EVENTS_KEY,
+            ContextKeys.OBJECT_EVENTS_KEY,
+            ContextKeys.AGGREGATION_EVENTS_KEY,
+        ))
+
+
+def write_output(document, path: str):
+    """
+    Writes a rendered document to a file.
+    :param document: A string, bytes or a DocumentReader.
+    :param path: The file to write.
+    """
+    if isinstance(document, str):
+        document = document.encode('utf-8')
+    with open(path, 'wb') as output:
+        if isinstance(document, bytes):
+            output.write(document)
+        else:
+            try:
+                shutil.copyfileobj(document, output)
+            finally:
+                document.close()
+                if document.path:
+                    os.remove(document.path)
+
+
+def convert_file(rule_name: str, path: str, output_directory: str):
+    """
+    Runs the rule against an EPCIS file and writes the TraceLink documents
+    to the output directory.  Files that produce more than one document
+    have the document number appended to their name.
+    :param rule_name: The name of the configured rule.
+    :param path: The EPCIS file.
+    :param output_directory: The directory to write the documents to.
+    :return: A tuple of the number of events and a list of the files that
+        were written.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    rule = OfflineRule(models.Rule.objects.get(name=rule_name), name)
+    with open(path, 'rb') as data:
+        rule.execute(data.read())
+    documents = rule.documents
+    paths = []
+    for number, document in enumerate(documents, 1):
+        file_name = '%s-%s.xml' % (name, number) if len(documents) > 1 \
+            else '%s.xml' % name
+        paths.append(os.path.join(output_directory, file_name))
+        write_output(document, paths[-1])
+    return rule.event_count, paths
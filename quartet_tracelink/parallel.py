@@ -0,0 +1,270 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Renders the events of a document across a pool of worker processes.  The
+events are split into chunks, sent to the workers without their jinja
+environments and templates (which can not be pickled) and rendered there
+exactly as `quartet_tracelink.rendering.render_events` would render them.
+The rendered chunks then take the place of the events in the document so
+the document template only has to stitch them together.
+"""
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+import EPCPyYes
+from django.conf import settings
+from EPCPyYes.core.v1_2.template_events import _load_default_environment
+
+from quartet_tracelink.parsing.epcpyyes import get_default_environment
+from quartet_tracelink.rendering import RenderedEvents, get_document_context
+
+# the template environments a worker can recreate
+TRACELINK = 'tracelink'
+EPCPYYES = 'epcpyyes'
+NATIVE = 'native'
+
+EPCPYYES_TEMPLATES = os.path.join(os.path.dirname(EPCPyYes.__file__),
+                                  'templates')
+# the document templates that render their events with render_events
+RENDER_EVENTS_TEMPLATES = (
+    'quartet_tracelink/tracelink_epcis_events_document.xml',
+    'quartet_tracelink/tracelink_epcis_events_document_gln_header.xml',
+    'quartet_tracelink/tracelink_epcis_events_masterdata.xml',
+)
+# event attributes that are recreated by the worker
+EVENT_TEMPLATE_ATTRIBUTES = ('_env', '_template', '_context')
+
+_executors = {}
+_worker_templates = {}
+
+
+class NotTransferable(Exception):
+    """
+    Raised when a document or event can only be rendered in this process.
+    """
+    pass
+
+
+def get_executor(processes: int):
+    """
+    Returns the process pool for the given number of processes, creating it
+    on first use.  Pools are kept for the life of the process so workers
+    (and their compiled templates) are reused by later tasks.  Workers are
+    spawned rather than forked so they never share this process's database
+    connections.
+    :param processes: The number of worker processes.
+    :return: A ProcessPoolExecutor.
+    """
+    executor = _executors.get(processes)
+    if executor is None:
+        executor = _executors[processes] = ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context('spawn'),
+            # this module can not be imported until django is set up
+            initializer=django.setup
+        )
+    return executor
+
+
+def shutdown_executors():
+    """
+    Shuts down every process pool created by `get_executor`.
+    """
+    while _executors:
+        _executors.popitem()[1].shutdown()
+
+
+def get_template_key(template, env=None):
+    """
+    :param template: The template of an event.
+    :param env: The default TraceLink environment.
+    :return: A tuple a worker can use to load the same template (see
+        `get_worker_template`).
+    :raises NotTransferable: If the template was not loaded by name from
+        the TraceLink or EPCPyYes environment.
+    """
+    env = env or get_default_environment()
+    serializer = getattr(template, 'serializer', None)
+    if serializer is not None:
+        return NATIVE, serializer.__class__
+    name = getattr(template, 'name', None)
+    if name and template.environment is env:
+        return TRACELINK, name
+    if name and (template.filename or '').startswith(EPCPYYES_TEMPLATES):
+        return EPCPYYES, name
+    raise NotTransferable('The %s template can not be loaded by the '
+                          'render workers.' % (name or 'unnamed'))
+
+
+def get_worker_template(key):
+    """
+    Loads a template in a worker process.
+    :param key: A key from `get_template_key`.
+    :return: A jinja2 Template.
+    """
+    template = _worker_templates.get(key)
+    if template is None:
+        kind, name = key
+        if kind == NATIVE:
+            template = name().as_template()
+        elif kind == TRACELINK:
+            template = get_default_environment().get_template(name)
+        else:
+            template = _get_epcpyyes_environment().get_template(name)
+        _worker_templates[key] = template
+    return template
+
+
+def _get_epcpyyes_environment():
+    env = _worker_templates.get(EPCPYYES)
+    if env is None:
+        env = _worker_templates[EPCPYYES] = _load_default_environment()
+    return env
+
+
+def pack_events(events: list, env=None):
+    """
+    Converts events into a compact, picklable form.
+    :param events: EPCPyYes template events.
+    :param env: The default TraceLink environment.
+    :return: The pickled events.
+    :raises NotTransferable: If an event's template can not be recreated
+        or the event can not be pickled.
+    """
+    packed = [
+        (event.__class__,
+         {name: value for name, value in event.__dict__.items()
+          if name not in EVENT_TEMPLATE_ATTRIBUTES},
+         get_template_key(event.template, env))
+        for event in events
+    ]
+    try:
+        return pickle.dumps(packed, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        raise NotTransferable('The events can not be pickled: %s' % e)
+
+
+def render_chunk(context: dict, data: bytes):
+    """
+    Renders a chunk of packed events.  Runs in the worker processes.
+    :param context: The document's template context (without the events).
+    :param data: Events packed by `pack_events`.
+    :return: The rendered events.
+    """
+    env = get_default_environment()
+    parent = dict(env.globals, **context)
+    out = []
+    for event_class, state, key in pickle.loads(data):
+        template = get_worker_template(key)
+        event = event_class.__new__(event_class)
+        event.__dict__.update(state)
+        event._env = template.environment
+        event._template = template
+        event._context = {
+            'event': event,
+            'render_xml_declaration': state.get('_render_xml_declaration',
+                                                False)
+        }
+        out.extend(template.root_render_func(
+            template.new_context(parent, True, {'event': event})))
+    return ''.join(out)
+
+
+def uses_render_events(template):
+    """
+    :param template: A document template.
+    :return: True if the template is one of the `RENDER_EVENTS_TEMPLATES`
+        (or the templates listed in the
+        `QUARTET_TRACELINK_RENDER_EVENTS_TEMPLATES` django setting) and was
+        loaded by an environment with the `render_events` global, so it can
+        take pre-rendered events.
+    """
+    names = set(RENDER_EVENTS_TEMPLATES)
+    if settings.configured:
+        names.update(getattr(settings,
+                             'QUARTET_TRACELINK_RENDER_EVENTS_TEMPLATES', ()))
+    return template.name in names and 'render_events' in template.globals
+
+
+def prerender_events(epcis_document, processes: int, chunk_size: int = 1000):
+    """
+    Renders the document's events in a process pool and replaces them with
+    the rendered chunks.  Rendering the document afterwards gives the same
+    output as rendering it with the original events.  Transformation
+    events are rendered in this process since they go into the document's
+    extension and events that were already rendered are left in place.
+    :param epcis_document: An EPCISEventListDocument.
+    :param processes: The number of worker processes.
+    :param chunk_size: The number of events rendered by each task.
+    :raises NotTransferable: If the document can not be rendered in
+        parallel (including when this is a daemonic process, which can not
+        have children).  The document is unchanged.
+    :raises BrokenProcessPool: If the render processes could not be
+        started or died.  The document is unchanged.
+    """
+    if not uses_render_events(epcis_document._template):
+        raise NotTransferable('The document template does not use '
+                              'render_events.')
+    context = get_document_context(epcis_document)
+    events = context.pop('template_events')
+    context.pop('transformation_events')
+    env = get_default_environment()
+    # runs of events that were already rendered are left as they are
+    segments = []
+    for event in events:
+        if isinstance(event, RenderedEvents):
+            segments.append(event)
+        elif segments and isinstance(segments[-1], list) and \
+                len(segments[-1]) < chunk_size:
+            segments[-1].append(event)
+        else:
+            segments.append([event])
+    chunks = [pack_events(segment, env) for segment in segments
+              if isinstance(segment, list)]
+    if not chunks:
+        return
+    try:
+        pickle.dumps(context, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        raise NotTransferable('The document context can not be pickled: '
+                              '%s' % e)
+    if multiprocessing.current_process().daemon:
+        # multiprocessing refuses to start them with an AssertionError
+        raise NotTransferable('Daemonic processes (for example Celery '
+                              'prefork workers) can not start render '
+                              'processes.')
+    executor = get_executor(processes)
+    try:
+        rendered = iter(list(executor.map(
+            render_chunk, [context] * len(chunks), chunks)))
+    except pickle.PicklingError as e:
+        raise NotTransferable('The events could not be sent to the render '
+                              'processes: %s' % e)
+    except AssertionError as e:
+        # the pool could not start its processes
+        _executors.pop(processes, None)
+        raise BrokenProcessPool('The render processes could not be '
+                                'started: %s' % e) from e
+    except (BrokenProcessPool, OSError):
+        # the next document starts a new pool
+        _executors.pop(processes, None)
+        raise
+    epcis_document.template_events = [
+        segment if isinstance(segment, RenderedEvents)
+        else RenderedEvents(next(rendered)) for segment in segments
+    ]
@@ -12,33 +12,179 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 # Copyright 2018 SerialLab Corp.  All rights reserved.
+import os
+import threading
 from datetime import datetime
+from hashlib import sha1
 
+from django.conf import settings
+from jinja2.bccache import FileSystemBytecodeCache
 from jinja2.environment import Environment
 from jinja2.loaders import ChoiceLoader, PackageLoader
 
+import EPCPyYes
 from EPCPyYes.core.v1_2 import template_events
 from EPCPyYes.core.v1_2.events import ErrorDeclaration, Action
 
 
+from quartet_tracelink import __version__
+from quartet_tracelink.rendering import cached_include, render_events, \
+    serialize_native
+
+DEFAULT_TEMPLATE_PACKAGES = (
+    ('EPCPyYes', 'templates'),
+    ('quartet_tracelink', 'templates'),
+)
+
+
+class EnvironmentRegistry:
+    """
+    Keeps one Jinja2 environment per loader configuration for the life of
+    the process so that compiled templates are shared by every parser,
+    step and event in a worker instead of being recompiled each time an
+    environment is created.
+    """
+
+    def __init__(self):
+        self._environments = {}
+        self._lock = threading.Lock()
+
+    def get_environment(self, packages=DEFAULT_TEMPLATE_PACKAGES):
+        """
+        Returns the shared environment for the given loader configuration,
+        creating it on first use.
+        :param packages: A sequence of (package name, template path) tuples
+            in the order they should be searched.
+        :return: A Jinja2 Environment.
+        """
+        key = tuple(tuple(package) for package in packages)
+        env = self._environments.get(key)
+        if env is None:
+            with self._lock:
+                env = self._environments.get(key)
+                if env is None:
+                    env = self.create_environment(key)
+                    self._environments[key] = env
+        return env
+
+    def create_environment(self, packages, bytecode_cache=None):
+        """
+        Override to change how new environments are constructed.
+        :param packages: A tuple of (package name, template path) tuples.
+        :param bytecode_cache: An optional Jinja2 bytecode cache.  If
+            not supplied, the cache configured in the django settings (if
+            any) is used.
+        :return: A new Jinja2 Environment.
+        """
+        loader = ChoiceLoader(
+            [PackageLoader(name, path) for name, path in packages]
+        )
+        if bytecode_cache is None:
+            bytecode_cache = get_bytecode_cache()
+        env = Environment(loader=loader,
+                          extensions=['jinja2.ext.with_'], trim_blocks=True,
+                          lstrip_blocks=True,
+                          auto_reload=get_auto_reload(),
+                          bytecode_cache=bytecode_cache)
+        env.globals['render_events'] = render_events
+        env.globals['cached_include'] = cached_include
+        env.globals['serialize_native'] = serialize_native
+        return env
+
+    def invalidate(self, packages=None):
+        """
+        Drops cached environments so the next request builds a new one.
+        :param packages: The loader configuration to drop.  If None, every
+            environment in the registry is dropped.
+        :return: None
+        """
+        with self._lock:
+            if packages is None:
+                self._environments.clear()
+            else:
+                key = tuple(tuple(package) for package in packages)
+                self._environments.pop(key, None)
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """
+    Stores compiled templates on disk so new workers can skip compilation.
+    Cache keys include the quartet_tracelink and EPCPyYes versions along
+    with the modification time of the template file so upgrades and
+    edited templates never load stale bytecode.
+    """
+
+    def __init__(self, directory=None,
+                 pattern='__quartet_tracelink_%s.cache'):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        super().__init__(directory, pattern)
+
+    def get_cache_key(self, name, filename=None):
+        key = sha1(name.encode('utf-8'))
+        key.update(('|%s|%s' % (__version__,
+                                EPCPyYes.__version__)).encode('utf-8'))
+        if filename is not None:
+            try:
+                mtime = os.path.getmtime(filename)
+            except OSError:
+                mtime = 0
+            key.update(('|%s|%r' % (filename, mtime)).encode('utf-8'))
+        return key.hexdigest()
+
+
+def get_bytecode_cache(directory=None):
+    """
+    Returns a bytecode cache for the directory supplied or the one
+    configured with the `QUARTET_TRACELINK_TEMPLATE_CACHE_DIR` django
+    setting.
+    :param directory: Overrides the configured directory.
+    :return: A TemplateBytecodeCache or None if no directory is configured.
+    """
+    if not directory and settings.configured:
+        directory = getattr(settings, 'QUARTET_TRACELINK_TEMPLATE_CACHE_DIR',
+                            None)
+    if directory:
+        return TemplateBytecodeCache(directory)
+    return None
+
+
+def get_auto_reload():
+    """
+    Whether templates are checked for changes each time they are loaded
+    (including every `{% include %}` of every rendered event).  Set the
+    `QUARTET_TRACELINK_TEMPLATE_AUTO_RELOAD` django setting to False to
+    turn the check off; it is on by default.
+    :return: A boolean.
+    """
+    if not settings.configured:
+        return True
+    return getattr(settings, 'QUARTET_TRACELINK_TEMPLATE_AUTO_RELOAD', True)
+
+
+environment_registry = EnvironmentRegistry()
+
+
 def get_default_environment():
     '''
     Loads up the default Jinja2 environment so simple template names can
     be passed in.  This includes the local templates on top of the
-    existing EPCPyYes templates.
+    existing EPCPyYes templates.  The environment is shared across the
+    process; see `invalidate_environments` to force a reload.
 
     :return: The defualt Jinja2 environment for this package.
     '''
-    loader = ChoiceLoader(
-        [
-            PackageLoader('EPCPyYes', 'templates'),
-            PackageLoader('quartet_tracelink', 'templates')
-        ]
-    )
-    env = Environment(loader=loader,
-                      extensions=['jinja2.ext.with_'], trim_blocks=True,
-                      lstrip_blocks=True)
-    return env
+    return environment_registry.get_environment()
+
+
+def invalidate_environments(packages=None):
+    """
+    Discards shared environments (and with them their compiled template
+    caches).
+    :param packages: The loader configuration to drop or None for all.
+    :return: None
+    """
+    environment_registry.invalidate(packages)
 
 
 class ObjectEvent(template_events.ObjectEvent):
@@ -15,16 +15,33 @@
 import logging
 
 from EPCPyYes.core.v1_2 import template_events, events as yes_events
-from gs123.conversion import URNConverter
 from quartet_integrations.gs1ushc.mixins import ConversionMixin
 from quartet_masterdata.models import Company
 from quartet_masterdata.db import DBProxy
 from quartet_output.models import EPCISOutputCriteria
 from quartet_output.parsing import BusinessOutputParser
+from quartet_tracelink.cache import trade_item_cache, gln_resolver
+from quartet_tracelink.epcs import EPCList
 from quartet_tracelink.parsing.epcpyyes import get_default_environment
+from quartet_tracelink.urns import urn_decoder
 
 logger = logging.getLogger(__name__)
 
+# the EPC list elements and the event attributes they are parsed into
+EPC_LISTS = {
+    'epcList': 'epc_list',
+    'childEPCs': 'child_epcs',
+    'inputEPCList': 'input_epc_list',
+    'outputEPCList': 'output_epc_list',
+}
+
+
+def get_local_name(element):
+    """
+    :return: The tag of the element without its namespace.
+    """
+    return element.tag.rpartition('}')[2]
+
 
 class TraceLinkEPCISParser(ConversionMixin, BusinessOutputParser):
 
@@ -52,6 +69,79 @@ class TraceLinkEPCISParser(ConversionMixin, BusinessOutputParser):
             self.info_func(*args)
 
 
+class EPCStreamingMixin:
+    """
+    Reads the EPCs of each event into an `EPCList` as the parser reaches
+    them and removes their elements from the tree right away.  The base
+    parser only handles an event once its closing tag has been read, so
+    without this an event with a million EPCs keeps a million elements in
+    the tree (and then a million strings in its EPC list) until it is
+    parsed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending_epcs = {}
+        # the list element being read and its EPCs
+        self.epc_parent = None
+        self.epcs = None
+
+    def handle_unexpected_element(self, event, element):
+        tag = element.tag
+        if isinstance(tag, str) and (tag == 'epc' or tag.endswith('}epc')):
+            parent = element.getparent()
+            if parent is not None and parent is not self.epc_parent:
+                list_name = get_local_name(parent)
+                if list_name in EPC_LISTS:
+                    self.epc_parent = parent
+                    self.epcs = self.pending_epcs[list_name] = EPCList()
+            if parent is not None and parent is self.epc_parent:
+                self.epcs.append(element.text)
+                parent.remove(element)
+                return
+        super().handle_unexpected_element(event, element)
+
+    def clear_element(self, element):
+        super().clear_element(element)
+        # EPCs from lists the event parser did not recognize
+        self.pending_epcs.clear()
+        self.epc_parent = None
+        self.epcs = None
+
+    def set_epcs(self, event, list, attribute):
+        """
+        Assigns the EPCs read for the list element to the event.
+        :return: False if no EPCs were read for the list.
+        """
+        epcs = self.pending_epcs.pop(get_local_name(list), None)
+        if epcs is None:
+            return False
+        setattr(event, attribute, epcs)
+        return True
+
+    def parse_epc_list(self, event, list):
+        attribute = 'epc_list' if hasattr(event, 'epc_list') else \
+            'child_epcs'
+        if not self.set_epcs(event, list, attribute):
+            super().parse_epc_list(event, list)
+
+    def parse_input_epc_list(self, event, list):
+        if not self.set_epcs(event, list, 'input_epc_list'):
+            super().parse_input_epc_list(event, list)
+
+    def parse_output_epc_list(self, event, list):
+        if not self.set_epcs(event, list, 'output_epc_list'):
+            super().parse_output_epc_list(event, list)
+
+
+class TraceLinkStreamingEPCISParser(EPCStreamingMixin, TraceLinkEPCISParser):
+    """
+    A `TraceLinkEPCISParser` for very large inbound documents.  See the
+    `Streaming Parse` parameter of the `OutputParsingStep`.
+    """
+    pass
+
+
 class TraceLinkEPCISCommonAttributesParser(TraceLinkEPCISParser):
     """
     Handles the insane tracelink garbage formats.
@@ -66,7 +156,6 @@ class TraceLinkEPCISCommonAttributesParser(TraceLinkEPCISParser):
                          object_event_template)
         self.lot = None
         self.expiry = None
-        self.trade_items = {}
         self.uom_choices = {'Bdl': 'PK', 'Cs': 'CA', 'Ea': 'EA', 'Bx': 'EA'}
         self.packaging_line = None
         self.NDC_pattern = None
@@ -80,11 +169,10 @@ class TraceLinkEPCISCommonAttributesParser(TraceLinkEPCISParser):
         if not self.have_checked_company:
             self.have_checked_company = True
             epc = epcis_event.epc_list[0]
-            company_prefix = URNConverter(epc).company_prefix
+            company_prefix = urn_decoder.get_company_prefix(epc)
             try:
-                company = Company.objects.get(
-                    gs1_company_prefix=company_prefix)
-                self.receiver_gln = company.GLN13
+                self.receiver_gln = gln_resolver.get_gln_by_company_prefix(
+                    company_prefix)
             except Company.DoesNotExist:
                 self.info('could not find a company for prefix %s',
                           company_prefix)
@@ -122,12 +210,12 @@ class TraceLinkEPCISCommonAttributesParser(TraceLinkEPCISParser):
 
     def get_trade_item(self, urn):
         """
-        Returns a trade item from the local cache or the database.
+        Returns a trade item from the process level trade item cache or
+        the database.
         :param urn: The urn to use to find the trade item
         :return: A TradeItem model instance.
         """
-        trade_item = self.trade_items.get(
-            urn[:urn.rindex('.')]) or self.proxy.get_trade_item_by_urn(urn)
+        return trade_item_cache.get_by_urn(urn)
 
     def get_common_attributes(self, epcis_event: yes_events.ObjectEvent):
         """
@@ -139,7 +227,7 @@ class TraceLinkEPCISCommonAttributesParser(TraceLinkEPCISParser):
         urn = epcis_event.epc_list[0]
         self.get_packaging_line(epcis_event)
         if 'gtin' in urn:
-            trade_item = self.proxy.get_trade_item_by_urn(urn)
+            trade_item = self.get_trade_item(urn)
             if not trade_item:
                 raise self.TradeItemNotFoundError(
                     'Could not find a corresponding trade item for URN %s' %
@@ -153,7 +241,7 @@ class TraceLinkEPCISCommonAttributesParser(TraceLinkEPCISParser):
                 epcis_event.NDC_pattern = self.get_ndc_string(
                     trade_item.NDC_pattern)
         if 'sscc' in urn:
-            epcis_event.company_prefix = URNConverter(urn).company_prefix
+            epcis_event.company_prefix = urn_decoder.get_company_prefix(urn)
             epcis_event.packaging_uom = 'PL'
             epcis_event.is_gtin = False
             epcis_event.NDC_pattern = self.NDC_pattern
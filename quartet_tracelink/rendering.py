@@ -0,0 +1,582 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Helpers for rendering EPCPyYes documents without holding the entire
+output in memory.
+"""
+import gzip
+import io
+import os
+import re
+import zipfile
+from contextlib import contextmanager
+
+from EPCPyYes.core.v1_2.template_events import EPCISEventListDocument, \
+    TransformationEvent
+from markupsafe import Markup
+
+try:
+    from jinja2 import pass_context
+except ImportError:  # jinja2 < 3.0
+    from jinja2 import contextfunction as pass_context
+
+from quartet_tracelink.cache import fragment_cache
+
+# the supported compression formats and their file extensions
+COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'zip': '.zip'}
+# whitespace between two tags
+BETWEEN_TAGS = re.compile(r'>\s+<')
+
+
+def get_document_context(epcis_document: EPCISEventListDocument):
+    """
+    Builds the same template context that
+    `EPCISEventListDocument.render` uses.  Transformation events are moved
+    out of the main event list since they must go into the <extension>
+    element.
+    :param epcis_document: The document to render.
+    :return: A dictionary for use as the template context.
+    """
+    transformation_events = [
+        event for event in epcis_document.template_events
+        if isinstance(event, TransformationEvent)
+    ]
+    if transformation_events:
+        epcis_document.transformation_events.extend(transformation_events)
+        epcis_document.template_events = [
+            event for event in epcis_document.template_events
+            if not isinstance(event, TransformationEvent)
+        ]
+    return {
+        "header": epcis_document.header,
+        "template_events": epcis_document.template_events,
+        "transformation_events": epcis_document.transformation_events,
+        "render_namespaces": epcis_document._render_namespaces,
+        "render_xml_declaration": epcis_document.render_xml_declaration,
+        "created_date": epcis_document.created_date,
+        "additional_context": epcis_document.additional_context,
+    }
+
+
+class RenderedEvents:
+    """
+    Stands in for a run of events that were already rendered (see
+    `quartet_tracelink.parallel`).  `render_events` writes the XML as-is.
+    """
+    __slots__ = ('xml',)
+
+    def __init__(self, xml: str):
+        """
+        :param xml: The rendered events.
+        """
+        self.xml = xml
+
+
+@pass_context
+def render_events(context, events):
+    """
+    Renders each event with its own template exactly as
+    `{% include event.template %}` inside a for loop would, but resolves
+    each distinct template once for the whole list (rather than once per
+    event) and builds the parent context once.  Registered as a global of
+    the default environment; use it in document templates as::
+
+        {% for chunk in render_events(template_events) %}{{ chunk }}{% endfor %}
+
+    :param context: The template context (supplied by jinja).
+    :param events: The EPCPyYes events to render.
+    :return: A generator of text chunks.
+    """
+    return generate_events(context.environment, context.get_all(), events)
+
+
+def generate_events(environment, parent: dict, events):
+    """
+    Renders each event with its own template (see `render_events`).
+    :param environment: The jinja environment the templates are loaded
+        from.
+    :param parent: The template context of the document.
+    :param events: The EPCPyYes events to render.
+    :return: A generator of text chunks.
+    """
+    templates = {}
+    for event in events:
+        if isinstance(event, RenderedEvents):
+            yield event.xml
+            continue
+        name = event.template
+        try:
+            template = templates.get(name)
+        except TypeError:
+            # a list of names to select from- resolved per event
+            template = environment.get_or_select_template(name)
+        else:
+            if template is None:
+                template = templates[name] = \
+                    environment.get_or_select_template(name)
+        yield from template.root_render_func(
+            template.new_context(parent, True, {'event': event}))
+
+
+@pass_context
+def cached_include(context, template_name, records):
+    """
+    Renders a template exactly as `{% include template_name %}` would, but
+    reuses the output of earlier renders for the same master data records
+    (see `quartet_tracelink.cache.FragmentCache`).  The template must only
+    depend on the records passed in.  Registered as a global of the default
+    environment; use it in templates as::
+
+        {% for chunk in cached_include(name, records) %}{{ chunk }}{% endfor %}
+
+    :param context: The template context (supplied by jinja).
+    :param template_name: The template to render.
+    :param records: The record or list of records the template renders.
+    :return: A list of text chunks.
+    """
+    key = fragment_cache.get_key(template_name, records)
+    fragment = fragment_cache.get(key) if key else None
+    if fragment is None:
+        template = context.environment.get_template(template_name)
+        fragment = ''.join(template.root_render_func(
+            template.new_context(context.get_all(), True)))
+        if key:
+            fragment_cache.set(key, fragment)
+    return [fragment]
+
+
+#: The native serializers that replace a template, keyed by the name of
+#: the template they replace (see
+#: `quartet_tracelink.serialization.CommonAttributesSerializer.as_template`).
+native_serializers = {}
+
+
+@pass_context
+def serialize_native(context, template_name):
+    """
+    Renders the current event with the native serializer registered for
+    the template name.  Registered as a global of the default environment
+    and called by the templates returned from a serializer's
+    `as_template` method.
+    :param context: The template context (supplied by jinja).
+    :param template_name: The name the serializer was registered under.
+    :return: The rendered event.
+    """
+    serializer = native_serializers[template_name]
+    return Markup(serializer.serialize(context.get_all()))
+
+
+def generate_document(epcis_document: EPCISEventListDocument):
+    """
+    Renders the document template incrementally.
+    :param epcis_document: The document to render.
+    :return: A generator of text chunks which, joined, are identical to
+        the output of `epcis_document.render()`.
+    """
+    return epcis_document._template.generate(
+        **get_document_context(epcis_document)
+    )
+
+
+class XMLMinifier:
+    """
+    Removes the whitespace between tags from XML that arrives in chunks,
+    so a document can be minified as it is rendered.  Whitespace that is
+    part of an element's text is left alone.
+    """
+
+    def __init__(self):
+        self.pending = ''
+        # whitespace at the start of the document is removed
+        self.after_tag = True
+
+    def feed(self, chunk: str):
+        """
+        :param chunk: The next chunk of the document.
+        :return: The minified text that is ready to be written.
+        """
+        data = self.pending + chunk
+        body = data.rstrip()
+        # trailing whitespace may turn out to be between two tags
+        self.pending = data[len(body):]
+        if not body:
+            return ''
+        if self.after_tag and body[0].isspace():
+            stripped = body.lstrip()
+            if stripped[0] == '<':
+                body = stripped
+        self.after_tag = body[-1] == '>'
+        return BETWEEN_TAGS.sub('><', body)
+
+    def close(self):
+        """
+        :return: Any whitespace held back at the end of the document that
+            is not after a tag.
+        """
+        pending, self.pending = self.pending, ''
+        return '' if self.after_tag else pending
+
+
+def minify(chunks, buffer_size=65536):
+    """
+    Minifies rendered XML as it is generated (see `XMLMinifier`).
+    :param chunks: An iterable of text chunks.
+    :param buffer_size: The number of characters to collect before
+        minifying them.
+    :return: A generator of minified text chunks.
+    """
+    minifier = XMLMinifier()
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+            yield minifier.feed(''.join(buffer))
+            buffer = []
+            size = 0
+    yield minifier.feed(''.join(buffer)) + minifier.close()
+
+
+def write_document(epcis_document: EPCISEventListDocument, stream,
+                   encoding='utf-8', minified=False):
+    """
+    Renders the document into a binary stream chunk by chunk.
+    :param epcis_document: The document to render.
+    :param stream: A writable binary file-like object.
+    :param encoding: The output encoding.
+    :param minified: Whether to remove the whitespace between tags.
+    :return: The number of bytes written.
+    """
+    written = 0
+    chunks = generate_document(epcis_document)
+    for chunk in minify(chunks) if minified else chunks:
+        data = chunk.encode(encoding)
+        stream.write(data)
+        written += len(data)
+    return written
+
+
+@contextmanager
+def compressed_stream(stream, compression: str, filename: str):
+    """
+    Wraps a binary stream so anything written to it is compressed.  The
+    stream is left open.
+    :param stream: A writable binary file-like object.
+    :param compression: Either gzip or zip.
+    :param filename: The name of the file in the gzip header or zip
+        archive.
+    :return: A writable binary file-like object.
+    """
+    if compression == 'gzip':
+        with gzip.GzipFile(filename=filename, mode='wb',
+                           fileobj=stream) as gzip_file:
+            yield gzip_file
+    elif compression == 'zip':
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(filename, 'w', force_zip64=True) as entry:
+                yield entry
+    else:
+        raise ValueError('Unsupported compression %s.' % compression)
+
+
+def get_size(data, encoding='utf-8'):
+    """
+    :param data: A string, bytes or DocumentReader.
+    :param encoding: The encoding used for string data.
+    :return: The size of the rendered document in bytes.
+    """
+    if isinstance(data, str):
+        return len(data.encode(encoding))
+    return len(data)
+
+
+def get_event_epcs(event):
+    """
+    :param event: An EPCPyYes event.
+    :return: Every EPC referenced by the event including parents, children
+        and transformation inputs/outputs.
+    """
+    epcs = []
+    for attribute in ('epc_list', 'child_epcs', 'input_epc_list',
+                      'output_epc_list'):
+        epcs.extend(getattr(event, attribute, None) or [])
+    parent_id = getattr(event, 'parent_id', None)
+    if parent_id:
+        epcs.append(parent_id)
+    return epcs
+
+
+def group_events(events: list, linked_events: list = None):
+    """
+    Splits a list of events into groups that must be rendered in the same
+    document.  Events that reference the same EPC (for example the
+    commissioning events for a case and the aggregation event that packs
+    it) always share a group so hierarchies are never split across files.
+    :param events: The events to group.
+    :param linked_events: Events in this list (typically the filtered
+        events) are left out of the groups- they reference the EPCs of
+        every group, so a shipping event containing every pallet would
+        otherwise pull the whole message into one group.  The caller
+        decides where they go.
+    :return: A list of event lists.  Groups are ordered by the position of
+        their first event and events keep their original order.
+    """
+    linked = set(id(event) for event in linked_events or [])
+    events = [event for event in events if id(event) not in linked]
+    parents = list(range(len(events)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    def union(first, second):
+        first, second = find(first), find(second)
+        if first != second:
+            parents[max(first, second)] = min(first, second)
+
+    owners = {}
+    for index, event in enumerate(events):
+        for epc in get_event_epcs(event):
+            owner = owners.setdefault(epc, index)
+            if owner != index:
+                union(owner, index)
+    groups = {}
+    for index, event in enumerate(events):
+        groups.setdefault(find(index), []).append(event)
+    return list(groups.values())
+
+
+def partition_groups(groups, max_events: int = 0, max_size: int = 0,
+                     get_count=len, get_size=None):
+    """
+    Packs event groups into partitions of at most `max_events` events and
+    `max_size` bytes.  Groups are read one at a time and each partition is
+    yielded as soon as the next group does not fit, so only one partition
+    is held at a time when `groups` is a generator.  A group that exceeds
+    a limit on its own is placed in a partition of its own rather than
+    being split.
+    :param groups: An iterable of event groups from `group_events`.
+    :param max_events: The maximum number of events per partition.  Zero
+        means no limit.
+    :param max_size: The maximum size of a partition.  Zero means no
+        limit.
+    :param get_count: Returns the number of events in a group.
+    :param get_size: Returns the size of a group.  Required if `max_size`
+        is set.
+    :return: A generator of partitions, each a list of groups.
+    """
+    current = []
+    count = size = 0
+    for group in groups:
+        group_count = get_count(group)
+        group_size = get_size(group) if max_size else 0
+        too_many = max_events and count + group_count > max_events
+        too_big = max_size and size + group_size > max_size
+        if current and (too_many or too_big):
+            yield current
+            current = []
+            count = size = 0
+        current.append(group)
+        count += group_count
+        size += group_size
+    if current:
+        yield current
+
+
+class EventSizer:
+    """
+    Measures how many bytes groups of events add to a document when they
+    are rendered, so a message can be split by size as it is rendered
+    rather than by rendering whole documents and checking them.  XML is
+    measured by rendering the events exactly as `render_events` does in
+    the document's context; if `reuse` is set the rendered XML is kept (as
+    `RenderedEvents`) so the events are not rendered a second time.  JSON
+    is estimated from each event's own JSON.
+    """
+
+    def __init__(self, epcis_document: EPCISEventListDocument,
+                 as_json: bool = False, reuse: bool = False,
+                 encoding: str = 'utf-8'):
+        """
+        :param epcis_document: A document with the header, template and
+            additional context of the documents to render and no events.
+        :param as_json: Whether the documents are rendered as JSON.
+        :param reuse: Whether the document template renders its events
+            with `render_events` and so can take pre-rendered events.
+        :param encoding: The output encoding.
+        """
+        self.as_json = as_json
+        self.reuse = reuse and not as_json
+        self.encoding = encoding
+        if as_json:
+            self.envelope_size = get_size(epcis_document.render_json(),
+                                          encoding)
+            return
+        # an empty run of rendered events so the envelope includes the
+        # markup around the event list
+        epcis_document.template_events = [RenderedEvents('')] \
+            if self.reuse else []
+        template = epcis_document._template
+        context = get_document_context(epcis_document)
+        self.environment = template.environment
+        self.parent = template.new_context(context).get_all()
+        self.envelope_size = get_size(
+            ''.join(generate_document(epcis_document)), encoding)
+
+    def measure(self, events: list):
+        """
+        :param events: The events to measure.
+        :return: A tuple of the size of the events in bytes and the events
+            to render in their place.
+        """
+        if self.as_json:
+            return sum(get_size(event.render_json(), self.encoding)
+                       for event in events), events
+        xml = ''.join(generate_events(self.environment, self.parent, events))
+        size = get_size(xml, self.encoding)
+        if self.reuse and not any(isinstance(event, TransformationEvent)
+                                  for event in events):
+            return size, [RenderedEvents(xml)]
+        return size, events
+
+
+def get_preview(data, length=1000, encoding='utf-8'):
+    """
+    Returns the start of a rendered document for logging without reading
+    the rest of it.
+    :param data: A string, bytes or DocumentReader.
+    :param length: The maximum number of bytes to return.
+    :param encoding: The encoding of the document.
+    :return: A string.
+    """
+    if isinstance(data, DocumentReader):
+        return data.peek(length).decode(encoding, 'ignore')
+    if isinstance(data, str):
+        data = data[:length].encode(encoding)
+    return data[:length].decode(encoding, 'ignore')
+
+
+class DocumentReader:
+    """
+    A read-only, file-like view of a document that was streamed to a
+    temporary file or a file path.  Files on disk are not opened until
+    they are first read.  Instances can be handed to
+    `quartet_capture.tasks.create_and_queue_task` (and therefore the
+    `CreateOutputTaskStep`) as-is.
+    """
+
+    def __init__(self, source, encoding='utf-8', compression=None):
+        """
+        :param source: A file path or a binary file-like object positioned
+            at the start of the document.
+        :param encoding: The encoding of the document.
+        :param compression: The compression format (see
+            `compressed_stream`) if the document is compressed.
+        """
+        self._source = source
+        self._file = None if isinstance(source, str) else source
+        self.encoding = encoding
+        self.compression = compression
+
+    @property
+    def path(self):
+        """
+        :return: The file path if the document was written to disk,
+            otherwise None.
+        """
+        return self._source if isinstance(self._source, str) else None
+
+    @property
+    def name(self):
+        return self.path or getattr(self._source, 'name', None)
+
+    @property
+    def file(self):
+        if self._file is None:
+            self._file = open(self._source, 'rb')
+        return self._file
+
+    @property
+    def size(self):
+        if self.path:
+            return os.path.getsize(self.path)
+        position = self.file.tell()
+        size = self.file.seek(0, io.SEEK_END)
+        self.file.seek(position)
+        return size
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def peek(self, size):
+        """
+        Reads up to `size` bytes without moving the current position.
+        """
+        position = self.file.tell()
+        data = self.file.read(size)
+        self.file.seek(position)
+        return data
+
+    def read_text(self):
+        """
+        Reads the entire document into a string.
+        """
+        self.seek(0)
+        return self.read().decode(self.encoding)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def chunks(self, chunk_size=64 * 2 ** 10):
+        self.seek(0)
+        while True:
+            data = self.read(chunk_size)
+            if not data:
+                break
+            yield data
+
+    def __bool__(self):
+        return self.size > 0
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            if self.path:
+                self._file = None
+
+    @property
+    def closed(self):
+        return self._file is not None and self._file.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
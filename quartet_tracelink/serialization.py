@@ -0,0 +1,223 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Native (non-Jinja) serializers for the highest volume event templates.
+The serializers produce output that is identical to the templates they
+replace and can be handed to EPCPyYes events as a template so they work
+inside of any document template that uses `{% include event.template %}`.
+"""
+from jinja2 import Environment
+
+from quartet_tracelink.parsing.epcpyyes import get_default_environment
+from quartet_tracelink.rendering import native_serializers, serialize_native
+
+
+class CommonAttributesSerializer:
+    """
+    Serializes ObjectEvents exactly as the
+    `quartet_tracelink/common_attributes.xml` template does.  The common
+    elements (event times, event IDs, EPCs, business data, ILMD and the
+    TraceLink common attributes) are written directly; anything unusual
+    (error declarations, quantity, source or destination lists and the
+    shipping extension) is delegated to the original templates so the
+    output never differs.
+    """
+    template_name = 'quartet_tracelink/common_attributes.xml'
+
+    def __init__(self, environment: Environment = None):
+        """
+        :param environment: The environment used to load the fallback
+            templates.  Defaults to the shared TraceLink environment.
+        """
+        self.environment = environment or get_default_environment()
+
+    def render(self, event, additional_context: dict = None):
+        """
+        Renders a single event.
+        :param event: An EPCPyYes ObjectEvent.
+        :param additional_context: The document's additional context.
+        :return: The rendered event as a string.
+        """
+        return self.serialize(
+            {'event': event, 'additional_context': additional_context}
+        )
+
+    def serialize(self, context: dict):
+        """
+        :param context: The template context- must contain `event` and may
+            contain `additional_context`.
+        :return: The rendered event as a string.
+        """
+        event = context.get('event')
+        out = ['<ObjectEvent>\n']
+        self._write_event_times(event, out)
+        self._write_base_extension(event, context, out)
+        if event.epc_list:
+            out.append('        <epcList>\n')
+            for epc in event.epc_list:
+                out.append('                <epc>%s</epc>\n' % epc)
+            out.append('        </epcList>\n')
+        self._write_business_data(event, out)
+        self._write_extension(event, context, out)
+        additional_context = context.get('additional_context')
+        if additional_context and event.biz_step and \
+                'shipping' in event.biz_step:
+            out.append(self._include(
+                'quartet_tracelink/shipping_event_extension.xml', context))
+        elif getattr(event, 'is_gtin', None) is True:
+            self._write_gtin_attributes(event, out)
+        else:
+            self._write_sscc_attributes(event, out)
+        out.append('</ObjectEvent>')
+        return ''.join(out)
+
+    def as_template(self):
+        """
+        Wraps the serializer in a jinja2 Template so it can be assigned to
+        an EPCPyYes event's `template` property and included by any
+        document template.  The template calls the `serialize_native`
+        global (see `quartet_tracelink.rendering.serialize_native`), which
+        the serializer registers under its `template_name`.
+        :return: A jinja2 Template instance.
+        """
+        native_serializers[self.template_name] = self
+        self.environment.globals.setdefault('serialize_native',
+                                            serialize_native)
+        template = self.environment.from_string(
+            '{{ serialize_native("%s") }}' % self.template_name)
+        # lets the template be recreated in another process
+        template.serializer = self
+        return template
+
+    def _include(self, template_name: str, context: dict):
+        """
+        Renders one of the original templates with the current context.
+        """
+        return self.environment.get_template(template_name).render(context)
+
+    def _write_event_times(self, event, out):
+        out.append('<eventTime>%s</eventTime>\n' % event.event_time)
+        if event.record_time:
+            out.append(
+                '    <recordTime>%s</recordTime>\n' % event.record_time)
+        if event.event_timezone_offset:
+            out.append(
+                '    <eventTimeZoneOffset>%s</eventTimeZoneOffset>\n' %
+                event.event_timezone_offset
+            )
+
+    def _write_base_extension(self, event, context, out):
+        if event.error_declaration:
+            out.append(self._include('epcis/base_extension.xml', context))
+        elif event.event_id:
+            out.append('    <baseExtension>\n'
+                       '            <eventID>%s</eventID>\n'
+                       '    </baseExtension>\n' % event.event_id)
+
+    def _write_business_data(self, event, out):
+        if event.action:
+            out.append('    <action>%s</action>\n' % _value(event.action))
+        if event.biz_step:
+            out.append('    <bizStep>%s</bizStep>\n' % event.biz_step)
+        if event.disposition:
+            out.append(
+                '    <disposition>%s</disposition>\n' % event.disposition)
+        if event.read_point:
+            out.append('    <readPoint>\n'
+                       '    <id>%s</id>\n'
+                       '    </readPoint>\n' % event.read_point)
+        if event.biz_location:
+            out.append('    <bizLocation>\n'
+                       '    <id>%s</id>\n'
+                       '    </bizLocation>\n' % event.biz_location)
+        if event.business_transaction_list:
+            out.append('<bizTransactionList>\n')
+            for transaction in event.business_transaction_list:
+                out.append('        <bizTransaction ')
+                if transaction.type:
+                    out.append('type="%s"' % _value(transaction.type))
+                out.append('>%s</bizTransaction>\n' %
+                           transaction.biz_transaction)
+            out.append('</bizTransactionList>')
+
+    def _write_extension(self, event, context, out):
+        if getattr(event, 'child_quantity_list', None) or \
+                event.source_list or event.destination_list:
+            out.append(self._include('epcis/extension.xml', context))
+        elif event.ilmd:
+            if event.quantity_list:
+                out.append(self._include('epcis/extension.xml', context))
+                return
+            out.append('<extension>\n<ilmd>\n')
+            for attribute in event.ilmd:
+                name = _value(attribute.name)
+                if 'CBV' in attribute.__module__:
+                    out.append(
+                        '            <cbvmd:%s>%s</cbvmd:%s>\n' %
+                        (name, attribute.value, name)
+                    )
+                else:
+                    out.append(
+                        '            <%s>%s</%s>\n' %
+                        (attribute.name, attribute.value, attribute.name)
+                    )
+            out.append('</ilmd></extension>\n')
+
+    def _write_gtin_attributes(self, event, out):
+        out.append(
+            '<tl:packagingLevel>%s</tl:packagingLevel>\n'
+            '<tl:commonAttributes>\n'
+            '<tl:productionLineId>%s</tl:productionLineId>\n'
+            '<tl:itemDetail>\n'
+            '    <tl:lot>%s</tl:lot>\n'
+            '    <tl:expiry>%s</tl:expiry>\n'
+            '    <tl:countryDrugCode type="%s">%s</tl:countryDrugCode>\n'
+            '</tl:itemDetail>\n'
+            '</tl:commonAttributes>' % (
+                _attribute(event, 'packaging_uom'),
+                _attribute(event, 'packaging_line'),
+                _attribute(event, 'lot'),
+                _attribute(event, 'expiry'),
+                _attribute(event, 'NDC_pattern'),
+                _attribute(event, 'NDC'),
+            )
+        )
+
+    def _write_sscc_attributes(self, event, out):
+        out.append(
+            '<tl:packagingLevel>PL</tl:packagingLevel>\n'
+            '<tl:commonAttributes>\n'
+            '    <tl:productionLineId>%s</tl:productionLineId>\n'
+            '    <tl:companyPrefix>%s</tl:companyPrefix>\n'
+            '</tl:commonAttributes>' % (
+                _attribute(event, 'packaging_line'),
+                _attribute(event, 'company_prefix'),
+            )
+        )
+
+
+def _value(value):
+    """
+    The equivalent of `{{ value.value or value }}` in the templates- used
+    for values that may be either enums or strings.
+    """
+    return getattr(value, 'value', None) or value
+
+
+def _attribute(obj, name):
+    """
+    Jinja renders undefined attributes as empty strings.
+    """
+    return getattr(obj, name, '')
@@ -12,11 +12,40 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 # Copyright 2019 SerialLab Corp.  All rights reserved.
+"""
+The step classes are imported on first use so that importing the package
+(or resolving one step) does not pull in every step's dependencies.
+"""
+import importlib
 
-from quartet_tracelink.steps.steps import AddCommissioningDataStep, \
-    OutputParsingStep, TracelinkOutputStep, \
-    TracelinkFilteredEventOutputStep, CombinedOutputStep
-from quartet_tracelink.steps.mapping_step import \
-    TradingPartnerMappingOutputStep, ShippingEventMappingOutputStep
-from quartet_tracelink.steps.output_step import \
-    TraceLinkCommonAttributesOutputStep, DispositionAssignedOutputStep
+_STEP_MODULES = {
+    'AddCommissioningDataStep': 'quartet_tracelink.steps.steps',
+    'OutputParsingStep': 'quartet_tracelink.steps.steps',
+    'TracelinkOutputStep': 'quartet_tracelink.steps.steps',
+    'TracelinkFilteredEventOutputStep': 'quartet_tracelink.steps.steps',
+    'CombinedOutputStep': 'quartet_tracelink.steps.steps',
+    'CreateOutputTaskStep': 'quartet_tracelink.steps.steps',
+    'TradingPartnerMappingOutputStep':
+        'quartet_tracelink.steps.mapping_step',
+    'ShippingEventMappingOutputStep': 'quartet_tracelink.steps.mapping_step',
+    'TraceLinkCommonAttributesOutputStep':
+        'quartet_tracelink.steps.output_step',
+    'DispositionAssignedOutputStep': 'quartet_tracelink.steps.output_step',
+}
+
+__all__ = list(_STEP_MODULES)
+
+
+def __getattr__(name):
+    try:
+        module = _STEP_MODULES[name]
+    except KeyError:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name)) from None
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -19,7 +19,8 @@ from gs123.regex import urn_patterns
 from quartet_capture import models
 from quartet_capture.rules import RuleContext
 from quartet_masterdata.models import OutboundMapping
-from quartet_tracelink.steps import TracelinkFilteredEventOutputStep
+from quartet_tracelink.cache import mapping_cache
+from quartet_tracelink.steps.steps import TracelinkFilteredEventOutputStep
 from quartet_integrations.optel.steps import ContextKeys
 
 
@@ -53,8 +54,9 @@ class TradingPartnerMappingOutputStep(TracelinkFilteredEventOutputStep):
                     company_prefix = fields['company_prefix']
                     self.info('Using company prefix %s', company_prefix)
                     try:
-                        self.mapping = OutboundMapping.objects.get(
-                            company__gs1_company_prefix=company_prefix)
+                        self.mapping = \
+                            mapping_cache.get_by_company_prefix(
+                                company_prefix)
                         break
                     except OutboundMapping.DoesNotExist:
                         raise self.CompanyConfigurationError(
@@ -14,13 +14,15 @@
 # Copyright 2020 SerialLab Corp.  All rights reserved.
 
 from EPCPyYes.core.v1_2 import template_events
-from gs123.conversion import URNConverter
 from quartet_capture import models
 from quartet_capture.rules import RuleContext
 from quartet_masterdata.db import DBProxy
 from quartet_masterdata.models import Company
 from quartet_output.steps import ContextKeys
-from quartet_tracelink.steps import TracelinkOutputStep
+from quartet_tracelink.steps.steps import TracelinkOutputStep
+from quartet_tracelink.cache import trade_item_cache, gln_resolver
+from quartet_tracelink.serialization import CommonAttributesSerializer
+from quartet_tracelink.urns import urn_decoder
 from quartet_epcis.models import Entry
 
 class TraceLinkCommonAttributesOutputStep(TracelinkOutputStep):
@@ -30,7 +32,6 @@ class TraceLinkCommonAttributesOutputStep(TracelinkOutputStep):
         self.proxy = DBProxy()
         self.lot = None
         self.expiry = None
-        self.trade_items = {}
         self.uom_choices = {'Bdl': 'PK', 'Cs': 'CA', 'Ea': 'EA', 'Bx': 'EA',
                             'EA': 'EA'}
         self.packaging_line = None
@@ -38,11 +39,22 @@ class TraceLinkCommonAttributesOutputStep(TracelinkOutputStep):
         self.object_event_template = 'quartet_tracelink/common_attributes.xml'
         self.have_checked_company = False
         self.last_trade_item = None
+        self.entries = {}
+        self.render_engine = self.get_parameter('Render Engine', 'template')
+        if self.render_engine == 'native':
+            self.object_event_template = CommonAttributesSerializer(
+            ).as_template()
+        elif self.render_engine != 'template':
+            raise self.RenderEngineError(
+                'The Render Engine parameter must be either "template" or '
+                '"native", not %s.' % self.render_engine
+            )
 
     def pre_execute(self, rule_context: RuleContext):
         # get the filtered events
         events = rule_context.context.get(ContextKeys.OBJECT_EVENTS_KEY.value,
                                           [])
+        self.load_entries(events)
         # object_event: template_events.ObjectEvent
         for object_event in events:
             self.get_receiver_gln(object_event, rule_context)
@@ -73,19 +85,46 @@ class TraceLinkCommonAttributesOutputStep(TracelinkOutputStep):
                     epcis_event.expiry = ilmd.value
                     self.info('Using expiry %s', self.expiry)
 
+    def load_entries(self, events: list):
+        """
+        Loads the Entry records for every SSCC object event along with
+        their parents and grandparents in a single query so the packaging
+        levels can be determined without hitting the database per event.
+        :param events: The object events.
+        :return: None
+        """
+        ssccs = set(
+            event.epc_list[0] for event in events
+            if event.epc_list and 'sscc' in event.epc_list[0]
+        )
+        if ssccs:
+            self.entries.update(
+                (entry.identifier, entry) for entry in
+                Entry.objects.filter(identifier__in=ssccs).select_related(
+                    'parent_id__parent_id')
+            )
+
+    def get_entry(self, urn):
+        """
+        Returns an entry loaded by `load_entries` or from the database.
+        :param urn: The identifier of the entry.
+        :return: An Entry model instance.
+        """
+        entry = self.entries.get(urn)
+        if not entry:
+            entry = Entry.objects.select_related('parent_id__parent_id').get(
+                identifier=urn)
+            self.entries[urn] = entry
+        return entry
+
     def get_trade_item(self, urn):
         """
-        Returns a trade item from the local cache or the database.
+        Returns a trade item from the process level trade item cache or
+        the database.
         :param urn: The urn to use to find the trade item
         :return: A TradeItem model instance.
         """
-        trade_item_urn = urn[:urn.rindex('.')]
-        trade_item = self.trade_items.get(urn)
-        if not trade_item:
-            trade_item = self.proxy.get_trade_item_by_urn(urn)
-            if trade_item:
-                self.trade_items[trade_item_urn] = trade_item
-        return trade_item
+        return trade_item_cache.get_by_urn(urn)
 
     def get_common_attributes(self, epcis_event: template_events.ObjectEvent):
         """
@@ -113,8 +152,8 @@ class TraceLinkCommonAttributesOutputStep(TracelinkOutputStep):
                 epcis_event.GTIN14 = trade_item.GTIN14
                 self.last_trade_item = trade_item
         if 'sscc' in urn:
-            entry = Entry.objects.get(identifier=urn)
-            epcis_event.company_prefix = URNConverter(urn).company_prefix
+            entry = self.get_entry(urn)
+            epcis_event.company_prefix = urn_decoder.get_company_prefix(urn)
             if not entry.parent_id:
                 # if there is an sscc and there is no parent it is a pallet
                 epcis_event.packaging_uom = 'PL'
@@ -156,11 +195,10 @@ class TraceLinkCommonAttributesOutputStep(TracelinkOutputStep):
         if not self.have_checked_company:
             self.have_checked_company = True
             epc = epcis_event.epc_list[0]
-            company_prefix = URNConverter(epc).company_prefix
+            company_prefix = urn_decoder.get_company_prefix(epc)
             try:
-                company = Company.objects.get(
-                    gs1_company_prefix=company_prefix)
-                rule_context.context['RECEIVER_GLN'] = company.GLN13
+                rule_context.context['RECEIVER_GLN'] = \
+                    gln_resolver.get_gln_by_company_prefix(company_prefix)
             except Company.DoesNotExist:
                 raise self.CompanyNotFoundError(
                     'could not find a company for prefix %s',
@@ -171,10 +209,23 @@ class TraceLinkCommonAttributesOutputStep(TracelinkOutputStep):
             'Sender GLN',
             raise_exception=True
         )
-    
+
+    def declared_parameters(self):
+        ret = super().declared_parameters()
+        ret['Sender GLN'] = 'The GLN of the sending party.'
+        ret['Render Engine'] = 'Either "template" (the default) to render ' \
+                               'object events with the common attributes ' \
+                               'template or "native" to use the ' \
+                               'equivalent (and much faster) built in ' \
+                               'serializer.'
+        return ret
+
     class UOMNotFoundError(Exception):
         pass
 
+    class RenderEngineError(Exception):
+        pass
+
     class TradeItemNotFoundError(Exception):
         pass
 
@@ -12,18 +12,23 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 # Copyright 2018 SerialLab Corp.  All rights reserved.
+import io
+import os
 import re
+import uuid
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from operator import itemgetter
 from enum import Enum
 from datetime import datetime
-from datetime import timedelta
+from tempfile import SpooledTemporaryFile
 from dateutil import parser
-from pytz import timezone
+from django.utils.module_loading import import_string
 
 from EPCPyYes.core.SBDH import sbdh
 from EPCPyYes.core.v1_2 import template_events, events
 from EPCPyYes.core.v1_2.CBV import dispositions
 from gs123.check_digit import calculate_check_digit
-from gs123.conversion import URNConverter
 from gs123.regex import urn_patterns
 from quartet_capture import models, rules
 from quartet_capture.rules import RuleContext
@@ -32,10 +37,23 @@ from quartet_masterdata.models import Company
 from quartet_output import steps
 from quartet_output.steps import DynamicTemplateMixin
 from quartet_output.steps import EPCPyYesOutputStep, ContextKeys
+from quartet_tracelink import dates
+from quartet_tracelink.document_log import DocumentLogPolicy
+from quartet_tracelink.parallel import prerender_events, NotTransferable, \
+    uses_render_events
+from quartet_tracelink.epcs import EPCList
+from quartet_tracelink.instrumentation import PhaseTimer, NO_PHASE, \
+    instrumented, TraceLinkContextKeys
 from quartet_tracelink.parsing.epcpyyes import get_default_environment
 from quartet_tracelink.parsing.parser import TraceLinkEPCISParser, \
-    TraceLinkEPCISCommonAttributesParser
-from quartet_masterdata.models import TradeItem, OutboundMapping
+    TraceLinkEPCISCommonAttributesParser, TraceLinkStreamingEPCISParser
+from quartet_tracelink.urns import urn_decoder
+from quartet_tracelink.rendering import DocumentReader, write_document, \
+    group_events, partition_groups, compressed_stream, generate_document, \
+    minify, EventSizer, COMPRESSION_EXTENSIONS
+from quartet_masterdata.models import OutboundMapping
+from quartet_tracelink.cache import trade_item_cache, gln_resolver, \
+    mapping_cache
 
 sgln_regex = re.compile(r'^urn:epc:id:sgln:(?P<cp>[0-9]+)\.(?P<ref>[0-9]+)')
 
@@ -45,7 +63,7 @@ class AddCommissioningDataStep(steps.AddCommissioningDataStep,
     def process_events(self, events: list):
         """
         Changes the default template and environment for the EPCPyYes
-        object events.
+        object events and stores their EPCs in a compact `EPCList`.
         """
         env = get_default_environment()
         template = self.get_template(
@@ -55,10 +73,11 @@ class AddCommissioningDataStep(steps.AddCommissioningDataStep,
         for event in events:
             for epc in event.epc_list:
                 if ':sscc:' in epc:
-                    parsed_sscc = URNConverter(epc)
-                    event.company_prefix = parsed_sscc._company_prefix
-                    event.extension_digit = parsed_sscc._extension_digit
+                    parsed_sscc = urn_decoder.decode(epc)
+                    event.company_prefix = parsed_sscc.company_prefix
+                    event.extension_digit = parsed_sscc.extension_digit
                     break
+            event.epc_list = EPCList(event.epc_list)
             event.template = env.get_template(template)
             event._env = env
 
@@ -76,22 +95,84 @@ class OutputParsingStep(steps.OutputParsingStep):
             'The template to use to render object events.  Should be a '
             'template path- not a quartet_templates template name.'
         )
+        self.streaming_parse = self.get_boolean_parameter(
+            'Streaming Parse', False)
+        self.event_cache_size = self.get_integer_parameter(
+            'Event Cache Size', 1024)
+        self.declared_parameters['Streaming Parse'] = \
+            'Whether or not to read the EPCs of each event into a compact ' \
+            'list as they are parsed, releasing their XML elements right ' \
+            'away.  Use this for inbound documents with very large ' \
+            'events.  Default is False.'
+        self.declared_parameters['Event Cache Size'] = \
+            'When Streaming Parse is set, the number of parsed events ' \
+            'that are held before they are written to the database.  ' \
+            'Default is 1024.'
 
     def get_parser_type(self, *args):
         """
         Returns the parser that uses the tracelink template EPCPyYes objects.
         """
+        if self.streaming_parse:
+            return TraceLinkStreamingEPCISParser
         return TraceLinkEPCISParser
 
+    def get_stream(self, data):
+        """
+        :param data: The inbound data- bytes or a string.
+        :return: A binary stream of the data.
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return io.BytesIO(data)
+
     def instantiate_parser(self, data, parser_type, skip_parsing):
         self.info(
             'instantiating parser...skip parser set to %s ' % skip_parsing)
+        if self.streaming_parse:
+            self.info('Streaming the parse with an event cache size of %s.',
+                      self.event_cache_size)
+            self.parser = parser_type(
+                self.get_stream(data), self.epc_output_criteria,
+                event_cache_size=self.event_cache_size,
+                skip_parsing=skip_parsing,
+                object_event_template=self.object_event_template
+            )
+            self.parser.info_func = self.info
+            return self.parser
         self.parser = super().instantiate_parser(data, parser_type,
                                                  skip_parsing)
         parser.info_func = self.info
         parser.object_event_template = self.object_event_template
         return self.parser
-    
+
+
+class CreateOutputTaskStep(steps.CreateOutputTaskStep):
+    """
+    Behaves exactly like the quartet_output CreateOutputTaskStep except
+    that, if the OUTBOUND_EPCIS_MESSAGE_KEY context key contains a list
+    of documents (see the `Max Events Per Document` and
+    `Max Bytes Per Document` parameters of the TracelinkOutputStep), an
+    output task is created for each document.
+    """
+
+    def execute(self, data, rule_context: RuleContext):
+        documents = rule_context.context.get(
+            ContextKeys.OUTBOUND_EPCIS_MESSAGE_KEY.value)
+        if not isinstance(documents, list):
+            return super().execute(data, rule_context)
+        self.info('Creating output tasks for %s documents.', len(documents))
+        try:
+            for document in documents:
+                rule_context.context[
+                    ContextKeys.OUTBOUND_EPCIS_MESSAGE_KEY.value
+                ] = document
+                super().execute(data, rule_context)
+        finally:
+            rule_context.context[
+                ContextKeys.OUTBOUND_EPCIS_MESSAGE_KEY.value
+            ] = documents
+
 
 class TracelinkOutputStep(EPCPyYesOutputStep):
     """
@@ -114,13 +195,42 @@ class TracelinkOutputStep(EPCPyYesOutputStep):
         self.convert_date_strings = self.get_boolean_parameter(
             'Convert Dates', False
         )
+        self.stream_output = self.get_boolean_parameter(
+            'Stream Output', False
+        )
+        self.minify_output = self.get_boolean_parameter(
+            'Minify Output', False
+        )
+        self.render_processes = self.get_integer_parameter(
+            'Render Processes', 0)
+        self.document_count = 0
+        self.timer = PhaseTimer() if self.get_boolean_parameter(
+            'Record Timings', False) else None
+        self.log_policy = DocumentLogPolicy.from_step(self)
+        self.compression = self.get_parameter('Compression', None)
+        if self.compression and \
+                self.compression not in COMPRESSION_EXTENSIONS:
+            raise self.CompressionError(
+                'The Compression parameter must be one of %s, not %s.' % (
+                    ', '.join(sorted(COMPRESSION_EXTENSIONS)),
+                    self.compression)
+            )
+
+    def phase(self, name: str):
+        """
+        Times a block of code as the named phase when the `Record Timings`
+        parameter is set.  Otherwise this does nothing.
+        :param name: The name of the phase.
+        :return: A context manager.
+        """
+        return self.timer.phase(name) if self.timer else NO_PHASE
 
     def get_gln_from_company(self, sgln):
         '''
         Retrieves GLN13 from company if matched by SGLN.
         '''
         try:
-            return Company.objects.get(SGLN=sgln).GLN13
+            return gln_resolver.get_gln_by_sgln(sgln)
         except Company.DoesNotExist:
             return None
 
@@ -194,17 +304,12 @@ class TracelinkOutputStep(EPCPyYesOutputStep):
 
     def format_datetime(self, dt_string, increment_dates=False,
                         increment_val=0):
-        try:
-            if self.parse_utc_dates:
-                dt_obj = parser.parse(dt_string).astimezone(timezone('UTC'))
-            else:
-                dt_obj = parser.parse(dt_string)
-            if increment_dates:
-                dt_obj = dt_obj + timedelta(seconds=increment_val)
-            return dt_obj.strftime('%Y-%m-%dT%H:%M:%SZ')
-        except:
-            return dt_string
+        return dates.format_datetime(
+            dt_string, self.parse_utc_dates,
+            increment_val if increment_dates else 0
+        )
 
+    @instrumented
     def execute(self, data, rule_context: RuleContext):
         """
         Pulls the object, agg, transaction and other events out of the context
@@ -213,7 +318,8 @@ class TracelinkOutputStep(EPCPyYesOutputStep):
         :param rule_context: The RuleContext containing any filtered events
         and also any EPCPyYes events that were created by prior steps.
         """
-        self.pre_execute(rule_context)
+        with self.phase('pre_execute'):
+            self.pre_execute(rule_context)
         env = get_default_environment()
         self.rule_context = rule_context
         append_filtered_events = self.get_boolean_parameter(
@@ -239,76 +345,398 @@ class TracelinkOutputStep(EPCPyYesOutputStep):
         else:
             all_events = oevents + aggevents
         sbdh_out = None
+        sbdh_kwargs = None
         if len(all_events) > 0:
-            increment_val = 0
-            for event in self.get_filtered_events():
-                if event.source_list and event.destination_list:
-                    destination_sgln, source_sgln = self.get_sgln_info(event)
-                    sbdh_out = self.generate_sbdh(
-                        sender_sgln=source_sgln,
-                        receiver_sgln=destination_sgln
-                    )
-                    break
-            for event in all_events:
-                # tracelink is terrible at handling ISO dates so here we go...
-                if self.convert_date_strings:
-                    self.convert_dates(event, increment_dates, increment_val)
-                if isinstance(event, template_events.ObjectEvent):
-                    gtin14 = self._get_gtin(event)
-                    if gtin14:
-                        event.gtin14 = gtin14
-                increment_val += 1
+            with self.phase('enrichment'):
+                for event in self.get_filtered_events():
+                    if event.source_list and event.destination_list:
+                        destination_sgln, source_sgln = self.get_sgln_info(
+                            event)
+                        sbdh_kwargs = {'sender_sgln': source_sgln,
+                                       'receiver_sgln': destination_sgln}
+                        sbdh_out = self.generate_sbdh(**sbdh_kwargs)
+                        break
+            # tracelink is terrible at handling ISO dates so here we go...
+            if self.convert_date_strings:
+                with self.phase('date_conversion'):
+                    self.convert_event_dates(all_events, increment_dates)
+            with self.phase('enrichment'):
+                for event in all_events:
+                    if isinstance(event, template_events.ObjectEvent):
+                        gtin14 = self._get_gtin(event)
+                        if gtin14:
+                            event.gtin14 = gtin14
             template_path = self.get_or_create_parameter(
                 'Template Path',
                 'quartet_tracelink/tracelink_epcis_events_document.xml',
                 'The jinja 2 template to render.'
             )
-            additional_context = {
-                'RECEIVER_GLN': rule_context.context.get('RECEIVER_GLN'),
-                'SENDER_GLN': rule_context.context.get('SENDER_GLN')
-            }
-            additional_context = self.get_additional_context(additional_context)
-            if additional_context['RECEIVER_GLN'] and additional_context[
-                    'SENDER_GLN']:
-                self.info('Using the values in the context to generate the '
-                          'header.')
-                sbdh_out = self.generate_sbdh(
-                    receiver_gln=additional_context.get('RECEIVER_GLN'),
-                    sender_gln=additional_context.get('SENDER_GLN')
-                )
-                self.info('SBDH: %s', sbdh_out)
+            with self.phase('enrichment'):
+                additional_context = {
+                    'RECEIVER_GLN': rule_context.context.get('RECEIVER_GLN'),
+                    'SENDER_GLN': rule_context.context.get('SENDER_GLN')
+                }
+                additional_context = self.get_additional_context(
+                    additional_context)
+                if additional_context['RECEIVER_GLN'] and additional_context[
+                        'SENDER_GLN']:
+                    self.info('Using the values in the context to generate '
+                              'the header.')
+                    sbdh_kwargs = {
+                        'receiver_gln': additional_context.get(
+                            'RECEIVER_GLN'),
+                        'sender_gln': additional_context.get('SENDER_GLN')
+                    }
+                    sbdh_out = self.generate_sbdh(**sbdh_kwargs)
+                    self.info('SBDH: %s', sbdh_out)
             self.info('Template path: %s', template_path)
-            epcis_document = template_events.EPCISEventListDocument(
-                all_events,
-                sbdh_out,
-                template=env.get_template(template_path),
-                additional_context=additional_context
-            )
-            if self.get_boolean_parameter('JSON', False):
-                data = epcis_document.render_json()
-            else:
-                data = epcis_document.render()
+            with self.phase('render'):
+                template = env.get_template(template_path)
+                max_events = self.get_integer_parameter(
+                    'Max Events Per Document', 0)
+                max_bytes = self.get_integer_parameter(
+                    'Max Bytes Per Document', 0)
+                if max_events or max_bytes:
+                    self.check_output_task_steps()
+                    linked_events = self.get_filtered_events() \
+                        if append_filtered_events else []
+                    data = self.render_partitions(
+                        group_events(all_events, linked_events),
+                        linked_events, template, additional_context,
+                        sbdh_kwargs, max_events, max_bytes,
+                        prepend_filtered_events
+                    )
+                    if len(data) == 1:
+                        data = data[0]
+                    else:
+                        self.info('The outbound message was split into %s '
+                                  'documents.', len(data))
+                else:
+                    epcis_document = template_events.EPCISEventListDocument(
+                        all_events,
+                        sbdh_out,
+                        template=template,
+                        additional_context=additional_context
+                    )
+                    data = self.render_document(epcis_document)
+            self.record_compression(data, rule_context)
             rule_context.context[
                 ContextKeys.OUTBOUND_EPCIS_MESSAGE_KEY.value
             ] = data
-            self.info('Data (first 2000 characters): %s', data[:1000])
+            self.log_policy.log(self, data)
 
-    def convert_dates(self, event, increment_dates=False, increment_val=0):
-        if event.event_time.endswith(
-                '+00:00') and event.event_timezone_offset != '+00:00':
-            converted_dt_string = re.sub(r"\+00:00$",
-                                         event.event_timezone_offset,
-                                         event.event_time)
-            event.event_time = self.format_datetime(
-                converted_dt_string, increment_dates, increment_val)
+    def check_output_task_steps(self):
+        """
+        Makes sure the rule can queue a list of documents before the
+        message is split.  Only the TraceLink CreateOutputTaskStep handles
+        the list the split message is placed in, so the rule must queue its
+        output with it (and send it from the output rule).
+        :raises SplitConfigurationError: If the rule queues its output with
+            the quartet_output CreateOutputTaskStep, which only handles a
+            single document, or does not queue it with the TraceLink
+            CreateOutputTaskStep.
+        """
+        if not self.task:
+            return
+        queued = False
+        for db_step in self.task.rule.step_set.all():
+            try:
+                step_class = import_string(db_step.step_class)
+            except ImportError:
+                continue
+            if issubclass(step_class, CreateOutputTaskStep):
+                queued = True
+            elif issubclass(step_class, steps.CreateOutputTaskStep):
+                raise self.SplitConfigurationError(
+                    'The %s step can not queue split documents.  Use '
+                    'quartet_tracelink.steps.CreateOutputTaskStep or remove '
+                    'the Max Events Per Document and Max Bytes Per Document '
+                    'parameters.' % db_step.name
+                )
+        if not queued:
+            raise self.SplitConfigurationError(
+                'The rule %s splits its outbound message but has no '
+                'quartet_tracelink.steps.CreateOutputTaskStep to queue the '
+                'documents.  Add one or remove the Max Events Per Document '
+                'and Max Bytes Per Document parameters.' % self.task.rule.name
+            )
+
+    def render_partitions(self, groups, linked_events, template,
+                          additional_context, sbdh_kwargs=None,
+                          max_events=0, max_bytes=0,
+                          prepend_linked_events=False):
+        """
+        Packs event groups into documents of at most `max_events` events
+        and `max_bytes` bytes, each with its own header.  The size of each
+        group is measured as it is added (see
+        `quartet_tracelink.rendering.EventSizer`) and a document is
+        rendered as soon as the next group does not fit, so no document is
+        rendered only to be thrown away.  The linked events (the filtered
+        events) always go into the last document so the events that ship
+        a hierarchy are never sent ahead of it.
+        :param groups: A list of event groups (see
+            `quartet_tracelink.rendering.group_events`).
+        :param linked_events: The events to add to the last document.
+        :param template: The document template.
+        :param additional_context: The additional template context.
+        :param sbdh_kwargs: The keyword arguments for `generate_sbdh` or
+            None if the documents have no header.
+        :param max_events: The maximum number of events per document.
+            Zero means no limit.
+        :param max_bytes: The maximum uncompressed document size.  Zero
+            means no limit.
+        :param prepend_linked_events: Whether the linked events go before
+            the other events of the last document.
+        :return: A list of rendered documents.
+        """
+        sizer = None
+        envelope_size = 0
+        if max_bytes:
+            header = self.generate_sbdh(**sbdh_kwargs) if sbdh_kwargs \
+                else None
+            sizer = EventSizer(
+                template_events.EPCISEventListDocument(
+                    [], header, template=template,
+                    additional_context=additional_context),
+                as_json=self.get_boolean_parameter('JSON', False),
+                reuse=uses_render_events(template)
+            )
+            envelope_size = sizer.envelope_size
+
+        def measure(group):
+            # (events to render, number of events, size)
+            if sizer:
+                size, events = sizer.measure(group)
+                return events, len(group), size
+            return group, len(group), 0
+
+        linked = measure(linked_events)
+        # the last document must have room for the linked events
+        room_for_events = max(max_events - linked[1], 1)
+        room_for_bytes = max(max_bytes - envelope_size - linked[2], 1)
+        partitions = partition_groups(
+            (measure(group) for group in groups),
+            room_for_events if max_events else 0,
+            room_for_bytes if max_bytes else 0,
+            get_count=itemgetter(1),
+            get_size=itemgetter(2)
+        )
+        documents = []
+        previous = None
+        for partition in partitions:
+            if previous is not None:
+                documents.append(self.render_partition(
+                    previous, template, additional_context, sbdh_kwargs))
+            previous = partition
+        partition = previous or []
+        if prepend_linked_events:
+            partition.insert(0, linked)
+        else:
+            partition.append(linked)
+        size = envelope_size + sum(group[2] for group in partition)
+        if max_bytes and size > max_bytes:
+            self.info('The last document (%s events) exceeds the maximum '
+                      'size of %s bytes but can not be split without '
+                      'separating an aggregation from its children or the '
+                      'filtered events from the hierarchy.',
+                      sum(group[1] for group in partition), max_bytes)
+        documents.append(self.render_partition(
+            partition, template, additional_context, sbdh_kwargs))
+        return documents
+
+    def render_partition(self, partition, template, additional_context,
+                         sbdh_kwargs=None):
+        """
+        Renders a partition from `render_partitions` into its own document
+        with its own header.
+        :param partition: A list of (events, number of events, size)
+            tuples.
+        :param template: The document template.
+        :param additional_context: The additional template context.
+        :param sbdh_kwargs: The keyword arguments for `generate_sbdh` or
+            None if the document has no header.
+        :return: The rendered document.
+        """
+        header = self.generate_sbdh(**sbdh_kwargs) if sbdh_kwargs else None
+        epcis_document = template_events.EPCISEventListDocument(
+            [event for events, count, size in partition for event in events],
+            header,
+            template=template,
+            additional_context=additional_context
+        )
+        self.document_count += 1
+        return self.render_document(
+            epcis_document,
+            name='%s-%s.xml' % (self.task.name if self.task else
+                                uuid.uuid4().hex, self.document_count)
+        )
+
+    def render_document(self, epcis_document, name=None):
+        """
+        Renders the document as JSON or XML.  If the `Stream Output`
+        parameter is set, XML is rendered incrementally to a temporary file
+        (or to a file in the `Stream Output Directory`) and a DocumentReader
+        is returned in place of a string.
+        :param epcis_document: The EPCPyYes document to render.
+        :param name: The file name to use when streaming to a directory.
+        :return: A string or a DocumentReader.
+        """
+        with self.phase('serialization'):
+            if self.get_boolean_parameter('JSON', False):
+                if self.compression:
+                    return self.compress_document(epcis_document, name)
+                return epcis_document.render_json()
+            if self.render_processes > 1:
+                self.prerender_events(epcis_document)
+            if self.compression:
+                return self.compress_document(epcis_document, name)
+            if self.stream_output:
+                return self.stream_document(epcis_document, name)
+            if self.minify_output:
+                return ''.join(minify(generate_document(epcis_document)))
+            return epcis_document.render()
+
+    def prerender_events(self, epcis_document):
+        """
+        Renders the document's events across the number of processes set
+        by the `Render Processes` parameter (see
+        `quartet_tracelink.parallel`).  Documents with fewer events than
+        the `Render Chunk Size`, with events that can not be sent to
+        another process or that hit an error in the process pool are
+        rendered in this process, as are all documents rendered by a
+        daemonic process (such as a Celery prefork worker).  The reason
+        the parallel path was skipped is logged in the task messages.
+        :param epcis_document: The EPCPyYes document to render.
+        """
+        chunk_size = self.get_integer_parameter('Render Chunk Size', 1000)
+        if len(epcis_document.template_events) <= chunk_size:
+            self.info('Rendering in a single process: the document has no '
+                      'more events than the Render Chunk Size (%s).',
+                      chunk_size)
+            return
+        try:
+            prerender_events(epcis_document, self.render_processes,
+                             chunk_size)
+        except NotTransferable as e:
+            self.info('Rendering in a single process: %s', e)
+        except (BrokenProcessPool, OSError) as e:
+            self.warning('The render processes failed (%r).  Rendering in '
+                         'a single process.', e)
+
+    def stream_document(self, epcis_document, name=None):
+        """
+        Renders the document chunk by chunk so the full message is never
+        held in memory as a single string.
+        :param epcis_document: The EPCPyYes document to render.
+        :param name: The file name to use if the `Stream Output Directory`
+            parameter is configured.  Defaults to the task name.
+        :return: A DocumentReader positioned at the start of the document.
+        """
+        directory = self.get_parameter('Stream Output Directory', None)
+        if directory:
+            name = name or '%s.xml' % (
+                self.task.name if self.task else uuid.uuid4().hex)
+            path = os.path.join(directory, name)
+            with open(path, 'wb') as stream:
+                write_document(epcis_document, stream,
+                               minified=self.minify_output)
+            self.info('Streamed the outbound document to %s', path)
+            return DocumentReader(path)
+        spool = SpooledTemporaryFile(
+            max_size=self.get_integer_parameter('Spool Max Size', 5242880)
+        )
+        write_document(epcis_document, spool, minified=self.minify_output)
+        spool.seek(0)
+        return DocumentReader(spool)
+
+    def compress_document(self, epcis_document, name=None):
+        """
+        Renders the document straight into a gzip file or zip archive (see
+        the `Compression` parameter).  The sizes are kept on the reader's
+        `compression_stats` until the document is sent (see
+        `record_compression`).
+        :param epcis_document: The EPCPyYes document to render.
+        :param name: The name of the uncompressed document.  Defaults to the
+            task name.
+        :return: A DocumentReader positioned at the start of the compressed
+            document.
+        """
+        as_json = self.get_boolean_parameter('JSON', False)
+        name = name or '%s.%s' % (
+            self.task.name if self.task else uuid.uuid4().hex,
+            'json' if as_json else 'xml')
+        filename = self.get_parameter('Compressed File Name', None) or name
+        directory = self.get_parameter('Stream Output Directory', None)
+        if directory:
+            path = os.path.join(
+                directory, name + COMPRESSION_EXTENSIONS[self.compression])
+            stream = open(path, 'wb')
+        else:
+            path = None
+            stream = SpooledTemporaryFile(
+                max_size=self.get_integer_parameter('Spool Max Size',
+                                                    5242880)
+            )
+        with compressed_stream(stream, self.compression,
+                               filename) as compressed:
+            if as_json:
+                size = compressed.write(
+                    epcis_document.render_json().encode('utf-8'))
+            else:
+                size = write_document(epcis_document, compressed,
+                                      minified=self.minify_output)
+        compressed_size = stream.tell()
+        ratio = size / compressed_size if compressed_size else 0
+        if path:
+            stream.close()
+            reader = DocumentReader(path, compression=self.compression)
         else:
-            event.event_time = self.format_datetime(event.event_time,
-                                                    increment_dates,
-                                                    increment_val)
+            stream.seek(0)
+            reader = DocumentReader(stream, compression=self.compression)
+        reader.compression_stats = {
+            'filename': filename,
+            'bytes': size,
+            'compressed_bytes': compressed_size,
+            'ratio': round(ratio, 2)
+        }
+        return reader
+
+    def record_compression(self, data, rule_context: RuleContext):
+        """
+        Logs the compression ratio of each outbound document and adds it to
+        the TRACELINK_COMPRESSION context key.
+        :param data: The outbound document or list of documents.
+        :param rule_context: The RuleContext to record the ratios in.
+        """
+        for document in data if isinstance(data, list) else [data]:
+            stats = getattr(document, 'compression_stats', None)
+            if not stats:
+                continue
+            self.info('Compressed %s from %s to %s bytes (%.1f:1).',
+                      stats['filename'], stats['bytes'],
+                      stats['compressed_bytes'], stats['ratio'])
+            rule_context.context.setdefault(
+                TraceLinkContextKeys.COMPRESSION_KEY.value, []
+            ).append(stats)
+
+    def convert_dates(self, event, increment_dates=False, increment_val=0):
+        event.event_time = self.format_datetime(
+            dates.get_event_time(event), increment_dates, increment_val)
         if event.record_time:
-            event.record_time = self.format_datetime(event.record_time,
-                                                     increment_dates,
-                                                     increment_val)
+            event.record_time = self.format_datetime(
+                event.record_time, increment_dates, increment_val)
+
+    def convert_event_dates(self, events, increment_dates=False):
+        """
+        Converts the dates of each event with `convert_dates`.  Override
+        either method to change how dates are converted.
+        :param events: The events to convert.
+        :param increment_dates: If True each event's times are incremented
+            by its position in the list (in seconds).
+        :return: None
+        """
+        for index, event in enumerate(events):
+            self.convert_dates(event, increment_dates, index)
 
     def pre_execute(self, rule_context: RuleContext):
         """
@@ -344,8 +772,7 @@ class TracelinkOutputStep(EPCPyYesOutputStep):
         """
         for epc in event.epc_list:
             if epc.startswith('urn:epc:id:sgtin:'):
-                result = URNConverter(epc)
-                return result.gtin14
+                return urn_decoder.get_gtin14(epc)
 
     def get_additional_context(self, context):
         """
@@ -360,8 +787,80 @@ class TracelinkOutputStep(EPCPyYesOutputStep):
         ret = super().declared_parameters()
         ret['Template Name'] = 'Jinja 2 template path to override.  Not the ' \
                                'name of a qu4rtet template.'
+        ret['Stream Output'] = 'Boolean, default False.  If True, XML is ' \
+                               'rendered incrementally to a temporary ' \
+                               'file and the outbound message context key ' \
+                               'will contain a file-like reader instead ' \
+                               'of a string.'
+        ret['Stream Output Directory'] = 'Optional.  If set along with ' \
+                                         'Stream Output, documents are ' \
+                                         'written to this directory ' \
+                                         'instead of a temporary file.'
+        ret['Spool Max Size'] = 'The number of bytes a streamed document ' \
+                                'may use in memory before being moved ' \
+                                'to disk.  Default is 5242880.'
+        ret['Max Events Per Document'] = 'Optional.  Splits the outbound ' \
+                                         'message into documents with no ' \
+                                         'more than this many events.  ' \
+                                         'Aggregations are never split ' \
+                                         'from their children and the ' \
+                                         'filtered events always go in ' \
+                                         'the last document.  The ' \
+                                         'outbound message context key ' \
+                                         'will contain a list if more ' \
+                                         'than one document is created, ' \
+                                         'so the rule must queue it with ' \
+                                         'the quartet_tracelink ' \
+                                         'CreateOutputTaskStep.'
+        ret['Max Bytes Per Document'] = 'Optional.  Splits the outbound ' \
+                                        'message into documents no larger ' \
+                                        'than this many (uncompressed) ' \
+                                        'bytes where the hierarchy allows.'
+        ret['Record Timings'] = 'Boolean, default False.  If True, the ' \
+                                'time spent and database queries run in ' \
+                                'each phase of the step are summarized ' \
+                                'in a task message and added to the ' \
+                                'TRACELINK_STEP_TIMINGS context key.'
+        ret['Minify Output'] = 'Boolean, default False.  If True, the ' \
+                               'whitespace between XML tags is removed ' \
+                               'as the document is rendered.'
+        ret['Render Processes'] = 'Optional.  Renders the events of large ' \
+                                  'documents in chunks across this many ' \
+                                  'worker processes.  The output is ' \
+                                  'identical to rendering in a single ' \
+                                  'process.'
+        ret['Render Chunk Size'] = 'The number of events each render ' \
+                                   'process renders at a time.  Default ' \
+                                   'is 1000.'
+        ret['Compression'] = 'Optional.  Either gzip or zip.  Documents ' \
+                             'are compressed as they are rendered and the ' \
+                             'outbound message context key will contain ' \
+                             'a file-like reader of the compressed ' \
+                             'bytes.  The compression ratio is added to ' \
+                             'the TRACELINK_COMPRESSION context key.  ' \
+                             'Set the transport step\'s file-extension ' \
+                             'and content-type parameters to match.'
+        ret['Compressed File Name'] = 'Optional.  The file name stored in ' \
+                                      'the gzip header or zip archive.  ' \
+                                      'Defaults to the task name.'
+        ret['Log Preview Bytes'] = 'The most bytes of a rendered document ' \
+                                   'to log in the task messages.  Zero ' \
+                                   'turns the preview off.  Default is ' \
+                                   '1000.'
+        ret['Log Sample Rate'] = 'The fraction of tasks, between 0 and 1, ' \
+                                 'that log a preview of the rendered ' \
+                                 'document.  Default is 1.'
+        ret['Log Directory'] = 'Optional.  When Django\'s DEBUG setting ' \
+                               'is on, each rendered document is written ' \
+                               'in full to this directory.'
         return ret
 
+    class CompressionError(Exception):
+        pass
+
+    class SplitConfigurationError(Exception):
+        pass
+
 
 class TracelinkFilteredEventOutputStep(TracelinkOutputStep,
                                        DynamicTemplateMixin):
@@ -372,6 +871,7 @@ class TracelinkFilteredEventOutputStep(TracelinkOutputStep,
     CreateOutputTaskStep later in the rule for example.
     """
 
+    @instrumented
     def execute(self, data, rule_context: RuleContext):
         """
         Will pull any filtered events off of the rule context using the
@@ -388,37 +888,40 @@ class TracelinkFilteredEventOutputStep(TracelinkOutputStep,
         filtered_events = self.get_filtered_events()
         self.info('Found %s filtered events.' % len(filtered_events))
         if len(filtered_events) > 0:
-            self.process_events(filtered_events)
-            self.transform_event(filtered_events[0])
-            self.transform_business_transaction(filtered_events[0])
-            dest, source = self.get_sgln_info(filtered_events[0])
-            db_records = self.get_partner_info_by_sgln(filtered_events[0])
-            if hasattr(self, 'mapping'):
-                sbdh = self.generate_sbdh(
-                    sender_gln=self.mapping.ship_from,
-                    receiver_gln=self.mapping.to_business
-                )
-            else:
-                sbdh = self.generate_sbdh(
-                    sender_sgln=source,
-                    receiver_sgln=dest
-                )
+            with self.phase('enrichment'):
+                self.process_events(filtered_events)
+                self.transform_event(filtered_events[0])
+                self.transform_business_transaction(filtered_events[0])
+                dest, source = self.get_sgln_info(filtered_events[0])
+                db_records = self.get_partner_info_by_sgln(filtered_events[0])
+                if hasattr(self, 'mapping'):
+                    sbdh = self.generate_sbdh(
+                        sender_gln=self.mapping.ship_from,
+                        receiver_gln=self.mapping.to_business
+                    )
+                else:
+                    sbdh = self.generate_sbdh(
+                        sender_sgln=source,
+                        receiver_sgln=dest
+                    )
+                additional_context = self.additional_context(db_records)
             if self.convert_date_strings:
-                for event in filtered_events:
-                    self.convert_dates(event)
-            epcis_document = template_events.EPCISEventListDocument(
-                filtered_events,
-                sbdh,
-                template=self.get_template(env, 'quartet_tracelink/tracelink_'
-                                                'epcis_events_document.xml'),
-                additional_context=self.additional_context(db_records)
-            )
-            if self.get_boolean_parameter('JSON', False):
-                data = epcis_document.render_json()
-            else:
-                data = epcis_document.render()
-                self.info('Rendering: %s', data
-                          )
+                with self.phase('date_conversion'):
+                    for event in filtered_events:
+                        self.convert_dates(event)
+            with self.phase('render'):
+                epcis_document = template_events.EPCISEventListDocument(
+                    filtered_events,
+                    sbdh,
+                    template=self.get_template(
+                        env,
+                        'quartet_tracelink/tracelink_epcis_events_document.xml'
+                    ),
+                    additional_context=additional_context
+                )
+                data = self.render_document(epcis_document)
+            self.record_compression(data, rule_context)
+            self.log_policy.log(self, data)
             self.info('Warning: this step is overwriting the Outbound '
                       'EPCIS Message key context key data.  If any data '
                       'was in this key prior to this step and had not '
@@ -511,7 +1014,38 @@ class TracelinkFilteredEventOutputStep(TracelinkOutputStep,
             'Replace': 'Put a string value you would like to replace in '
                        'the business transaction source transaction string. ',
             'Default Disposition': 'If no disposition is specified, use this '
-                                   'value.  Must be full URN.'
+                                   'value.  Must be full URN.',
+            'Stream Output': 'Boolean, default False.  If True, XML is '
+                             'rendered incrementally to a temporary file '
+                             'and the outbound message context key will '
+                             'contain a file-like reader instead of a '
+                             'string.',
+            'Record Timings': 'Boolean, default False.  If True, the time '
+                              'spent and database queries run in each '
+                              'phase of the step are summarized in a task '
+                              'message and added to the '
+                              'TRACELINK_STEP_TIMINGS context key.',
+            'Minify Output': 'Boolean, default False.  If True, the '
+                             'whitespace between XML tags is removed as the '
+                             'document is rendered.',
+            'Compression': 'Optional.  Either gzip or zip.  The document is '
+                           'compressed as it is rendered and the outbound '
+                           'message context key will contain a file-like '
+                           'reader of the compressed bytes.  Set the '
+                           'transport step\'s file-extension and '
+                           'content-type parameters to match.',
+            'Compressed File Name': 'Optional.  The file name stored in the '
+                                    'gzip header or zip archive.  Defaults '
+                                    'to the task name.',
+            'Log Preview Bytes': 'The most bytes of the rendered document '
+                                 'to log in the task messages.  Zero turns '
+                                 'the preview off.  Default is 1000.',
+            'Log Sample Rate': 'The fraction of tasks, between 0 and 1, that '
+                               'log a preview of the rendered document.  '
+                               'Default is 1.',
+            'Log Directory': 'Optional.  When Django\'s DEBUG setting is '
+                             'on, the rendered document is written in full '
+                             'to this directory.'
         }
 
     def on_failure(self):
@@ -528,12 +1062,14 @@ class CombinedOutputStep(TracelinkOutputStep):
     def __init__(self, db_task: models.Task, **kwargs):
         super().__init__(db_task, **kwargs)
         self.mapping = None
-        self.items = []
+        self.items = OrderedDict()
+        self.trade_items = {}
         self.packaging_levels = {'EA':'EA', 'CS': 'CA', 'BND': 'PK'}
 
     def pre_execute(self, rule_context: RuleContext):
         # Get items from context
         events = rule_context.context.get(ContextKeys.OBJECT_EVENTS_KEY.value)
+        self.load_trade_items(events)
         for oevent in events:
             self.trade_item_masterdata(oevent)
         # get GLN's (mappings) from filtered events
@@ -544,30 +1080,48 @@ class CombinedOutputStep(TracelinkOutputStep):
     def get_packaging_level(self, package_uom):
         return self.packaging_levels.get(package_uom) or package_uom
 
+    def load_trade_items(self, events: list):
+        """
+        Looks up the GTIN14 of every SGTIN object event and loads all of
+        the corresponding trade items from the trade item cache (with at
+        most one query for those that are not cached).
+        :param events: The object events.
+        :return: None
+        """
+        sgtin_events = [event for event in events
+                        if ':sgtin:' in event.epc_list[0]]
+        decoded = urn_decoder.decode_many(
+            [event.epc_list[0] for event in sgtin_events])
+        gtins = set()
+        for event, urn in zip(sgtin_events, decoded):
+            event.GTIN14 = urn.gtin14
+            gtins.add(urn.gtin14)
+        for gtin14, trade_item in trade_item_cache.get_many(gtins).items():
+            # Change UOM code if TraceLink requires something else
+            trade_item.package_uom = self.get_packaging_level(
+                trade_item.package_uom)
+            self.trade_items[gtin14] = trade_item
+
     def trade_item_masterdata(self, event: template_events.ObjectEvent):
         epc = event.epc_list[0]
         if ':sgtin:' in epc:
-            parsed_gtin = URNConverter(epc)
-            event.GTIN14 = parsed_gtin._gtin14
-            # Get prefix and identifier (without 'urn:epc:id:sgln:' and
-            # serial number parts)
-            prefix_and_identifier = epc.split(':')[-1][:14]
-
-            # Get TradeItem instance
-            try:
-                trade_item = TradeItem.objects.get(GTIN14=event.GTIN14)
-            except TradeItem.DoesNotExist:
+            trade_item = self.trade_items.get(getattr(event, 'GTIN14', None))
+            if not trade_item:
+                # the event was not part of a batch loaded in pre_execute
+                self.load_trade_items([event])
+                trade_item = self.trade_items.get(event.GTIN14)
+            if not trade_item:
                 raise self.TradeItemDoesNotExist(
                     'Trade Item does not exist in the master data'
                 )
-            # Change UOM code if TraceLink requires something else
-            packaging_uom = self.get_packaging_level(trade_item.package_uom)
-            event.packaging_uom = packaging_uom
-            trade_item.package_uom = packaging_uom
-            item = (prefix_and_identifier, trade_item)
-            # Add GTIN info to the items list
-            if item not in self.items:
-                self.items.append(item)
+            event.packaging_uom = trade_item.package_uom
+            # Add GTIN info to the items- keyed by GTIN so each trade item
+            # is only added once.  The key in the tuple is the prefix and
+            # identifier (without 'urn:epc:id:sgln:' and serial number
+            # parts)
+            if event.GTIN14 not in self.items:
+                self.items[event.GTIN14] = (epc.split(':')[-1][:14],
+                                            trade_item)
 
     def process_events(self, events):
         self.get_mapping(events)
@@ -588,8 +1142,9 @@ class CombinedOutputStep(TracelinkOutputStep):
                     company_prefix = fields['company_prefix']
                     self.info('Using company prefix %s', company_prefix)
                     try:
-                        self.mapping = OutboundMapping.objects.get(
-                            company__gs1_company_prefix=company_prefix)
+                        self.mapping = \
+                            mapping_cache.get_by_company_prefix(
+                                company_prefix)
                         break
                     except OutboundMapping.DoesNotExist:
                         raise self.CompanyConfigurationError(
@@ -601,7 +1156,7 @@ class CombinedOutputStep(TracelinkOutputStep):
                         )
 
     def get_items_master_data(self):
-        return self.items
+        return list(self.items.values())
 
     def get_additional_context(self, context):
         if self.items:
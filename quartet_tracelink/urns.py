@@ -0,0 +1,122 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+"""
+Memoized decoding of SGTIN and SSCC URNs.  The company prefix, GTIN14 and
+extension digit of a URN do not depend on its serial number so they are
+decoded once (with gs123's URNConverter) per company prefix and item
+reference (or extension digit) and cached.
+"""
+from collections import namedtuple
+
+from gs123.conversion import URNConverter, URNNotValid
+
+SGTIN_PREFIX = 'urn:epc:id:sgtin:'
+SSCC_PREFIX = 'urn:epc:id:sscc:'
+
+DecodedURN = namedtuple('DecodedURN', [
+    'company_prefix',
+    'gtin14',
+    'extension_digit',
+    'is_sgtin',
+])
+
+
+class URNDecoder:
+    """
+    Decodes URNs and caches the results by the non-serial part of the URN.
+    """
+
+    def __init__(self, max_size: int = 65536):
+        """
+        :param max_size: The cache is cleared when it holds more than this
+            many distinct products/extension digits.
+        """
+        self.max_size = max_size
+        self._cache = {}
+
+    @staticmethod
+    def get_key(urn: str):
+        """
+        :param urn: An SGTIN or SSCC URN.
+        :return: The URN up to and including the item reference (SGTIN) or
+            extension digit (SSCC) or None if it is not an SGTIN or SSCC.
+        """
+        if urn.startswith(SGTIN_PREFIX):
+            parts = urn.split('.', 2)
+            if len(parts) == 3:
+                return '%s.%s' % (parts[0], parts[1])
+        elif urn.startswith(SSCC_PREFIX):
+            parts = urn.split('.', 1)
+            if len(parts) == 2:
+                return '%s.%s' % (parts[0], parts[1][:1])
+        return None
+
+    def decode(self, urn: str):
+        """
+        :param urn: An SGTIN or SSCC URN.
+        :return: A DecodedURN.  The gtin14 is None for SSCCs and the
+            extension_digit is None for SGTINs.
+        :raises URNNotValid: If the urn is not a valid SGTIN or SSCC.
+        """
+        key = self.get_key(urn)
+        decoded = self._cache.get(key)
+        if decoded is None:
+            decoded = self._decode(urn)
+            if len(self._cache) >= self.max_size:
+                self._cache.clear()
+            self._cache[key] = decoded
+        return decoded
+
+    def decode_many(self, epc_list: list):
+        """
+        Decodes an entire EPC list.
+        :param epc_list: A list of SGTIN and/or SSCC URNs.
+        :return: A list of DecodedURN tuples in the same order.
+        """
+        get_key = self.get_key
+        cache = self._cache
+        ret = []
+        for urn in epc_list:
+            decoded = cache.get(get_key(urn))
+            if decoded is None:
+                decoded = self.decode(urn)
+            ret.append(decoded)
+        return ret
+
+    def get_company_prefix(self, urn: str):
+        return self.decode(urn).company_prefix
+
+    def get_gtin14(self, urn: str):
+        return self.decode(urn).gtin14
+
+    def _decode(self, urn: str):
+        converter = URNConverter(urn)
+        company_prefix = getattr(converter, '_company_prefix', None)
+        if not company_prefix or not self.get_key(urn):
+            raise URNNotValid('The urn %s is not a valid SGTIN or SSCC '
+                              'urn.' % urn)
+        if converter.is_sgtin:
+            return DecodedURN(company_prefix, converter.gtin14, None, True)
+        return DecodedURN(company_prefix, None, converter._extension_digit,
+                          False)
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+urn_decoder = URNDecoder()
@@ -274,7 +274,7 @@ def create_example_rule(rule_name="TraceLink EPCIS Output Filter"):
         output_step = capture_models.Step.objects.create(
             name=_('Queue Outbound Message'),
             description=_('Creates a Task for sending any outbound data'),
-            step_class='quartet_output.steps.CreateOutputTaskStep',
+            step_class='quartet_tracelink.steps.CreateOutputTaskStep',
             order=5,
             rule=rule
         )
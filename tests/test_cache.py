@@ -0,0 +1,252 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+from unittest import TestCase as SimpleTestCase
+
+from django.test import TestCase
+from jinja2 import Environment
+
+from quartet_masterdata.models import Company, Location, OutboundMapping, \
+    TradeItem
+from quartet_tracelink.cache import LRUCache, GLNResolver, \
+    trade_item_cache, gln_resolver, fragment_cache, mapping_cache
+from quartet_tracelink.parsing.epcpyyes import get_default_environment
+
+
+class TestLRUCache(SimpleTestCase):
+
+    def test_eviction(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats, {'hits': 3, 'misses': 1,
+                                       'evictions': 1, 'size': 2,
+                                       'max_size': 2})
+
+    def test_ttl(self):
+        now = [0]
+        cache = LRUCache(ttl=10, timer=lambda: now[0])
+        cache.set('a', 1)
+        now[0] = 9
+        self.assertEqual(cache.get('a'), 1)
+        now[0] = 10
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class TestTradeItemCache(TestCase):
+
+    def setUp(self):
+        trade_item_cache.clear()
+        company = Company.objects.create(name='test',
+                                         gs1_company_prefix='0355555')
+        self.trade_item = TradeItem.objects.create(
+            GTIN14='00355555555551', package_uom='Ea', NDC_pattern='5-3-2',
+            NDC='55555-555-55', company=company)
+        TradeItem.objects.create(
+            GTIN14='30355555555552', package_uom='Bdl', NDC_pattern='5-3-2',
+            NDC='55555-555-55', company=company)
+
+    def tearDown(self):
+        trade_item_cache.clear()
+
+    def test_get_many(self):
+        gtins = ['00355555555551', '30355555555552', '10355555555558']
+        with self.assertNumQueries(1):
+            items = trade_item_cache.get_many(gtins)
+        self.assertEqual(sorted(items), gtins[:2])
+        with self.assertNumQueries(0):
+            self.assertEqual(len(trade_item_cache.get_many(gtins[:2])), 2)
+        self.assertEqual(trade_item_cache.stats['hits'], 2)
+
+    def test_get_by_urn_returns_copies(self):
+        urn = 'urn:epc:id:sgtin:0355555.055555.100'
+        trade_item = trade_item_cache.get_by_urn(urn)
+        trade_item.package_uom = 'EA'
+        with self.assertNumQueries(0):
+            trade_item = trade_item_cache.get_by_urn(
+                'urn:epc:id:sgtin:0355555.055555.101')
+        self.assertEqual(trade_item.package_uom, 'Ea')
+        self.assertIsNone(
+            trade_item_cache.get_by_urn('urn:epc:id:sscc:0355555.0000000001'))
+
+    def test_signals_invalidate(self):
+        urn = 'urn:epc:id:sgtin:0355555.055555.100'
+        trade_item_cache.get_by_urn(urn)
+        self.trade_item.NDC = '55555-555-56'
+        self.trade_item.save()
+        self.assertEqual(trade_item_cache.get_by_urn(urn).NDC,
+                         '55555-555-56')
+        self.trade_item.delete()
+        self.assertIsNone(trade_item_cache.get_by_urn(urn))
+
+
+class TestGLNResolver(TestCase):
+
+    def setUp(self):
+        gln_resolver.clear()
+        self.company = Company.objects.create(
+            name='test', gs1_company_prefix='0355555', GLN13='0355555000005',
+            SGLN='urn:epc:id:sgln:0355555.00000.0')
+        Company.objects.create(name='test 2', gs1_company_prefix='0344444',
+                               GLN13='0344444000008')
+
+    def test_lookups_use_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                gln_resolver.get_gln_by_sgln('urn:epc:id:sgln:0355555.00000.0'),
+                '0355555000005')
+            self.assertEqual(
+                gln_resolver.get_gln_by_company_prefix('0344444'),
+                '0344444000008')
+            for i in range(2):
+                with self.assertRaises(Company.DoesNotExist):
+                    gln_resolver.get_gln_by_company_prefix('0311111')
+                with self.assertRaises(Company.DoesNotExist):
+                    gln_resolver.get_gln_by_sgln(
+                        'urn:epc:id:sgln:0311111.00000.0')
+
+    def test_company_changes_invalidate(self):
+        with self.assertRaises(Company.DoesNotExist):
+            gln_resolver.get_gln_by_company_prefix('0311111')
+        self.company.gs1_company_prefix = '0311111'
+        self.company.save()
+        self.assertEqual(gln_resolver.get_gln_by_company_prefix('0311111'),
+                         '0355555000005')
+        self.company.delete()
+        with self.assertRaises(Company.DoesNotExist):
+            gln_resolver.get_gln_by_company_prefix('0311111')
+
+    def test_ambiguous_prefix(self):
+        Company.objects.create(name='test 3', gs1_company_prefix='0344444',
+                               GLN13='0344444000015')
+        with self.assertRaises(Company.MultipleObjectsReturned):
+            gln_resolver.get_gln_by_company_prefix('0344444')
+
+    def test_ttl(self):
+        now = [0]
+        resolver = GLNResolver(ttl=10, timer=lambda: now[0])
+        resolver.get_gln_by_company_prefix('0355555')
+        now[0] = 10
+        resolver.get_gln_by_company_prefix('0355555')
+        self.assertEqual(resolver.stats, {'hits': 0, 'loads': 2})
+
+
+class TestFragmentCache(TestCase):
+
+    def setUp(self):
+        fragment_cache.clear()
+        company = Company.objects.create(
+            name='Test Company', gs1_company_prefix='0355555',
+            SGLN='urn:epc:id:sgln:0355555.00000.0', address1='1 Main St',
+            city='Trenton', state_province='NJ', postal_code='08601',
+            country='US')
+        self.location = Location.objects.create(
+            name='Test Location', SGLN='urn:epc:id:sgln:0355555.00001.0',
+            address1='2 Main St', city='Trenton', state_province='NJ',
+            postal_code='08601', country='US', company=company)
+        self.masterdata = [company, None, self.location]
+
+    def tearDown(self):
+        fragment_cache.clear()
+
+    def render(self, source, env=None):
+        env = env or get_default_environment()
+        return env.from_string(source).render(
+            additional_context={'masterdata': self.masterdata})
+
+    def test_output_matches_include(self):
+        env = get_default_environment()
+        # without the cached_include global the partners are included
+        plain = Environment(loader=env.loader,
+                            extensions=['jinja2.ext.with_'],
+                            trim_blocks=True, lstrip_blocks=True)
+        for name in ('masterdata.xml', 'masterdata_with_items.xml'):
+            source = env.loader.get_source(
+                env, 'quartet_tracelink/%s' % name)[0]
+            expected = self.render(source, plain)
+            self.assertIn('Test Location', expected)
+            self.assertEqual(self.render(source), expected)
+            self.assertEqual(self.render(source), expected)
+        self.assertEqual(fragment_cache.stats['hits'], 3)
+
+    def test_unsaved_records_are_not_cached(self):
+        self.masterdata.append(Location(name='Unsaved'))
+        self.render('{% include "quartet_tracelink/masterdata.xml" %}')
+        self.assertEqual(fragment_cache.stats['size'], 0)
+
+    def test_location_changes_invalidate(self):
+        self.render('{% include "quartet_tracelink/masterdata.xml" %}')
+        self.location.name = 'Renamed Location'
+        self.location.save()
+        self.assertIn('Renamed Location', self.render(
+            '{% include "quartet_tracelink/masterdata.xml" %}'))
+
+    def test_key_follows_record_fields(self):
+        self.render('{% include "quartet_tracelink/masterdata.xml" %}')
+        # bypasses the signals that clear the cache
+        Location.objects.filter(pk=self.location.pk).update(
+            name='Updated Location')
+        self.masterdata[2] = Location.objects.get(pk=self.location.pk)
+        self.assertIn('Updated Location', self.render(
+            '{% include "quartet_tracelink/masterdata.xml" %}'))
+
+
+class TestMappingCache(TestCase):
+
+    def setUp(self):
+        mapping_cache.clear()
+        company = Company.objects.create(
+            name='Test Company', gs1_company_prefix='0355555',
+            GLN13='0355555000006')
+        partner = Company.objects.create(
+            name='Test Partner', gs1_company_prefix='0967914',
+            GLN13='0967914000002')
+        self.location = Location.objects.create(
+            name='Test Location', GLN13='0967914000019', company=partner)
+        OutboundMapping.objects.create(company=company,
+                                       from_business=company,
+                                       to_business=partner,
+                                       ship_to=self.location)
+
+    def tearDown(self):
+        mapping_cache.clear()
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            mapping = mapping_cache.get_by_company_prefix('0355555')
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                mapping, mapping_cache.get_by_company_prefix('0355555'))
+        self.assertEqual(mapping.from_business.GLN13, '0355555000006')
+        self.assertEqual(mapping.to_business.name, 'Test Partner')
+        self.assertEqual(mapping.ship_to.name, 'Test Location')
+        self.assertIsNone(mapping.ship_from)
+
+    def test_location_changes_invalidate(self):
+        mapping_cache.get_by_company_prefix('0355555')
+        self.location.name = 'Renamed Location'
+        self.location.save()
+        self.assertEqual(
+            mapping_cache.get_by_company_prefix('0355555').ship_to.name,
+            'Renamed Location')
+
+    def test_missing_mapping(self):
+        with self.assertRaises(OutboundMapping.DoesNotExist):
+            mapping_cache.get_by_company_prefix('0967914')
@@ -0,0 +1,75 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+from django.test import TestCase
+
+from EPCPyYes.core.v1_2 import template_events
+from quartet_capture.models import Rule, Step, StepParameter, Task
+from quartet_capture.rules import Rule as RuleEngine
+from quartet_epcis.models import Entry
+
+
+class TestCommonAttributesOutputStep(TestCase):
+
+    def setUp(self):
+        rule = Rule.objects.create(name='Common Attributes')
+        step = Step.objects.create(
+            name='Render',
+            rule=rule,
+            step_class='quartet_tracelink.steps.'
+                       'TraceLinkCommonAttributesOutputStep',
+            order=1
+        )
+        StepParameter.objects.create(name='Sender GLN', value='0355555555555',
+                                     step=step)
+        task = Task.objects.create(rule=rule, name='common attributes task')
+        self.step = RuleEngine(rule, task).steps[1]
+
+    def _create_hierarchy(self, pallet_number):
+        pallet = Entry.objects.create(
+            identifier='urn:epc:id:sscc:0355555.%s0000000' % pallet_number)
+        case = Entry.objects.create(
+            identifier='urn:epc:id:sscc:0355555.%s0000001' % pallet_number,
+            parent_id=pallet, top_id=pallet)
+        pack = Entry.objects.create(
+            identifier='urn:epc:id:sscc:0355555.%s0000002' % pallet_number,
+            parent_id=case, top_id=pallet)
+        return [pallet, case, pack]
+
+    def _create_events(self, entries):
+        return [
+            template_events.ObjectEvent(
+                epc_list=[entry.identifier],
+                read_point='urn:epc:id:sgln:0355555.00000.1'
+            ) for entry in entries
+        ]
+
+    def test_packaging_levels_use_one_query(self):
+        hierarchies = [self._create_hierarchy(i) for i in (1, 2, 3)]
+        events = self._create_events(sum(hierarchies, []))
+        with self.assertNumQueries(1):
+            self.step.load_entries(events)
+            for event in events:
+                self.step.get_common_attributes(event)
+        self.assertEqual([event.packaging_uom for event in events],
+                         ['PL', 'CA', 'PK'] * 3)
+        self.assertEqual([event.is_gtin for event in events],
+                         [False, True, True] * 3)
+        self.assertEqual(events[0].company_prefix, '0355555')
+
+    def test_entry_not_loaded(self):
+        events = self._create_events(self._create_hierarchy(1))
+        with self.assertNumQueries(1):
+            self.step.get_common_attributes(events[2])
+        self.assertEqual(events[2].packaging_uom, 'PK')
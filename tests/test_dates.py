@@ -0,0 +1,124 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+from datetime import timedelta
+from unittest import TestCase
+
+from dateutil import parser
+from django.test import TestCase as DjangoTestCase
+from pytz import timezone
+
+from EPCPyYes.core.v1_2 import template_events
+from quartet_capture.models import Rule, Step, Task
+from quartet_capture.rules import Rule as RuleEngine
+from quartet_tracelink import dates
+from quartet_tracelink.steps import TracelinkOutputStep
+
+
+def dateutil_format(dt_string, parse_utc=True, increment_seconds=0):
+    try:
+        dt_obj = parser.parse(dt_string)
+        if parse_utc:
+            dt_obj = dt_obj.astimezone(timezone('UTC'))
+        dt_obj = dt_obj + timedelta(seconds=increment_seconds)
+        return dt_obj.strftime('%Y-%m-%dT%H:%M:%SZ')
+    except (ValueError, OverflowError):
+        return dt_string
+
+
+class TestDates(TestCase):
+    values = [
+        '2020-01-01T12:00:00.000000+00:00',
+        '2020-01-01T12:00:00+00:00',
+        '2020-01-01T12:00:00Z',
+        '2020-01-01T12:00:00.5Z',
+        '2020-01-01T12:00:00.123456789-05:00',
+        '2019-12-31T23:30:00-05:00',
+        '2020-03-01T01:00:00+05:30',
+        '2020-01-01 12:00:00+01:00',
+        '2020-01-01T12:00:00',
+        '2020-01-01T12:00:00+0100',
+        'January 1 2020 12:00 UTC',
+        '2020-02-30T12:00:00Z',
+        'not a date',
+    ]
+
+    def test_matches_dateutil(self):
+        for value in self.values:
+            for parse_utc in (True, False):
+                for increment in (0, 3600):
+                    self.assertEqual(
+                        dates.format_datetime(value, parse_utc, increment),
+                        dateutil_format(value, parse_utc, increment),
+                        value
+                    )
+
+    def test_timezone_cache(self):
+        self.assertIs(dates.get_timezone('-05:00'),
+                      dates.get_timezone('-05:00'))
+        self.assertEqual(dates.get_timezone('-05:30').utcoffset(None),
+                         -timedelta(hours=5, minutes=30))
+
+
+class FormattedDateStep(TracelinkOutputStep):
+
+    def format_datetime(self, dt_string, increment_dates=False,
+                        increment_val=0):
+        return 'formatted %s' % super().format_datetime(
+            dt_string, increment_dates, increment_val)
+
+
+class TestStepDates(DjangoTestCase):
+
+    def _create_step(self, step_class):
+        rule = Rule.objects.create(name='Dates')
+        Step.objects.create(
+            name='Render',
+            rule=rule,
+            step_class='%s.%s' % (step_class.__module__,
+                                  step_class.__name__),
+            order=1
+        )
+        task = Task.objects.create(rule=rule, name='dates task')
+        return RuleEngine(rule, task).steps[1]
+
+    def _create_events(self):
+        return [
+            template_events.ObjectEvent(
+                event_time='2020-01-01T12:00:00.000000+00:00',
+                event_timezone_offset='-05:00',
+                record_time='2020-01-01T12:00:00.000000+00:00',
+                epc_list=['urn:epc:id:sgtin:305555.0555555.%s' % i]
+            ) for i in range(3)
+        ]
+
+    def test_convert_event_dates(self):
+        events = self._create_events()
+        step = self._create_step(TracelinkOutputStep)
+        step.convert_event_dates(events, increment_dates=True)
+        self.assertEqual([event.event_time for event in events], [
+            '2020-01-01T17:00:00Z',
+            '2020-01-01T17:00:01Z',
+            '2020-01-01T17:00:02Z',
+        ])
+        self.assertEqual(events[2].record_time, '2020-01-01T12:00:02Z')
+
+    def test_format_datetime_override(self):
+        events = self._create_events()
+        step = self._create_step(FormattedDateStep)
+        step.convert_event_dates(events)
+        self.assertEqual(events[0].event_time,
+                         'formatted 2020-01-01T17:00:00Z')
+        self.assertEqual(events[0].record_time,
+                         'formatted 2020-01-01T12:00:00Z')
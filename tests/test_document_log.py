@@ -0,0 +1,76 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+import os
+import tempfile
+from tempfile import SpooledTemporaryFile
+
+from django.test import TestCase, override_settings
+
+from quartet_tracelink.document_log import DocumentLogPolicy
+from quartet_tracelink.rendering import DocumentReader
+
+DOCUMENT = '<epcis>%s</epcis>' % ('x' * 5000)
+
+
+class FakeStep:
+    task = None
+
+    def __init__(self):
+        self.messages = []
+
+    def info(self, message, *args):
+        self.messages.append(message % args)
+
+
+class TestDocumentLogPolicy(TestCase):
+
+    def test_preview_is_bounded(self):
+        step = FakeStep()
+        DocumentLogPolicy(preview_bytes=100).log(step, [DOCUMENT, DOCUMENT])
+        self.assertEqual(len(step.messages), 1)
+        self.assertIn('2 document(s)', step.messages[0])
+        self.assertTrue(step.messages[0].endswith(DOCUMENT[:100]))
+        step = FakeStep()
+        DocumentLogPolicy(preview_bytes=0).log(step, DOCUMENT)
+        self.assertEqual(step.messages, [])
+
+    def test_sampling(self):
+        samples = iter([0.1, 0.6, 0.4])
+        policy = DocumentLogPolicy(sample_rate=0.5,
+                                   sample=lambda: next(samples))
+        step = FakeStep()
+        for i in range(3):
+            policy.log(step, DOCUMENT)
+        self.assertEqual(len(step.messages), 2)
+
+    def test_dump_requires_debug(self):
+        reader = DocumentReader(SpooledTemporaryFile())
+        reader.file.write(DOCUMENT.encode('utf-8'))
+        reader.seek(0)
+        with tempfile.TemporaryDirectory() as directory:
+            policy = DocumentLogPolicy(preview_bytes=0,
+                                       dump_directory=directory)
+            step = FakeStep()
+            policy.log(step, [reader, DOCUMENT])
+            self.assertEqual(os.listdir(directory), [])
+            with override_settings(DEBUG=True):
+                policy.log(step, [reader, DOCUMENT])
+            paths = sorted(os.path.join(directory, name)
+                           for name in os.listdir(directory))
+            self.assertEqual(len(paths), 2)
+            for path in paths:
+                with open(path) as dump_file:
+                    self.assertEqual(dump_file.read(), DOCUMENT)
+            self.assertEqual(reader.tell(), 0)
@@ -0,0 +1,122 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+import os
+import tempfile
+from threading import Thread
+from unittest import TestCase
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from quartet_tracelink.parsing.epcpyyes import get_default_environment, \
+    invalidate_environments, environment_registry, TemplateBytecodeCache
+
+
+class TestEnvironmentRegistry(TestCase):
+
+    def tearDown(self):
+        invalidate_environments()
+
+    def test_shared_environment(self):
+        env = get_default_environment()
+        self.assertIs(env, get_default_environment())
+        template = env.get_template('quartet_tracelink/common_attributes.xml')
+        self.assertIs(
+            template,
+            get_default_environment().get_template(
+                'quartet_tracelink/common_attributes.xml')
+        )
+
+    def test_keyed_by_loader_configuration(self):
+        env = get_default_environment()
+        epcpyyes_only = environment_registry.get_environment(
+            [('EPCPyYes', 'templates')]
+        )
+        self.assertIsNot(env, epcpyyes_only)
+        self.assertIs(
+            epcpyyes_only,
+            environment_registry.get_environment((('EPCPyYes', 'templates'),))
+        )
+
+    def test_invalidate(self):
+        env = get_default_environment()
+        invalidate_environments()
+        self.assertIsNot(env, get_default_environment())
+
+    def test_invalidate_single_configuration(self):
+        env = get_default_environment()
+        packages = [('EPCPyYes', 'templates')]
+        epcpyyes_only = environment_registry.get_environment(packages)
+        invalidate_environments(packages)
+        self.assertIs(env, get_default_environment())
+        self.assertIsNot(epcpyyes_only,
+                         environment_registry.get_environment(packages))
+
+    def test_auto_reload_setting(self):
+        with override_settings(DEBUG=False):
+            invalidate_environments()
+            self.assertTrue(get_default_environment().auto_reload)
+        with override_settings(QUARTET_TRACELINK_TEMPLATE_AUTO_RELOAD=False):
+            invalidate_environments()
+            self.assertFalse(get_default_environment().auto_reload)
+
+    def test_threads_share_environment(self):
+        invalidate_environments()
+        environments = []
+        threads = [
+            Thread(target=lambda: environments.append(
+                get_default_environment()))
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(id(env) for env in environments)), 1)
+
+
+class TestBytecodeCache(TestCase):
+
+    def tearDown(self):
+        invalidate_environments()
+
+    def test_precompile_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('precompile_tracelink_templates',
+                         directory=directory, stdout=open(os.devnull, 'w'))
+            cached = os.listdir(directory)
+            self.assertTrue(len(cached) > 19)
+            with override_settings(
+                    QUARTET_TRACELINK_TEMPLATE_CACHE_DIR=directory):
+                invalidate_environments()
+                env = get_default_environment()
+                self.assertIsInstance(env.bytecode_cache,
+                                      TemplateBytecodeCache)
+                env.get_template(
+                    'quartet_tracelink/tracelink_epcis_events_document.xml')
+            self.assertEqual(len(cached), len(os.listdir(directory)))
+
+    def test_cache_key_tracks_mtime(self):
+        cache = TemplateBytecodeCache(tempfile.gettempdir())
+        with tempfile.NamedTemporaryFile(suffix='.xml') as template:
+            key = cache.get_cache_key('test.xml', template.name)
+            stat = os.stat(template.name)
+            os.utime(template.name, (stat.st_atime, stat.st_mtime + 10))
+            self.assertNotEqual(key,
+                                cache.get_cache_key('test.xml', template.name))
+
+    def test_no_cache_by_default(self):
+        invalidate_environments()
+        self.assertIsNone(get_default_environment().bytecode_cache)
@@ -0,0 +1,86 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+import pickle
+from copy import copy
+from unittest import TestCase
+
+from quartet_tracelink.epcs import EPCList
+
+PREFIX = 'urn:epc:id:sgtin:0355555.055555.'
+
+
+class TestEPCList(TestCase):
+
+    def setUp(self):
+        self.epcs = [PREFIX + str(serial) for serial in range(1000, 1100)]
+        self.epcs += [PREFIX + '00%s' % serial for serial in (7, 3, 5)]
+        self.epcs += ['urn:epc:id:sscc:0355555.1000000008',
+                      PREFIX + 'A1B2', PREFIX + 'A1B3',
+                      PREFIX + str(2 ** 64)]
+
+    def test_round_trip(self):
+        epc_list = EPCList(self.epcs)
+        self.assertEqual(len(epc_list), len(self.epcs))
+        self.assertEqual(list(epc_list), self.epcs)
+        self.assertEqual(epc_list, self.epcs)
+        self.assertEqual(self.epcs, epc_list)
+        self.assertEqual([epc_list[i] for i in range(-len(self.epcs),
+                                                     len(self.epcs))],
+                         self.epcs * 2)
+        self.assertEqual(epc_list[98:103], self.epcs[98:103])
+        with self.assertRaises(IndexError):
+            epc_list[len(self.epcs)]
+
+    def test_compact(self):
+        epc_list = EPCList(self.epcs)
+        widths = [(prefix, width, type(serials).__name__)
+                  for prefix, width, serials in epc_list._segments]
+        self.assertEqual(widths, [
+            (PREFIX, 4, 'range'),
+            (PREFIX, 3, 'array'),
+            ('urn:epc:id:sscc:0355555.', 10, 'range'),
+            (PREFIX, None, 'list'),
+        ])
+
+    def test_contains(self):
+        epc_list = EPCList(self.epcs)
+        for epc in self.epcs:
+            self.assertIn(epc, epc_list)
+        self.assertNotIn(PREFIX + '1100', epc_list)
+        self.assertNotIn(PREFIX + '01000', epc_list)
+        self.assertNotIn(None, epc_list)
+
+    def test_mutation(self):
+        epc_list = EPCList(self.epcs)
+        epcs = list(self.epcs)
+        for target in (epc_list, epcs):
+            target.append(PREFIX + '1')
+            target.insert(50, PREFIX + 'X')
+            target[0] = PREFIX + '999'
+            del target[10]
+            target.remove(PREFIX + '005')
+        self.assertEqual(epc_list, epcs)
+        self.assertEqual(epc_list + [PREFIX + '2'], epcs + [PREFIX + '2'])
+        self.assertEqual([PREFIX + '2'] + epc_list, [PREFIX + '2'] + epcs)
+        with self.assertRaises(TypeError):
+            epc_list.append(1)
+
+    def test_copy(self):
+        epc_list = EPCList(self.epcs)
+        copied = copy(epc_list)
+        copied.append(PREFIX + '1')
+        self.assertEqual(epc_list, self.epcs)
+        self.assertEqual(pickle.loads(pickle.dumps(epc_list)), self.epcs)
+        self.assertFalse(EPCList())
@@ -0,0 +1,50 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+import os
+import subprocess
+import sys
+from pydoc import locate
+
+from django.test import SimpleTestCase
+
+CHECK_LAZY_IMPORT = '''
+import sys
+import django
+django.setup()
+import quartet_tracelink.steps
+assert 'quartet_tracelink.steps.steps' not in sys.modules
+assert 'quartet_output.steps' not in sys.modules
+'''
+
+
+class TestStepImports(SimpleTestCase):
+
+    def test_package_import_is_lazy(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='tests.settings')
+        subprocess.check_call(
+            [sys.executable, '-c', CHECK_LAZY_IMPORT],
+            cwd=os.path.dirname(os.path.dirname(__file__)), env=env)
+
+    def test_step_class_paths(self):
+        from quartet_tracelink import steps
+        from quartet_tracelink.steps.output_step import \
+            DispositionAssignedOutputStep
+        for name in steps.__all__:
+            self.assertIsNotNone(locate('quartet_tracelink.steps.%s' % name))
+        self.assertIs(
+            locate('quartet_tracelink.steps.DispositionAssignedOutputStep'),
+            DispositionAssignedOutputStep)
+        with self.assertRaises(AttributeError):
+            steps.MissingStep
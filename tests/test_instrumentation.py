@@ -0,0 +1,71 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+from django.test import TestCase
+
+from quartet_capture.models import Rule, Task, TaskMessage
+from quartet_masterdata.models import Company
+from quartet_tracelink.instrumentation import PhaseTimer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPhaseTimer(TestCase):
+
+    def test_nested_phases(self):
+        clock = FakeClock()
+        timer = PhaseTimer(timer=clock)
+        with timer.phase('render'):
+            clock.now += 1
+            with timer.phase('serialization'):
+                clock.now += 2
+            clock.now += 3
+        with timer.phase('serialization'):
+            clock.now += 4
+        timings = timer.as_dict()
+        self.assertEqual(timings['phases']['render']['seconds'], 4)
+        self.assertEqual(timings['phases']['serialization']['seconds'], 6)
+        self.assertEqual(timings['seconds'], 10)
+
+    def test_query_counts(self):
+        timer = PhaseTimer()
+        with timer.record():
+            with timer.phase('enrichment'):
+                Company.objects.count()
+                with timer.phase('render'):
+                    Company.objects.exists()
+            Company.objects.count()
+        Company.objects.count()
+        timings = timer.as_dict()
+        self.assertEqual(timings['phases']['enrichment']['queries'], 1)
+        self.assertEqual(timings['phases']['render']['queries'], 1)
+        self.assertEqual(timings['phases']['other']['queries'], 1)
+        self.assertEqual(timings['queries'], 3)
+        self.assertIn('enrichment', timer.summary())
+
+    def test_task_messages_are_not_counted(self):
+        task = Task.objects.create(rule=Rule.objects.create(name='Timed'),
+                                   name='timed task')
+        timer = PhaseTimer()
+        with timer.record():
+            with timer.phase('render'):
+                TaskMessage.objects.create(task=task, message='Rendering')
+                Company.objects.count()
+        self.assertEqual(timer.as_dict()['phases']['render']['queries'], 1)
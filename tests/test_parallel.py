@@ -0,0 +1,122 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+import multiprocessing
+import threading
+
+from EPCPyYes.core.v1_2 import template_events
+from EPCPyYes.core.v1_2.CBV.business_steps import BusinessSteps
+from django.test import TestCase, override_settings
+from jinja2 import Environment
+
+from quartet_tracelink.parallel import prerender_events, NotTransferable, \
+    shutdown_executors, get_template_key, uses_render_events
+from quartet_tracelink.parsing.epcpyyes import get_default_environment
+from quartet_tracelink.rendering import RenderedEvents
+from quartet_tracelink.serialization import CommonAttributesSerializer
+from tests.test_rendering import create_events, create_document
+
+
+def create_aggregation(i):
+    # uses the EPCPyYes environment and templates
+    return template_events.AggregationEvent(
+        event_time='2020-01-01T12:00:00.000000+00:00',
+        event_timezone_offset='+00:00',
+        record_time='2020-01-01T12:00:00.000000+00:00',
+        action='ADD',
+        parent_id='urn:epc:id:sscc:305555.1%09d' % i,
+        child_epcs=['urn:epc:id:sgtin:305555.1555555.%s' % i],
+        biz_step=BusinessSteps.packing.value,
+        read_point='urn:epc:id:sgln:305555.123456.12',
+    )
+
+
+class TestParallelRendering(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutdown_executors()
+        super().tearDownClass()
+
+    def _create_events(self):
+        events = create_events(6) + [create_aggregation(i) for i in range(3)]
+        events += create_events(
+            3, CommonAttributesSerializer().as_template())
+        return events
+
+    def test_output_matches_serial(self):
+        expected = create_document(self._create_events()).render()
+        document = create_document(self._create_events())
+        prerender_events(document, 2, chunk_size=4)
+        self.assertEqual(len(document.template_events), 3)
+        self.assertIsInstance(document.template_events[0], RenderedEvents)
+        self.assertEqual(document.render(), expected)
+
+    def test_rendered_events_are_kept(self):
+        rendered = RenderedEvents('<ObjectEvent/>')
+        expected = create_document(
+            [rendered] + self._create_events()).render()
+        document = create_document([rendered] + self._create_events())
+        prerender_events(document, 2, chunk_size=4)
+        self.assertIs(document.template_events[0], rendered)
+        self.assertEqual(len(document.template_events), 4)
+        self.assertEqual(document.render(), expected)
+
+    def test_not_transferable(self):
+        env = get_default_environment()
+        events = self._create_events()
+        events[0].template = env.from_string('<ObjectEvent/>')
+        document = create_document(events)
+        with self.assertRaises(NotTransferable):
+            prerender_events(document, 2, chunk_size=4)
+        self.assertIs(document.template_events, events)
+        self.assertEqual(get_template_key(events[1].template, env),
+                         ('tracelink',
+                          'quartet_tracelink/disposition_assigned.xml'))
+
+    def test_unpicklable_events(self):
+        events = self._create_events()
+        events[1].lock = threading.Lock()
+        document = create_document(events)
+        with self.assertRaises(NotTransferable):
+            prerender_events(document, 2, chunk_size=4)
+        self.assertIs(document.template_events, events)
+
+    def test_daemonic_process(self):
+        document = create_document(self._create_events())
+        process = multiprocessing.current_process()
+        process.daemon = True
+        try:
+            with self.assertRaisesRegex(NotTransferable, 'Daemonic'):
+                prerender_events(document, 2, chunk_size=4)
+        finally:
+            process.daemon = False
+        self.assertNotIsInstance(document.template_events[0],
+                                 RenderedEvents)
+
+    def test_uses_render_events(self):
+        env = get_default_environment()
+        name = 'quartet_tracelink/tracelink_epcis_events_document.xml'
+        self.assertTrue(uses_render_events(env.get_template(name)))
+        self.assertFalse(uses_render_events(
+            env.get_template('quartet_tracelink/common_attributes.xml')))
+        self.assertFalse(uses_render_events(
+            env.from_string('{{ render_events(template_events) }}')))
+        # the shipped template without the render_events global
+        plain = Environment(loader=env.loader)
+        self.assertFalse(uses_render_events(plain.get_template(name)))
+        custom = env.get_template('quartet_tracelink/masterdata.xml')
+        with override_settings(QUARTET_TRACELINK_RENDER_EVENTS_TEMPLATES=[
+                'quartet_tracelink/masterdata.xml']):
+            self.assertTrue(uses_render_events(custom))
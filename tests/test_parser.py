@@ -0,0 +1,66 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+import io
+import os
+
+from django.test import TestCase
+
+from quartet_output.models import EndPoint, EPCISOutputCriteria
+from quartet_tracelink.epcs import EPCList
+from quartet_tracelink.parsing.parser import TraceLinkEPCISParser, \
+    TraceLinkStreamingEPCISParser
+
+
+class TestStreamingParser(TestCase):
+
+    def setUp(self):
+        data_path = os.path.join(os.path.dirname(__file__),
+                                 'data/combined_data.xml')
+        with open(data_path, 'rb') as data_file:
+            self.data = data_file.read()
+        self.end_point = EndPoint.objects.create(urn='http://localhost',
+                                                 name='Test EndPoint')
+
+    def _parse(self, parser_type, event_type):
+        criteria = EPCISOutputCriteria.objects.create(
+            name='%s %s' % (parser_type.__name__, event_type),
+            event_type=event_type,
+            action='ADD',
+            end_point=self.end_point
+        )
+        parser = parser_type(io.BytesIO(self.data), criteria,
+                             skip_parsing=True)
+        parser.parse()
+        return parser.filtered_events
+
+    def test_object_events(self):
+        events = self._parse(TraceLinkEPCISParser, 'Object')
+        streamed = self._parse(TraceLinkStreamingEPCISParser, 'Object')
+        self.assertEqual(len(events), 4)
+        self.assertEqual(len(streamed), len(events))
+        for event, streamed_event in zip(events, streamed):
+            self.assertIsInstance(streamed_event.epc_list, EPCList)
+            self.assertEqual(streamed_event.epc_list, event.epc_list)
+            self.assertEqual(streamed_event.biz_step, event.biz_step)
+
+    def test_aggregation_events(self):
+        events = self._parse(TraceLinkEPCISParser, 'Aggregation')
+        streamed = self._parse(TraceLinkStreamingEPCISParser, 'Aggregation')
+        self.assertEqual(len(events), 3)
+        self.assertEqual(len(streamed), len(events))
+        for event, streamed_event in zip(events, streamed):
+            self.assertIsInstance(streamed_event.child_epcs, EPCList)
+            self.assertEqual(streamed_event.child_epcs, event.child_epcs)
+            self.assertEqual(streamed_event.parent_id, event.parent_id)
@@ -0,0 +1,235 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+import os
+import re
+import tempfile
+from xml.etree import ElementTree
+from tempfile import SpooledTemporaryFile
+from unittest import TestCase
+
+from jinja2 import Environment
+
+from EPCPyYes.core.v1_2 import template_events
+from EPCPyYes.core.v1_2.CBV.business_steps import BusinessSteps
+from EPCPyYes.core.v1_2.CBV.dispositions import Disposition
+from EPCPyYes.core.v1_2.helpers import gtin_urn_generator
+from quartet_capture.tasks import get_storage
+from quartet_tracelink.parsing.epcpyyes import get_default_environment
+from quartet_tracelink.rendering import DocumentReader, write_document, \
+    get_preview, group_events, partition_groups, minify, XMLMinifier, \
+    EventSizer, RenderedEvents
+
+
+def create_events(count=10,
+                  template='quartet_tracelink/disposition_assigned.xml'):
+    env = get_default_environment()
+    events = []
+    for i in range(count):
+        epcs = list(gtin_urn_generator('305555', '1', '555555',
+                                       range(i * 10, i * 10 + 10)))
+        event = template_events.ObjectEvent(
+            event_time='2020-01-01T12:00:00.000000+00:00',
+            event_timezone_offset='+00:00',
+            record_time='2020-01-01T12:00:00.000000+00:00',
+            epc_list=epcs,
+            biz_step=BusinessSteps.commissioning.value,
+            disposition=Disposition.encoded.value,
+            read_point='urn:epc:id:sgln:305555.123456.12',
+            biz_location='urn:epc:id:sgln:305555.123456.0',
+            event_id='event-%s' % i,
+            env=env,
+            template=template
+        )
+        events.append(event)
+    return events
+
+
+def create_document(events):
+    env = get_default_environment()
+    return template_events.EPCISEventListDocument(
+        events,
+        None,
+        created_date='2020-01-01T12:00:00.000000+00:00',
+        template=env.get_template(
+            'quartet_tracelink/tracelink_epcis_events_document.xml'),
+        additional_context={}
+    )
+
+
+class TestStreamedRendering(TestCase):
+
+    def test_streamed_output_matches_render(self):
+        expected = create_document(create_events()).render()
+        spool = SpooledTemporaryFile(max_size=1024)
+        written = write_document(create_document(create_events()), spool)
+        spool.seek(0)
+        reader = DocumentReader(spool)
+        self.assertEqual(written, len(reader))
+        self.assertEqual(reader.read_text(), expected)
+
+    def test_reader_from_path(self):
+        expected = create_document(create_events()).render()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'document.xml')
+            with open(path, 'wb') as stream:
+                write_document(create_document(create_events()), stream)
+            reader = DocumentReader(path)
+            self.assertEqual(get_preview(reader, 20), expected[:20])
+            self.assertEqual(b''.join(reader.chunks(100)).decode(), expected)
+            reader.close()
+
+    def test_reader_can_be_stored(self):
+        # this is how create_and_queue_task persists outbound data
+        spool = SpooledTemporaryFile(max_size=1024)
+        write_document(create_document(create_events()), spool)
+        spool.seek(0)
+        reader = DocumentReader(spool)
+        storage = get_storage()
+        location = storage.save(name='streamed-document.dat', content=reader)
+        try:
+            with storage.open(location, 'rb') as stored:
+                self.assertEqual(stored.read().decode(), reader.read_text())
+        finally:
+            storage.delete(location)
+
+
+class TestMinify(TestCase):
+
+    def _strip(self, element):
+        # the element tree without the whitespace between tags
+        if element.text and not element.text.strip():
+            element.text = None
+        if element.tail and not element.tail.strip():
+            element.tail = None
+        for child in element:
+            self._strip(child)
+        return ElementTree.tostring(element)
+
+    def test_minified_document_is_equivalent(self):
+        document = create_document(create_events()).render()
+        minified = ''.join(minify([document]))
+        self.assertLess(len(minified), len(document))
+        self.assertIsNone(re.search(r'>\s+<', minified))
+        self.assertEqual(
+            self._strip(ElementTree.fromstring(minified.encode())),
+            self._strip(ElementTree.fromstring(document.encode())))
+        spool = SpooledTemporaryFile()
+        write_document(create_document(create_events()), spool,
+                       minified=True)
+        spool.seek(0)
+        self.assertEqual(spool.read().decode(), minified)
+
+    def test_chunk_boundaries(self):
+        document = '\n  <a>\n  <b> text  </b>  \n\t<c x="1"\n  y="2"/>' \
+                   ' tail </a>\n'
+        expected = '<a><b> text  </b><c x="1"\n  y="2"/> tail </a>'
+        for size in range(1, len(document) + 1):
+            minifier = XMLMinifier()
+            chunks = [minifier.feed(document[i:i + size])
+                      for i in range(0, len(document), size)]
+            self.assertEqual(''.join(chunks) + minifier.close(), expected)
+
+
+class TestEventGrouping(TestCase):
+
+    def _create_aggregation(self, parent, children):
+        return template_events.AggregationEvent(
+            event_time='2020-01-01T12:00:00.000000+00:00',
+            event_timezone_offset='+00:00',
+            parent_id=parent,
+            child_epcs=children,
+            biz_step=BusinessSteps.packing.value,
+            env=get_default_environment()
+        )
+
+    def test_hierarchies_are_kept_together(self):
+        events = create_events(4)
+        parent = 'urn:epc:id:sscc:305555.0000000001'
+        aggregation = self._create_aggregation(parent, [
+            events[0].epc_list[0], events[2].epc_list[0]
+        ])
+        events.append(aggregation)
+        groups = group_events(events)
+        self.assertEqual(groups, [
+            [events[0], events[2], aggregation], [events[1]], [events[3]]
+        ])
+
+    def test_linked_events_do_not_join_groups(self):
+        events = create_events(3)
+        shipping = create_events(1)[0]
+        shipping.epc_list = events[0].epc_list + events[1].epc_list
+        groups = group_events(events + [shipping], [shipping])
+        self.assertEqual(groups, [[events[0]], [events[1]], [events[2]]])
+
+    def test_partition_groups(self):
+        groups = [[1, 2], [3], [4, 5, 6, 7], [8]]
+        self.assertEqual(list(partition_groups(groups, 3)),
+                         [[[1, 2], [3]], [[4, 5, 6, 7]], [[8]]])
+        self.assertEqual(list(partition_groups(groups)), [groups])
+
+    def test_partition_groups_by_size(self):
+        groups = [[1, 2], [3], [4, 5, 6, 7], [8]]
+        measured = []
+
+        def get_size(group):
+            measured.append(group)
+            return sum(group)
+
+        partitions = partition_groups(iter(groups), max_size=6,
+                                      get_size=get_size)
+        self.assertEqual(next(partitions), [[1, 2], [3]])
+        # groups are only measured as the partitions are read
+        self.assertEqual(measured, groups[:3])
+        self.assertEqual(list(partitions), [[[4, 5, 6, 7]], [[8]]])
+
+    def test_event_sizes(self):
+        events = create_events(3)
+        document = create_document(events).render().encode('utf-8')
+        for reuse in (False, True):
+            sizer = EventSizer(create_document([]), reuse=reuse)
+            size, rendered = sizer.measure(create_events(3))
+            self.assertEqual(sizer.envelope_size + size, len(document))
+            if reuse:
+                self.assertIsInstance(rendered[0], RenderedEvents)
+                self.assertEqual(
+                    create_document(rendered).render().encode('utf-8'),
+                    document)
+
+
+class TestRenderEvents(TestCase):
+
+    def _get_include_template(self, env, template_name):
+        # an environment without the render_events or cached_include
+        # globals falls back to including each event template
+        plain = Environment(loader=env.loader,
+                            extensions=['jinja2.ext.with_'],
+                            trim_blocks=True, lstrip_blocks=True)
+        self.assertNotIn('render_events', plain.globals)
+        return plain.get_template(template_name)
+
+    def test_output_matches_include(self):
+        env = get_default_environment()
+        events = create_events(3) + create_events(
+            2, 'quartet_tracelink/common_attributes.xml')
+        events[1].template = env.get_template(
+            'quartet_tracelink/disposition_assigned.xml')
+        for name in ('quartet_tracelink/tracelink_epcis_events_document.xml',
+                     'quartet_tracelink/'
+                     'tracelink_epcis_events_document_gln_header.xml'):
+            document = create_document(events)
+            document._template = self._get_include_template(env, name)
+            expected = document.render()
+            document._template = env.get_template(name)
+            self.assertEqual(document.render(), expected)
@@ -12,17 +12,27 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 # Copyright 2018 SerialLab Corp.  All rights reserved.
+import gzip
+import io
 import os
+import tempfile
+import zipfile
 
 from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
 from EPCPyYes.core.v1_2.CBV.business_steps import BusinessSteps
 from EPCPyYes.core.v1_2.CBV.dispositions import Disposition
 from EPCPyYes.core.v1_2.events import EventType
-from quartet_capture.models import Rule, Step, StepParameter, Task
+from quartet_capture import rules
+from quartet_capture.models import Rule, Step, StepParameter, Task, \
+    TaskMessage
 from quartet_capture.tasks import execute_rule, execute_queued_task, \
     create_and_queue_task
+from quartet_epcis.models.events import Event
 from quartet_epcis.parsing.business_parser import BusinessEPCISParser
 from quartet_masterdata.models import Company, TradeItem, OutboundMapping, \
     Location
@@ -30,6 +40,10 @@ from quartet_output import models
 from quartet_output.models import EPCISOutputCriteria
 from quartet_output.steps import SimpleOutputParser, ContextKeys
 from quartet_templates.models import Template
+from quartet_tracelink.epcs import EPCList
+from quartet_tracelink.instrumentation import TraceLinkContextKeys
+from quartet_tracelink.parallel import shutdown_executors
+from quartet_tracelink.rendering import DocumentReader
 
 
 class TestRules(TransactionTestCase):
@@ -66,6 +80,36 @@ class TestRules(TransactionTestCase):
                     ContextKeys.EPCIS_OUTPUT_CRITERIA_KEY.value)
             )
 
+    def test_convert_to_tracelink_command(self):
+        self._create_good_ouput_criterion()
+        db_rule = self._create_rule()
+        self._create_step(db_rule)
+        self._create_output_steps(db_rule)
+        self._create_comm_step(db_rule)
+        self._create_tracelink_epcpyyes_step(db_rule)
+        self._create_task_step(db_rule)
+        self._parse_test_data('data/commission_one_event.xml')
+        self._parse_test_data('data/nested_pack.xml')
+        data_path = os.path.join(os.path.dirname(__file__),
+                                 'data/ship_pallet.xml')
+        stdout = io.StringIO()
+        event_count = Event.objects.count()
+        parameter_count = StepParameter.objects.count()
+        with tempfile.TemporaryDirectory() as output_directory:
+            call_command('convert_to_tracelink', data_path,
+                         output_directory=output_directory,
+                         rule='TraceLink Output', processes=1,
+                         stdout=stdout)
+            with open(os.path.join(output_directory,
+                                   'ship_pallet.xml')) as output:
+                self.assertIn('urn:epc:id:sgtin:305555.3555555.1',
+                              output.read())
+        self.assertIn('Converted 1 files', stdout.getvalue())
+        self.assertFalse(Task.objects.exists())
+        # nothing is written to the EPCIS tables or the step parameters
+        self.assertEqual(Event.objects.count(), event_count)
+        self.assertEqual(StepParameter.objects.count(), parameter_count)
+
     def test_rule_with_agg_comm_output(self):
         self._create_good_ouput_criterion()
         db_rule = self._create_rule()
@@ -605,6 +649,7 @@ class TestRules(TransactionTestCase):
             value='quartet_tracelink/tracelink_epcis_events_masterdata.xml',
             step=output_step
         )
+        return output_step
     
     def _create_disopsition_assigned_extended_step(self, rule):
         output_step = Step.objects.create(
@@ -694,6 +739,227 @@ class TestRules(TransactionTestCase):
         self.assertTrue('VocabularyElement id="urn:epc:idpat:sgtin:' in output_epcis)
         self.assertEquals(len(filtered_events), 1)
 
+    def test_combined_epcis_shipping_step_streaming_parse(self):
+        rule = self._create_rule()
+        self._create_combined_epcis_ship_steps(rule)
+        self._create_combined_output_step(rule)
+        StepParameter.objects.create(
+            name='Streaming Parse',
+            value='True',
+            step=Step.objects.get(rule=rule, name='Parse')
+        )
+        self._create_outbound_mapping()
+        self._create_trade_item_masterdata()
+        db_task = self._create_task(rule)
+        curpath = os.path.dirname(__file__)
+        data_path = os.path.join(curpath, 'data/combined_data.xml')
+        with open(data_path, 'rb') as data_file:
+            context = execute_rule(data_file.read(), db_task)
+        output_epcis = context.context.get(
+            ContextKeys.OUTBOUND_EPCIS_MESSAGE_KEY.value)
+        filtered_events = context.context.get(
+            ContextKeys.FILTERED_EVENTS_KEY.value)
+        self.assertIn('VocabularyElement id="urn:epc:idpat:sgtin:',
+                      output_epcis)
+        self.assertEqual(len(filtered_events), 1)
+        self.assertIsInstance(filtered_events[0].epc_list, EPCList)
+
+    def test_combined_epcis_shipping_step_streamed(self):
+        rule = self._create_rule()
+        self._create_combined_epcis_ship_steps(rule)
+        output_step = self._create_combined_output_step(rule)
+        StepParameter.objects.create(
+            name='Stream Output',
+            value='True',
+            step=output_step
+        )
+        self._create_outbound_mapping()
+        self._create_trade_item_masterdata()
+        db_task = self._create_task(rule)
+        curpath = os.path.dirname(__file__)
+        data_path = os.path.join(curpath, 'data/combined_data.xml')
+        with open(data_path, 'r') as data_file:
+            context = execute_rule(data_file.read().encode(), db_task)
+        output_epcis = context.context.get(
+            ContextKeys.OUTBOUND_EPCIS_MESSAGE_KEY.value)
+        self.assertIsInstance(output_epcis, DocumentReader)
+        self.assertTrue('VocabularyElement id="urn:epc:idpat:sgtin:' in
+                        output_epcis.read_text())
+
+    def test_combined_epcis_shipping_step_gzip(self):
+        output_epcis, stats = self._execute_compressed_step('gzip')
+        output_epcis = gzip.decompress(output_epcis.read())
+        self.assertIn(b'VocabularyElement id="urn:epc:idpat:sgtin:',
+                      output_epcis)
+        self.assertEqual(stats['bytes'], len(output_epcis))
+        self.assertGreater(stats['ratio'], 1)
+
+    def test_combined_epcis_shipping_step_zip(self):
+        output_epcis, stats = self._execute_compressed_step('zip')
+        with zipfile.ZipFile(output_epcis) as archive:
+            self.assertEqual(archive.namelist(), ['shipment.xml'])
+            output_epcis = archive.read('shipment.xml')
+        self.assertIn(b'VocabularyElement id="urn:epc:idpat:sgtin:',
+                      output_epcis)
+        self.assertEqual(stats['bytes'], len(output_epcis))
+
+    def _execute_compressed_step(self, compression):
+        rule = self._create_rule()
+        self._create_combined_epcis_ship_steps(rule)
+        output_step = self._create_combined_output_step(rule)
+        StepParameter.objects.create(
+            name='Compression',
+            value=compression,
+            step=output_step
+        )
+        StepParameter.objects.create(
+            name='Compressed File Name',
+            value='shipment.xml',
+            step=output_step
+        )
+        self._create_outbound_mapping()
+        self._create_trade_item_masterdata()
+        db_task = self._create_task(rule)
+        curpath = os.path.dirname(__file__)
+        data_path = os.path.join(curpath, 'data/combined_data.xml')
+        with open(data_path, 'r') as data_file:
+            context = execute_rule(data_file.read().encode(), db_task)
+        output_epcis = context.context.get(
+            ContextKeys.OUTBOUND_EPCIS_MESSAGE_KEY.value)
+        self.assertIsInstance(output_epcis, DocumentReader)
+        stats, = context.context[TraceLinkContextKeys.COMPRESSION_KEY.value]
+        return output_epcis, stats
+
+    def test_combined_epcis_shipping_step_parallel(self):
+        rule = self._create_rule()
+        self._create_combined_epcis_ship_steps(rule)
+        output_step = self._create_combined_output_step(rule)
+        StepParameter.objects.create(
+            name='Render Processes',
+            value='2',
+            step=output_step
+        )
+        StepParameter.objects.create(
+            name='Render Chunk Size',
+            value='2',
+            step=output_step
+        )
+        self._create_outbound_mapping()
+        self._create_trade_item_masterdata()
+        db_task = self._create_task(rule)
+        curpath = os.path.dirname(__file__)
+        data_path = os.path.join(curpath, 'data/combined_data.xml')
+        try:
+            with open(data_path, 'r') as data_file:
+                context = execute_rule(data_file.read().encode(), db_task)
+        finally:
+            shutdown_executors()
+        output_epcis = context.context.get(
+            ContextKeys.OUTBOUND_EPCIS_MESSAGE_KEY.value)
+        self.assertIn('VocabularyElement id="urn:epc:idpat:sgtin:',
+                      output_epcis)
+        self.assertEqual(output_epcis.count('<AggregationEvent>'), 3)
+        self.assertFalse(TaskMessage.objects.filter(
+            task=db_task, message__startswith='Rendering in a single'
+        ).exists())
+
+    def test_combined_epcis_shipping_step_split(self):
+        rule = self._create_rule()
+        self._create_combined_epcis_ship_steps(rule)
+        output_step = self._create_combined_output_step(rule)
+        StepParameter.objects.create(
+            name='Max Events Per Document',
+            value='2',
+            step=output_step
+        )
+        task_step = self._create_task_step(rule)
+        task_step.step_class = 'quartet_tracelink.steps.CreateOutputTaskStep'
+        task_step.save()
+        transport_rule = self._create_transport_rule()
+        Step.objects.create(
+            name='Record Document',
+            rule=transport_rule,
+            step_class='tests.test_rule.RecordDocumentStep',
+            order=1
+        )
+        self._create_outbound_mapping()
+        self._create_trade_item_masterdata()
+        db_task = self._create_task(rule)
+        curpath = os.path.dirname(__file__)
+        data_path = os.path.join(curpath, 'data/combined_two_pallets.xml')
+        RecordDocumentStep.documents = []
+        with open(data_path, 'r') as data_file:
+            context = execute_rule(data_file.read().encode(), db_task)
+        documents = context.context.get(
+            ContextKeys.OUTBOUND_EPCIS_MESSAGE_KEY.value)
+        # each pallet's hierarchy exceeds the limit on its own so every
+        # pallet gets its own document and the shipping event goes last
+        self.assertIsInstance(documents, list)
+        self.assertEqual(len(documents), 2)
+        self.assertEqual(
+            Task.objects.filter(rule=transport_rule).count(), 2)
+        queued = [document.decode('utf-8')
+                  for document in RecordDocumentStep.documents]
+        self.assertEqual(queued, documents)
+        pallets = ['<parentID>urn:epc:id:sscc:0355555.1000000008',
+                   '<parentID>urn:epc:id:sscc:0355555.1000000015']
+        for document in queued:
+            self.assertEqual(document.count('<AggregationEvent>'), 3)
+            self.assertEqual(
+                [pallet in document for pallet in pallets].count(True), 1)
+        self.assertNotIn('bizstep:shipping', queued[0])
+        self.assertLess(queued[1].rindex('<AggregationEvent>'),
+                        queued[1].index('bizstep:shipping'))
+
+    def test_combined_epcis_shipping_step_timings(self):
+        rule = self._create_rule()
+        self._create_combined_epcis_ship_steps(rule)
+        output_step = self._create_combined_output_step(rule)
+        StepParameter.objects.create(
+            name='Record Timings',
+            value='True',
+            step=output_step
+        )
+        self._create_outbound_mapping()
+        self._create_trade_item_masterdata()
+        db_task = self._create_task(rule)
+        curpath = os.path.dirname(__file__)
+        data_path = os.path.join(curpath, 'data/combined_data.xml')
+        with open(data_path, 'r') as data_file:
+            context = execute_rule(data_file.read().encode(), db_task)
+        timings = context.context[
+            TraceLinkContextKeys.STEP_TIMINGS_KEY.value]['Render Message']
+        for phase in ['pre_execute', 'enrichment', 'render',
+                      'serialization']:
+            self.assertIn(phase, timings['phases'])
+        self.assertGreater(timings['phases']['pre_execute']['queries'], 0)
+        self.assertTrue(TaskMessage.objects.filter(
+            task=db_task, message__startswith='Timings: pre_execute'
+        ).exists())
+
+    def test_combined_epcis_shipping_step_trade_item_queries(self):
+        rule = self._create_rule()
+        self._create_combined_epcis_ship_steps(rule)
+        self._create_combined_output_step(rule)
+        self._create_outbound_mapping()
+        self._create_trade_item_masterdata()
+        db_task = self._create_task(rule)
+        curpath = os.path.dirname(__file__)
+        data_path = os.path.join(curpath, 'data/combined_data.xml')
+        with open(data_path, 'r') as data_file:
+            with CaptureQueriesContext(connection) as queries:
+                context = execute_rule(data_file.read().encode(), db_task)
+        trade_item_queries = [
+            query for query in queries.captured_queries
+            if 'FROM "quartet_masterdata_tradeitem"' in query['sql']
+        ]
+        # three object events with three different GTINs- one query
+        self.assertEqual(len(trade_item_queries), 1)
+        output_epcis = context.context.get(
+            ContextKeys.OUTBOUND_EPCIS_MESSAGE_KEY.value)
+        self.assertEqual(
+            output_epcis.count('VocabularyElement id="urn:epc:idpat:sgtin:'), 3)
+
     def test_disposition_assigned_extended_step(self):
         # create rule
         rule = self._create_rule()
@@ -719,3 +985,20 @@ class TestRules(TransactionTestCase):
             ContextKeys.OUTBOUND_EPCIS_MESSAGE_KEY.value)
         self.assertTrue(output_epcis)
         self.assertTrue(filtered_events)
+
+
+class RecordDocumentStep(rules.Step):
+    """
+    Records the data of each task it runs in so tests can inspect what
+    was queued.
+    """
+    documents = []
+
+    def execute(self, data, rule_context: rules.RuleContext):
+        RecordDocumentStep.documents.append(data)
+
+    def declared_parameters(self):
+        return {}
+
+    def on_failure(self):
+        pass
@@ -0,0 +1,168 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+import os
+from unittest import TestCase
+
+from EPCPyYes.core.v1_2 import template_events
+from EPCPyYes.core.v1_2.CBV.business_steps import BusinessSteps
+from EPCPyYes.core.v1_2.CBV.business_transactions import \
+    BusinessTransactionType
+from EPCPyYes.core.v1_2.CBV.dispositions import Disposition
+from EPCPyYes.core.v1_2.CBV.instance_lot_master_data import \
+    InstanceLotMasterDataAttribute, LotLevelAttributeName, \
+    ItemLevelAttributeName
+from EPCPyYes.core.v1_2.CBV.source_destination import SourceDestinationTypes
+from EPCPyYes.core.v1_2.events import BusinessTransaction, Source, \
+    Destination, Action, ErrorDeclaration, InstanceLotMasterDataAttribute \
+    as PlainILMDAttribute
+from EPCPyYes.core.v1_2.helpers import gtin_urn_generator
+from quartet_tracelink.parsing.epcpyyes import get_default_environment
+from quartet_tracelink.rendering import generate_document
+from quartet_tracelink.serialization import CommonAttributesSerializer
+
+TEMPLATE = 'quartet_tracelink/common_attributes.xml'
+GOLDEN_FILE = os.path.join(os.path.dirname(__file__),
+                           'data/common_attributes_golden.xml')
+
+
+def create_event(template=TEMPLATE, gtin=True, **kwargs):
+    event_kwargs = dict(
+        event_time='2020-01-01T12:00:00.000000+00:00',
+        event_timezone_offset='+00:00',
+        record_time='2020-01-01T12:00:01.000000+00:00',
+        action=Action.add.value,
+        epc_list=list(gtin_urn_generator('305555', '1', '555555',
+                                         range(1000, 1003))),
+        biz_step=BusinessSteps.commissioning.value,
+        disposition=Disposition.encoded.value,
+        read_point='urn:epc:id:sgln:305555.123456.12',
+        biz_location='urn:epc:id:sgln:305555.123456.0',
+        event_id='4ebf7e39-5c4f-4d4c-b2c4-5b6a5f0a3f1e',
+        env=get_default_environment(),
+        template=template
+    )
+    event_kwargs.update(kwargs)
+    event = template_events.ObjectEvent(**event_kwargs)
+    event.packaging_line = 'Line1'
+    if gtin:
+        event.is_gtin = True
+        event.lot = 'DL232'
+        event.expiry = '2015-12-31'
+        event.packaging_uom = 'EA'
+        event.NDC = '55555-594-15'
+        event.NDC_pattern = 'US_NDC532'
+    else:
+        event.company_prefix = '305555'
+    return event
+
+
+def create_events(template=TEMPLATE):
+    """
+    Creates events that exercise every branch of the common attributes
+    template.
+    """
+    ilmd = [
+        InstanceLotMasterDataAttribute(
+            name=LotLevelAttributeName.itemExpirationDate.value,
+            value='2015-12-31'),
+        InstanceLotMasterDataAttribute(
+            name=ItemLevelAttributeName.lotNumber,
+            value='DL232'),
+        PlainILMDAttribute(name='tl:custom', value='value'),
+    ]
+    transactions = [
+        BusinessTransaction('urn:epcglobal:cbv:bt:0555555555555.DE45_111',
+                            BusinessTransactionType.Despatch_Advice),
+        BusinessTransaction('urn:epcglobal:cbv:bt:0555555555555.00001',
+                            BusinessTransactionType.Bill_Of_Lading.value),
+        BusinessTransaction('urn:epcglobal:cbv:bt:0555555555555.00002'),
+    ]
+    sources = [Source(SourceDestinationTypes.possessing_party.value,
+                      'urn:epc:id:sgln:305555.123456.0')]
+    destinations = [Destination(SourceDestinationTypes.owning_party.value,
+                                'urn:epc:id:sgln:0614141.00001.0')]
+    sscc = create_event(template, gtin=False,
+                        epc_list=['urn:epc:id:sscc:305555.0000000001'])
+    missing = create_event(template, gtin=False, event_id=None)
+    del missing.packaging_line
+    minimal = create_event(template, event_id=None, action=Action.observe,
+                           read_point=None, biz_location=None,
+                           disposition=None)
+    minimal.record_time = None
+    minimal.event_timezone_offset = None
+    return [
+        create_event(template),
+        create_event(template, ilmd=ilmd),
+        create_event(template, ilmd=ilmd, business_transaction_list=transactions),
+        create_event(template, ilmd=ilmd, source_list=sources,
+                     destination_list=destinations),
+        minimal,
+        create_event(template, error_declaration=ErrorDeclaration(
+            declaration_time='2020-01-02T12:00:00.000000+00:00',
+            reason='incorrect_data', corrective_event_ids=['1', '2'])),
+        create_event(template, biz_step=BusinessSteps.shipping.value),
+        sscc,
+        missing,
+        create_event(template, epc_list=[]),
+    ]
+
+
+def render_document(events, additional_context=None):
+    env = get_default_environment()
+    document = template_events.EPCISEventListDocument(
+        events,
+        None,
+        created_date='2020-01-01T12:00:00.000000+00:00',
+        template=env.get_template(
+            'quartet_tracelink/tracelink_epcis_events_document.xml'),
+        additional_context=additional_context or {}
+    )
+    return ''.join(generate_document(document))
+
+
+class TestCommonAttributesSerializer(TestCase):
+
+    def setUp(self):
+        self.serializer = CommonAttributesSerializer()
+
+    def test_events_match_template(self):
+        native = self.serializer.as_template()
+        for additional_context in (None, {'transaction_date': '2020-01-01'}):
+            for event in create_events():
+                expected = event.template.render(
+                    event=event, additional_context=additional_context)
+                self.assertEqual(
+                    self.serializer.render(event, additional_context),
+                    expected
+                )
+                event.template = native
+                self.assertEqual(
+                    event.template.render(
+                        event=event, additional_context=additional_context),
+                    expected
+                )
+
+    def test_golden_file(self):
+        with open(GOLDEN_FILE) as golden:
+            expected = golden.read()
+        self.assertEqual(render_document(create_events()), expected)
+        self.assertEqual(
+            render_document(create_events(self.serializer.as_template())),
+            expected
+        )
+
+    def test_event_render(self):
+        event = create_events(self.serializer.as_template())[0]
+        self.assertEqual(event.render(), create_events()[0].render())
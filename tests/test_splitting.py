@@ -0,0 +1,112 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+from django.test import TestCase
+
+from EPCPyYes.core.v1_2 import template_events
+from EPCPyYes.core.v1_2.CBV.business_steps import BusinessSteps
+from quartet_capture.models import Rule, Step, Task
+from quartet_capture.rules import Rule as RuleEngine, RuleContext
+from quartet_tracelink.instrumentation import TraceLinkContextKeys
+from quartet_tracelink.parsing.epcpyyes import get_default_environment
+from quartet_tracelink.rendering import EventSizer, group_events
+from tests.test_rendering import create_events
+
+TEMPLATE = 'quartet_tracelink/tracelink_epcis_events_document.xml'
+
+
+class TestDocumentSplitting(TestCase):
+
+    def setUp(self):
+        rule = Rule.objects.create(name='Split Documents')
+        Step.objects.create(
+            name='Render',
+            rule=rule,
+            step_class='quartet_tracelink.steps.TracelinkOutputStep',
+            order=1
+        )
+        task = Task.objects.create(rule=rule, name='split task')
+        self.step = RuleEngine(rule, task).steps[1]
+        self.template = get_default_environment().get_template(TEMPLATE)
+        self.events = create_events(6)
+        self.shipping = create_events(1)[0]
+        self.shipping.biz_step = BusinessSteps.shipping.value
+        self.shipping.epc_list = [epc for event in self.events
+                                  for epc in event.epc_list]
+
+    def _render(self, max_events=0, max_bytes=0, prepend=False):
+        return self.step.render_partitions(
+            group_events(self.events + [self.shipping], [self.shipping]),
+            [self.shipping], self.template, {}, None, max_events, max_bytes,
+            prepend
+        )
+
+    def _get_sizes(self):
+        sizer = EventSizer(template_events.EPCISEventListDocument(
+            [], template=self.template, additional_context={}))
+        event_size = max(sizer.measure([event])[0] for event in self.events)
+        shipping_size = sizer.measure([self.shipping])[0]
+        return sizer.envelope_size, event_size, shipping_size
+
+    def test_split_by_size(self):
+        envelope_size, event_size, shipping_size = self._get_sizes()
+        max_bytes = envelope_size + 2 * event_size + shipping_size
+        documents = self._render(max_bytes=max_bytes)
+        # no document is rendered and then thrown away
+        self.assertEqual(self.step.document_count, 3)
+        self.assertEqual(len(documents), 3)
+        for document in documents:
+            self.assertLessEqual(len(document.encode('utf-8')), max_bytes)
+            self.assertEqual(document.count('<ObjectEvent>'),
+                             3 if document is documents[-1] else 2)
+        self.assertNotIn('bizstep:shipping', documents[0])
+        self.assertNotIn('bizstep:shipping', documents[1])
+        self.assertTrue(documents[-1].rstrip().endswith(
+            '</epcis:EPCISDocument>'))
+        self.assertLess(documents[-1].index('bizstep:commissioning'),
+                        documents[-1].index('bizstep:shipping'))
+
+    def test_split_by_event_count(self):
+        documents = self._render(max_events=4, prepend=True)
+        self.assertEqual([document.count('<ObjectEvent>')
+                          for document in documents], [3, 4])
+        self.assertIn('bizstep:shipping', documents[-1])
+        self.assertLess(documents[-1].index('bizstep:shipping'),
+                        documents[-1].index('bizstep:commissioning'))
+
+    def test_split_needs_tracelink_output_task_step(self):
+        with self.assertRaises(self.step.SplitConfigurationError):
+            self.step.check_output_task_steps()
+        output_step = Step.objects.create(
+            name='Queue Outbound Message',
+            rule=self.step.task.rule,
+            step_class='quartet_output.steps.CreateOutputTaskStep',
+            order=2
+        )
+        with self.assertRaises(self.step.SplitConfigurationError):
+            self.step.check_output_task_steps()
+        output_step.step_class = 'quartet_tracelink.steps.CreateOutputTaskStep'
+        output_step.save()
+        self.step.check_output_task_steps()
+
+    def test_compression_recorded_per_document(self):
+        self.step.compression = 'gzip'
+        documents = self._render(max_events=4)
+        rule_context = RuleContext('Split Documents', 'split task')
+        self.step.record_compression(documents, rule_context)
+        stats = rule_context.context[
+            TraceLinkContextKeys.COMPRESSION_KEY.value]
+        self.assertEqual(len(stats), len(documents))
+        self.assertEqual([item['filename'] for item in stats],
+                         ['split task-1.xml', 'split task-2.xml'])
@@ -0,0 +1,58 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2020 SerialLab Corp.  All rights reserved.
+from unittest import TestCase
+
+from gs123.conversion import URNConverter, URNNotValid
+from quartet_tracelink.urns import URNDecoder, DecodedURN
+
+
+class TestURNDecoder(TestCase):
+
+    def setUp(self):
+        self.decoder = URNDecoder()
+
+    def test_sgtin(self):
+        urn = 'urn:epc:id:sgtin:0355555.055555.100'
+        self.assertEqual(
+            self.decoder.decode(urn),
+            DecodedURN('0355555', URNConverter(urn).gtin14, None, True)
+        )
+
+    def test_sscc(self):
+        urn = 'urn:epc:id:sscc:0355555.1000000008'
+        converter = URNConverter(urn)
+        self.assertEqual(
+            self.decoder.decode(urn),
+            DecodedURN('0355555', None, converter._extension_digit, False)
+        )
+        self.assertEqual(
+            self.decoder.decode('urn:epc:id:sscc:0355555.2000000008'
+                                ).extension_digit, '2')
+
+    def test_decode_many(self):
+        epcs = ['urn:epc:id:sgtin:0355555.055555.%s' % i for i in range(100)]
+        epcs += ['urn:epc:id:sgtin:0355555.355555.%s' % i for i in range(100)]
+        decoded = self.decoder.decode_many(epcs)
+        self.assertEqual([d.gtin14 for d in decoded],
+                         [URNConverter(epc).gtin14 for epc in epcs])
+        self.assertEqual(len(self.decoder), 2)
+
+    def test_invalid(self):
+        for urn in ('urn:epc:id:sgln:0355555.00000.0',
+                    'urn:epc:id:sgtin:0355555.055555',
+                    'urn:epc:id:sgtin:0355555.05555555.1'):
+            with self.assertRaises(URNNotValid):
+                self.decoder.decode(urn)
+        self.assertEqual(len(self.decoder), 0)